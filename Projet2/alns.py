@@ -0,0 +1,546 @@
+import math
+import random
+import time
+import numpy as np
+from typing import List, Optional, Dict, Tuple
+
+from solver import PersonnelRoutingSolver, Solution, SPEED_KM_PER_MIN
+from heuristics import clarke_wright, select_visits, balance_routes, objective_weights
+from local_search import LocalSearch, nearest_neighbors
+
+
+class ALNSSolver(PersonnelRoutingSolver):
+    """
+    Adaptive Large Neighborhood Search for large sales routing instances
+
+    Each iteration removes a batch of clients (random, worst or Shaw/related
+    removal, plus longest-route removal when the longest route is part of the
+    objective) and reinserts them (greedy or regret-k insertion). Candidates are
+    accepted with a simulated-annealing criterion and operator weights adapt
+    to their recent success. The temperature follows the iteration count, so
+    a given seed always produces the same search trajectory and a time limit
+    only truncates it.
+    """
+
+    REMOVALS = ("random", "worst", "shaw")
+    INSERTIONS = ("greedy", "regret")
+
+    def __init__(self, time_limit: int = 30, seed: int = 0,
+                 max_iterations: int = 20000,
+                 segment_length: int = 100,
+                 reaction: float = 0.1,
+                 scores: Tuple[float, float, float] = (33, 9, 13),
+                 max_removal: int = 60,
+                 max_removal_fraction: float = 0.15,
+                 regret_k: int = 3,
+                 n_neighbors: int = 20,
+                 start_worsening: float = 0.5,
+                 final_temperature_ratio: float = 0.002):
+        super().__init__(time_limit=time_limit)
+        self.seed = seed
+        self.max_iterations = max_iterations
+        self.segment_length = segment_length
+        self.reaction = reaction
+        self.scores = scores  # new best, improved current, accepted worse
+        self.max_removal = max_removal
+        self.max_removal_fraction = max_removal_fraction
+        self.regret_k = regret_k
+        self.n_neighbors = n_neighbors
+        self.start_worsening = start_worsening
+        self.final_temperature_ratio = final_temperature_ratio
+
+    def solve_vrp(self,
+                  distances: np.ndarray,
+                  n_vehicles: int = 1,
+                  vehicle_capacities: List[int] = None,
+                  demands: List[int] = None,
+                  service_times: Optional[List[float]] = None,
+                  time_windows: Optional[List[Optional[Tuple[float, float]]]] = None,
+                  max_shift_duration=None,
+                  travel_times: Optional[np.ndarray] = None,
+                  prizes: Optional[List[float]] = None,
+                  objective: str = "total",
+                  makespan_weight: float = 1.0,
+                  travel_profile=None,
+                  **kwargs) -> Solution:
+        """
+        Solve the VRP with ALNS
+
+        Accepts the same arguments as PersonnelRoutingSolver.solve_vrp. With
+        time windows or shift limits, insertions are checked in O(1) against
+        per-route start times and push-forward slacks. With prizes, removed
+        and unvisited clients are only reinserted where that costs less than
+        their prize. In "makespan" and "balanced" mode the candidates are
+        scored on the longest route as well, and the best solution is
+        rebalanced with balance_routes before it is returned. With a
+        travel_profile, insertions re-schedule the route from the insertion
+        point until it is back on its cached start times. The
+        returned Solution reports the number of iterations in node_count and
+        the operator statistics in stats.
+        """
+        start_time = time.time()
+        self._start_progress()
+        n = len(distances)
+
+        if service_times is None:
+            service_times = [0] * n
+        if demands is None:
+            demands = [0] * n
+        if vehicle_capacities is None:
+            vehicle_capacities = [1000] * n_vehicles
+
+        self.model = None
+        self.rng = random.Random(self.seed)
+        if travel_times is None and travel_profile is not None:
+            travel_times = travel_profile.mean_times()
+        # Routes are built on travel times when a separate time matrix is given
+        self.distances = np.asarray(distances if travel_times is None else travel_times, dtype=float)
+        self.demands = list(demands)
+        self.neighbors = nearest_neighbors(self.distances, self.n_neighbors).tolist()
+        self.time_constraints = self._make_time_constraints(
+            distances, service_times, n_vehicles, time_windows, max_shift_duration, travel_times,
+            travel_profile)
+        # Costs are in the units of self.distances; incumbents and prizes are in minutes
+        self._report_scale = 1.0 / SPEED_KM_PER_MIN if travel_times is None else 1.0
+        self.prizes = None if prizes is None else [p / self._report_scale for p in prizes]
+        self.service_times = list(service_times)
+        self._weights = objective_weights(objective, makespan_weight)
+        self._removals = self.REMOVALS + (("longest",) if self._weights[1] > 0 else ())
+
+        # Initial solution: savings + local search
+        polisher = LocalSearch(self.distances, demands, vehicle_capacities,
+                               time_limit=max(1.0, 0.1 * self.time_limit),
+                               time_constraints=self.time_constraints)
+        routes = self._assign_vehicles(
+            clarke_wright(self.distances, n_vehicles, vehicle_capacities, demands,
+                          time_constraints=self.time_constraints),
+            vehicle_capacities, demands, self.time_constraints)
+        routes = polisher.improve(routes)
+        routes += [[0, 0] for _ in range(n_vehicles - len(routes))]
+        if self.prizes is not None:
+            routes = select_visits(routes, self.distances, self.prizes, demands, vehicle_capacities,
+                                   n_vehicles, self.time_constraints)
+        routes = balance_routes(routes, self.distances * self._report_scale, service_times, demands,
+                                vehicle_capacities, self._weights, self.time_constraints)
+        # Surplus savings routes (capacity too tight for n_vehicles) keep the largest capacity
+        self.capacity = [vehicle_capacities[k] if k < n_vehicles else max(vehicle_capacities)
+                         for k in range(len(routes))]
+
+        # Routes beyond n_vehicles only exist when the construction could not
+        # fit the fleet; every client left on them is heavily penalized
+        self._n_vehicles = n_vehicles
+        self._surplus_penalty = 2.0 * float(self.distances.max())
+
+        routes = self._reinsert_violations(routes)
+        current, current_cost = routes, self._cost(routes)
+        best, best_cost = current, current_cost
+        self._report_incumbent(best, best_cost * self._report_scale)
+
+        weights = {"removal": [1.0] * len(self._removals), "insertion": [1.0] * len(self.INSERTIONS)}
+        segment_scores = {key: [0.0] * len(w) for key, w in weights.items()}
+        segment_uses = {key: [0] * len(w) for key, w in weights.items()}
+        calls = {key: [0] * len(w) for key, w in weights.items()}
+
+        n_clients = n - 1
+        upper = max(1, min(self.max_removal, int(self.max_removal_fraction * n_clients)))
+        lower = min(upper, 4)
+
+        # Start temperature: a candidate that is start_worsening worse on the
+        # part of the solution touched by one destroy step is accepted with
+        # probability 1/2
+        touched = current_cost * (lower + upper) / 2 / max(1, n_clients)
+        temperature = self.start_worsening * touched / math.log(2) if touched > 0 else 1.0
+        cooling = self.final_temperature_ratio ** (1.0 / max(1, self.max_iterations))
+
+        iteration = accepted = improvements = best_iteration = 0
+        while iteration < self.max_iterations and time.time() - start_time < self.time_limit \
+                and not self._stop_requested:
+            iteration += 1
+            d_idx = self._roulette(weights["removal"])
+            r_idx = self._roulette(weights["insertion"])
+            calls["removal"][d_idx] += 1
+            calls["insertion"][r_idx] += 1
+
+            q = self.rng.randint(lower, upper)
+
+            candidate = [list(route) for route in current]
+            removed = self._destroy(self._removals[d_idx], candidate, q)
+            if not self._repair(self.INSERTIONS[r_idx], candidate, removed):
+                score = 0.0
+            else:
+                cost = self._cost(candidate)
+                score = 0.0
+                if cost < best_cost - 1e-9:
+                    best, best_cost = candidate, cost
+                    best_iteration = iteration
+                    score = self.scores[0]
+                    self._report_incumbent(best, best_cost * self._report_scale)
+                if cost < current_cost - 1e-9:
+                    current, current_cost = candidate, cost
+                    improvements += 1
+                    accepted += 1
+                    score = max(score, self.scores[1])
+                elif self.rng.random() < math.exp(-(cost - current_cost) / max(temperature, 1e-12)):
+                    current, current_cost = candidate, cost
+                    accepted += 1
+                    score = max(score, self.scores[2])
+
+            for key, idx in (("removal", d_idx), ("insertion", r_idx)):
+                segment_scores[key][idx] += score
+                segment_uses[key][idx] += 1
+
+            # Adaptive weights, updated at the end of every segment
+            if iteration % self.segment_length == 0:
+                for key in weights:
+                    for idx in range(len(weights[key])):
+                        if segment_uses[key][idx]:
+                            weights[key][idx] = ((1 - self.reaction) * weights[key][idx] +
+                                                 self.reaction * segment_scores[key][idx] / segment_uses[key][idx])
+                        weights[key][idx] = max(weights[key][idx], 0.05)
+                    segment_scores[key] = [0.0] * len(weights[key])
+                    segment_uses[key] = [0] * len(weights[key])
+
+            temperature *= cooling
+            self._flush_incumbent()
+            shared = self._shared_incumbent(best_cost * self._report_scale)
+            if shared is not None:
+                adopted = self._adopt(shared)
+                if adopted is not None and self._cost(adopted) < best_cost - 1e-9:
+                    best = current = adopted
+                    best_cost = current_cost = self._cost(adopted)
+
+        polished = polisher.improve(best)
+        if self.prizes is not None:
+            polished = select_visits(polished, self.distances, self.prizes, demands, vehicle_capacities,
+                                     n_vehicles, self.time_constraints)
+        if self._weights[1] > 0:
+            polished = balance_routes(polished, self.distances * self._report_scale, service_times,
+                                      demands, self.capacity, self._weights, self.time_constraints)
+            if self._cost(polished) > best_cost + 1e-9:
+                polished = best  # The local search unbalanced the routes more than it saved
+        best = polished
+        status = self._heuristic_status("ALNS", best, n_vehicles, vehicle_capacities,
+                                        demands, self.time_constraints)
+        self.solution = self._build_solution(best, distances, service_times, status,
+                                             start_time, node_count=iteration,
+                                             time_constraints=self.time_constraints,
+                                             travel_times=travel_times, prizes=prizes)
+        self.solution.stats = {
+            "iterations": iteration,
+            "accepted": accepted,
+            "improvements": improvements,
+            "best_iteration": best_iteration,
+            "removal_weights": dict(zip(self._removals, weights["removal"])),
+            "insertion_weights": dict(zip(self.INSERTIONS, weights["insertion"])),
+            "removal_calls": dict(zip(self._removals, calls["removal"])),
+            "insertion_calls": dict(zip(self.INSERTIONS, calls["insertion"])),
+        }
+        return self.solution
+
+    # ------------------------------------------------------------------
+    # Helpers
+    # ------------------------------------------------------------------
+
+    def _reinsert_violations(self, routes: List[List[int]]) -> List[List[int]]:
+        """
+        Empty the surplus routes and the routes that break a limit of their
+        vehicle, then reinsert those clients with regret insertion
+        """
+        tc = self.time_constraints
+        candidate = [list(route) for route in routes]
+        stripped = []
+        for r, route in enumerate(candidate):
+            overloaded = sum(self.demands[node] for node in route) > self.capacity[r]
+            late = tc is not None and not tc.feasible(route, r)
+            if r >= self._n_vehicles or overloaded or late:
+                stripped.extend(route[1:-1])
+                candidate[r] = [0, 0]
+        if stripped and self._repair("regret", candidate, stripped):
+            return candidate
+        return routes
+
+    def _adopt(self, routes: List[List[int]]) -> Optional[List[List[int]]]:
+        """External routes padded to the current fleet, or None if they break a limit"""
+        if len(routes) > len(self.capacity):
+            return None
+        adopted = [list(route) for route in routes] + \
+            [[0, 0] for _ in range(len(self.capacity) - len(routes))]
+        tc = self.time_constraints
+        for r, route in enumerate(adopted):
+            if sum(self.demands[node] for node in route) > self.capacity[r] or \
+                    (tc is not None and len(route) > 2 and not tc.feasible(route, r)):
+                return None
+        return adopted
+
+    def _roulette(self, weights: List[float]) -> int:
+        pick = self.rng.random() * sum(weights)
+        for idx, weight in enumerate(weights):
+            pick -= weight
+            if pick <= 0:
+                return idx
+        return len(weights) - 1
+
+    def _cost(self, routes: List[List[int]]) -> float:
+        d = self.distances
+        cost = float(sum(d[route[:-1], route[1:]].sum() for route in routes if len(route) > 1))
+        surplus = sum(len(route) - 2 for route in routes[self._n_vehicles:])
+        if self.prizes is not None:
+            visited = {node for route in routes for node in route}
+            cost += sum(prize for i, prize in enumerate(self.prizes) if i > 0 and i not in visited)
+        travel_weight, makespan_weight = self._weights
+        if makespan_weight > 0:
+            longest = max(self._duration(route) for route in routes)
+            cost = travel_weight * cost + makespan_weight * longest / self._report_scale
+        return cost + self._surplus_penalty * surplus
+
+    def _duration(self, route: List[int]) -> float:
+        """Working time of a route in minutes (travel, service and waiting)"""
+        if len(route) <= 2:
+            return 0.0
+        if self.time_constraints is not None:
+            _, _, back = self.time_constraints.schedule(route)
+            return back - self.time_constraints.departure
+        d = self.distances
+        travel = float(d[route[:-1], route[1:]].sum()) * self._report_scale
+        return travel + sum(self.service_times[node] for node in route[1:-1])
+
+    @staticmethod
+    def _index(routes: List[List[int]], n: int) -> Tuple[List[int], List[int]]:
+        """Route and position of every routed client"""
+        route_of, pos = [-1] * n, [0] * n
+        for r, route in enumerate(routes):
+            for p in range(1, len(route) - 1):
+                route_of[route[p]] = r
+                pos[route[p]] = p
+        return route_of, pos
+
+    def _pick(self, size: int, power: float = 3.0) -> int:
+        """Randomized index biased towards the front of a sorted list"""
+        return min(size - 1, int(self.rng.random() ** power * size))
+
+    # ------------------------------------------------------------------
+    # Destroy operators
+    # ------------------------------------------------------------------
+
+    def _destroy(self, name: str, routes: List[List[int]], q: int) -> List[int]:
+        routed = [node for route in routes for node in route[1:-1]]
+        q = min(q, len(routed))
+        if q == 0:
+            return []  # Every client is left out (prize-collecting): nothing to remove
+        if name == "random":
+            removed = self.rng.sample(routed, q)
+        elif name == "worst":
+            removed = self._worst_removal(routes, q)
+        elif name == "longest":
+            removed = self._longest_removal(routes, routed, q)
+        else:
+            removed = self._shaw_removal(routed, q)
+
+        drop = set(removed)
+        for r, route in enumerate(routes):
+            if any(node in drop for node in route):
+                routes[r] = [node for node in route if node not in drop]
+        return removed
+
+    def _worst_removal(self, routes: List[List[int]], q: int) -> List[int]:
+        """Remove clients whose detour is largest (randomized)"""
+        d = self.distances
+        nodes, gains = [], []
+        for route in routes:
+            if len(route) <= 2:
+                continue
+            arr = np.asarray(route)
+            prev, node, nxt = arr[:-2], arr[1:-1], arr[2:]
+            nodes.extend(node.tolist())
+            gains.append(d[prev, node] + d[node, nxt] - d[prev, nxt])
+        order = [nodes[i] for i in np.argsort(-np.concatenate(gains), kind="stable")]
+        removed = []
+        while len(removed) < q:
+            removed.append(order.pop(self._pick(len(order))))
+        return removed
+
+    def _longest_removal(self, routes: List[List[int]], routed: List[int], q: int) -> List[int]:
+        """Remove random clients of the longest route (topped up with random clients)"""
+        longest = max(routes, key=self._duration)[1:-1]
+        removed = self.rng.sample(longest, min(q, len(longest)))
+        if len(removed) < q:
+            drop = set(removed)
+            removed += self.rng.sample([node for node in routed if node not in drop], q - len(removed))
+        return removed
+
+    def _shaw_removal(self, routed: List[int], q: int) -> List[int]:
+        """Remove clients related to a random seed client (distance and demand)"""
+        seed = self.rng.choice(routed)
+        candidates = np.asarray(routed)
+        dist = self.distances[seed, candidates]
+        demand = np.asarray(self.demands)[candidates]
+        scale_d = dist.max() or 1.0
+        scale_q = (np.abs(demand - self.demands[seed]).max()) or 1.0
+        related = dist / scale_d + 0.2 * np.abs(demand - self.demands[seed]) / scale_q
+        order = candidates[np.argsort(related, kind="stable")].tolist()
+        removed = [order.pop(0)]
+        while len(removed) < q:
+            removed.append(order.pop(self._pick(len(order), power=6.0)))
+        return removed
+
+    # ------------------------------------------------------------------
+    # Repair operators
+    # ------------------------------------------------------------------
+
+    def _repair(self, name: str, routes: List[List[int]], removed: List[int]) -> bool:
+        """
+        Reinsert the removed clients, False if one does not fit anywhere. With
+        prizes the unvisited clients are candidates too, and a client only
+        goes in where that costs less than its prize
+        """
+        n = len(self.distances)
+        self._route_of, self._pos = self._index(routes, n)
+        if self.prizes is not None:
+            pool = set(removed)
+            removed = list(removed) + [i for i in range(1, n) if self._route_of[i] < 0 and i not in pool]
+        self._loads = [sum(self.demands[node] for node in route) for route in routes]
+        if self.time_constraints is not None:
+            self._starts, self._slacks = [], []
+            for r, route in enumerate(routes):
+                starts, slacks = self._schedule(r, route)
+                self._starts.append(starts)
+                self._slacks.append(slacks)
+        if name == "greedy":
+            order = list(removed)
+            self.rng.shuffle(order)
+            for client in order:
+                options = self._insertion_options(routes, client)
+                if not options or not self._worth_inserting(client, min(options.values())[0]):
+                    if self.prizes is None:
+                        return False
+                    continue  # Left out: cheaper to lose the prize
+                cost, r, p = min(options.values())
+                self._insert(routes, client, r, p)
+            return True
+        return self._regret_insertion(routes, removed)
+
+    def _regret_insertion(self, routes: List[List[int]], removed: List[int]) -> bool:
+        """Insert the client with the largest regret over its k best routes first"""
+        pending = set(removed)
+        options = {client: self._insertion_options(routes, client) for client in removed}
+        while pending:
+            chosen, chosen_key = None, None
+            for client in sorted(pending):
+                costs = sorted(options[client].values())
+                if not costs or not self._worth_inserting(client, costs[0][0]):
+                    if self.prizes is None:
+                        return False
+                    pending.discard(client)  # Left out: cheaper to lose the prize
+                    continue
+                regret = 0.0
+                for h in range(1, self.regret_k):
+                    regret += (costs[h][0] if h < len(costs) else 1e9) - costs[0][0]
+                key = (regret, -costs[0][0])
+                if chosen_key is None or key > chosen_key:
+                    chosen, chosen_key = client, key
+            if chosen is None:
+                break
+            _, r, p = min(options[chosen].values())
+            self._insert(routes, chosen, r, p)
+            pending.discard(chosen)
+            # Only options that involve the modified route are stale
+            for client in pending:
+                if r in options[client] or chosen in self.neighbors[client]:
+                    options[client] = self._insertion_options(routes, client)
+        return True
+
+    def _worth_inserting(self, client: int, cost: float) -> bool:
+        return self.prizes is None or cost < self.prizes[client]
+
+    def _insertion_options(self, routes: List[List[int]], client: int) -> Dict[int, Tuple[float, int, int]]:
+        """Best (cost, route, position) per route, searched next to the client's neighbours"""
+        d = self.distances
+        demand = self.demands[client]
+        slots = set()
+        for v in self.neighbors[client]:
+            r = self._route_of[v]
+            if r >= 0:
+                slots.add((r, self._pos[v] - 1))
+                slots.add((r, self._pos[v]))
+        for r, route in enumerate(routes):
+            if len(route) == 2:
+                slots.add((r, 0))
+
+        best = {}
+        for r, p in slots:
+            if self._loads[r] + demand > self.capacity[r]:
+                continue
+            a, b = routes[r][p], routes[r][p + 1]
+            if self.time_constraints is not None and \
+                    not self._time_feasible(r, p, a, client, b, routes[r]):
+                continue
+            cost = d[a, client] + d[client, b] - d[a, b]
+            if r >= self._n_vehicles:
+                cost += self._surplus_penalty
+            if r not in best or cost < best[r][0]:
+                best[r] = (cost, r, p)
+
+        if not best:
+            # No feasible slot near the neighbours: scan every route
+            for r, route in enumerate(routes):
+                if self._loads[r] + demand > self.capacity[r]:
+                    continue
+                arr = np.asarray(route)
+                costs = d[arr[:-1], client] + d[client, arr[1:]] - d[arr[:-1], arr[1:]]
+                if self.time_constraints is not None:
+                    for p in range(len(route) - 1):
+                        if not self._time_feasible(r, p, route[p], client, route[p + 1], route):
+                            costs[p] = np.inf
+                p = int(np.argmin(costs))
+                if np.isfinite(costs[p]):
+                    penalty = self._surplus_penalty if r >= self._n_vehicles else 0.0
+                    best[r] = (float(costs[p]) + penalty, r, p)
+        return best
+
+    def _schedule(self, r: int, route: List[int]) -> Tuple[List[float], List[float]]:
+        """Service start times and maximum push-forward of every stop of a route"""
+        tc = self.time_constraints
+        starts, waits = [tc.departure], [0.0]
+        for prev, node in zip(route, route[1:]):
+            departure = starts[-1] + tc.service_times[prev]
+            arrival = departure + tc.travel(prev, node, departure)
+            start = max(arrival, tc.earliest[node]) if node != 0 else arrival
+            starts.append(start)
+            waits.append(start - arrival)
+
+        slacks = [0.0] * len(route)
+        slacks[-1] = tc.return_limit(r) - starts[-1]
+        for p in range(len(route) - 2, -1, -1):
+            latest = tc.latest[route[p]] if p > 0 else tc.departure
+            slacks[p] = min(latest - starts[p], waits[p + 1] + slacks[p + 1])
+        return starts, slacks
+
+    def _time_feasible(self, r: int, p: int, a: int, client: int, b: int,
+                       route: List[int]) -> bool:
+        """
+        O(1) check of inserting client between positions p and p + 1 of route r.
+        With a travel profile a delay does not shift the rest of the route
+        by the same amount: the route is re-scheduled from position p until
+        it is back on its old start times
+        """
+        tc = self.time_constraints
+        if tc.profile is not None:
+            suffix = len(route) - p - 1 if self._slacks[r][0] >= -tc.EPS else 0  # Feasible route
+            return tc.feasible_from(route[:p + 1] + [client] + route[p + 1:], p, self._starts[r][p],
+                                    r, self._starts[r], suffix)
+        arrival = self._starts[r][p] + tc.service_times[a] + tc.travel_times[a][client]
+        if arrival > tc.latest[client] + tc.EPS:
+            return False
+        start = max(arrival, tc.earliest[client])
+        arrival_b = start + tc.service_times[client] + tc.travel_times[client][b]
+        return arrival_b <= self._starts[r][p + 1] + self._slacks[r][p + 1] + tc.EPS
+
+    def _insert(self, routes: List[List[int]], client: int, r: int, p: int):
+        route = routes[r]
+        route.insert(p + 1, client)
+        self._loads[r] += self.demands[client]
+        for idx in range(p + 1, len(route) - 1):
+            self._route_of[route[idx]] = r
+            self._pos[route[idx]] = idx
+        if self.time_constraints is not None:
+            self._starts[r], self._slacks[r] = self._schedule(r, route)
@@ -0,0 +1,335 @@
+"""
+CVRPLIB benchmark runner
+
+Runs the routing engines on every TSPLIB/CVRPLIB .vrp instance of a
+directory and records objective, gap to the best known value (from the
+matching .sol file), runtime and peak memory:
+
+    python benchmark.py instances/ --engines mip heuristic alns --time-limit 60
+
+Results are written as CSV and JSON next to a per-engine summary, tagged
+with the current git commit so that runs can be compared with --compare.
+"""
+import argparse
+import csv
+import glob
+import json
+import math
+import os
+import subprocess
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import resource  # Peak memory of the worker process (Unix only)
+except ImportError:
+    resource = None
+
+
+def _round_euclidean(points: np.ndarray, rounding: str) -> np.ndarray:
+    delta = points[:, None, :] - points[None, :, :]
+    dist = np.sqrt((delta ** 2).sum(axis=2))
+    if rounding == "EUC_2D":
+        return np.floor(dist + 0.5)  # TSPLIB nint
+    if rounding == "CEIL_2D":
+        return np.ceil(dist)
+    return dist
+
+
+def _explicit_matrix(values: List[float], n: int, fmt: str) -> np.ndarray:
+    """Full matrix from an EDGE_WEIGHT_SECTION"""
+    matrix = np.zeros((n, n))
+    it = iter(values)
+    if fmt == "FULL_MATRIX":
+        return np.array(values[:n * n], dtype=float).reshape(n, n)
+    for i in range(n):
+        if fmt == "LOWER_ROW":
+            cols = range(i)
+        elif fmt == "LOWER_DIAG_ROW":
+            cols = range(i + 1)
+        elif fmt == "UPPER_ROW":
+            cols = range(i + 1, n)
+        elif fmt == "UPPER_DIAG_ROW":
+            cols = range(i, n)
+        else:
+            raise ValueError(f"Unsupported EDGE_WEIGHT_FORMAT: {fmt}")
+        for j in cols:
+            matrix[i, j] = matrix[j, i] = next(it)
+    return matrix
+
+
+def read_vrp(filename: str) -> Dict[str, Any]:
+    """
+    Parse a TSPLIB/CVRPLIB .vrp file
+
+    Returns:
+        name, distance matrix (depot at index 0), demands, capacity,
+        vehicles (from VEHICLES or the "-k" suffix of the name, else the
+        capacity lower bound) and coordinates when given
+    """
+    header, sections, current = {}, {}, None
+    with open(filename) as f:
+        for raw in f:
+            line = raw.strip()
+            if not line or line == "EOF":
+                continue
+            if line.upper().endswith("_SECTION"):
+                current = line.upper()
+                sections[current] = []
+            elif ":" in line:
+                key, value = line.split(":", 1)
+                header[key.strip().upper()] = value.strip()
+                current = None
+            elif current is not None:
+                sections[current].extend(line.split())
+
+    n = int(header["DIMENSION"])
+    ids = None
+    coords = None
+    if "NODE_COORD_SECTION" in sections:
+        values = sections["NODE_COORD_SECTION"]
+        rows = [values[k:k + 3] for k in range(0, len(values), 3)]
+        ids = [int(r[0]) for r in rows]
+        coords = np.array([[float(r[1]), float(r[2])] for r in rows])
+
+    weight_type = header.get("EDGE_WEIGHT_TYPE", "EUC_2D")
+    if weight_type == "EXPLICIT":
+        matrix = _explicit_matrix([float(v) for v in sections["EDGE_WEIGHT_SECTION"]], n,
+                                  header.get("EDGE_WEIGHT_FORMAT", "FULL_MATRIX"))
+    else:
+        matrix = _round_euclidean(coords, weight_type)
+    ids = ids or list(range(1, n + 1))
+
+    values = sections.get("DEMAND_SECTION", [])
+    demand_by_id = {int(values[k]): float(values[k + 1]) for k in range(0, len(values), 2)}
+    depots = [int(v) for v in sections.get("DEPOT_SECTION", ["1"]) if int(v) > 0]
+    depot = ids.index(depots[0])
+
+    # Depot first, clients in file order
+    order = [depot] + [k for k in range(n) if k != depot]
+    capacity = float(header["CAPACITY"])
+    demands = [demand_by_id.get(ids[k], 0.0) for k in order]
+    demands[0] = 0.0
+
+    name = header.get("NAME", os.path.splitext(os.path.basename(filename))[0])
+    vehicles = header.get("VEHICLES")
+    if vehicles is None and "-k" in name:
+        vehicles = name.rsplit("-k", 1)[1].split("-")[0]
+    vehicles = int(vehicles) if vehicles and str(vehicles).isdigit() else \
+        max(1, math.ceil(sum(demands) / capacity))
+
+    return {
+        "name": name,
+        "file_ids": [ids[k] for k in order],
+        "distances": matrix[np.ix_(order, order)],
+        "demands": demands,
+        "capacity": capacity,
+        "vehicles": vehicles,
+        "locations": [tuple(coords[k]) for k in order] if coords is not None else None,
+    }
+
+
+def read_sol(filename: str) -> Tuple[Optional[float], List[List[int]]]:
+    """Best known cost and routes (client numbers as in the file, depot omitted)"""
+    cost, routes = None, []
+    with open(filename) as f:
+        for line in f:
+            line = line.strip()
+            if line.lower().startswith("route"):
+                routes.append([int(v) for v in line.split(":", 1)[1].split()])
+            elif line.lower().startswith("cost"):
+                cost = float(line.split()[1])
+    return cost, routes
+
+
+def check_routes(routes: List[List[int]], instance: Dict[str, Any]) -> Tuple[float, bool]:
+    """Independent objective and feasibility check (every client once, capacity)"""
+    distances, demands = instance["distances"], instance["demands"]
+    visits = [node for route in routes for node in route if node != 0]
+    feasible = sorted(visits) == list(range(1, len(demands))) and all(
+        sum(demands[node] for node in route) <= instance["capacity"] + 1e-9 for route in routes)
+    objective = float(sum(distances[a, b] for route in routes for a, b in zip(route, route[1:])))
+    return objective, feasible
+
+
+def make_solver(engine: str, time_limit: int):
+    """Solver instance for an engine name"""
+    from solver import PersonnelRoutingSolver
+    if engine == "mip":
+        return PersonnelRoutingSolver(time_limit=time_limit)
+    if engine == "heuristic":
+        return PersonnelRoutingSolver(time_limit=time_limit, fast_mode=True)
+    if engine == "alns":
+        from alns import ALNSSolver
+        return ALNSSolver(time_limit=time_limit)
+    if engine == "column_generation":
+        from column_generation import ColumnGenerationSolver
+        return ColumnGenerationSolver(time_limit=time_limit)
+    if engine == "decomposition":
+        from decomposition import ClusterFirstSolver
+        return ClusterFirstSolver(time_limit=time_limit)
+    if engine == "portfolio":
+        from portfolio import PortfolioSolver
+        return PortfolioSolver(time_limit=time_limit)
+    raise ValueError(f"Unknown engine: {engine}")
+
+
+# Gurobi status codes returned by the MIP engine
+GUROBI_STATUS = {2: "Optimal", 3: "Infeasible", 9: "Time limit", 11: "Interrupted"}
+
+ENGINES = ("mip", "heuristic", "alns", "column_generation", "decomposition", "portfolio")
+
+
+def run_engine(engine: str, instance: Dict[str, Any], time_limit: int) -> Dict[str, Any]:
+    """Solve one instance with one engine (runs in a fresh worker process)"""
+    solver = make_solver(engine, time_limit)
+    k = instance["vehicles"]
+    kwargs = {"locations": instance["locations"]} if engine == "decomposition" else {}
+    start = time.perf_counter()
+    solution = solver.solve_vrp(instance["distances"], n_vehicles=k,
+                                vehicle_capacities=[instance["capacity"]] * k,
+                                demands=instance["demands"], **kwargs)
+    runtime = time.perf_counter() - start
+
+    objective, feasible = check_routes(solution.routes, instance) if solution.routes else (None, False)
+    peak = None
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+    return {
+        "status": GUROBI_STATUS.get(solution.status, str(solution.status)),
+        "objective": objective,
+        "feasible": feasible,
+        "routes": len([route for route in solution.routes if len(route) > 2]),
+        "runtime_s": runtime,
+        "peak_memory_mb": peak,
+    }
+
+
+def git_commit(path: str) -> str:
+    """Short hash of the current commit, or "unknown" outside a git checkout"""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=path, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_benchmark(directory: str, engines: List[str], time_limit: int,
+                  max_size: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Run every engine on every .vrp file of the directory"""
+    records = []
+    commit = git_commit(os.path.dirname(os.path.abspath(__file__)))
+    for filename in sorted(glob.glob(os.path.join(directory, "*.vrp"))):
+        instance = read_vrp(filename)
+        n_clients = len(instance["demands"]) - 1
+        if max_size is not None and n_clients > max_size:
+            continue
+        sol_file = os.path.splitext(filename)[0] + ".sol"
+        best_known = read_sol(sol_file)[0] if os.path.exists(sol_file) else None
+
+        for engine in engines:
+            record = {"commit": commit, "instance": instance["name"], "clients": n_clients,
+                      "vehicles": instance["vehicles"], "engine": engine, "time_limit": time_limit,
+                      "best_known": best_known}
+            try:
+                # A fresh process per run isolates crashes and the peak memory figure
+                with ProcessPoolExecutor(max_workers=1) as pool:
+                    record.update(pool.submit(run_engine, engine, instance, time_limit).result())
+            except Exception as e:
+                record.update({"status": f"Error: {e}", "objective": None, "feasible": False,
+                               "routes": 0, "runtime_s": None, "peak_memory_mb": None})
+            if record["objective"] is not None and best_known:
+                record["gap_percent"] = 100.0 * (record["objective"] - best_known) / best_known
+            else:
+                record["gap_percent"] = None
+            records.append(record)
+            print(f"{record['instance']:<20} {engine:<18} {record['status']:<28} "
+                  f"obj={_fmt(record['objective'])} gap={_fmt(record['gap_percent'])}% "
+                  f"t={_fmt(record['runtime_s'])}s")
+    return records
+
+
+def summarize(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Per-engine aggregates: solved and feasible counts, mean/median gap, runtime, memory"""
+    summary = []
+    for engine in dict.fromkeys(r["engine"] for r in records):
+        rows = [r for r in records if r["engine"] == engine]
+        gaps = [r["gap_percent"] for r in rows if r["feasible"] and r["gap_percent"] is not None]
+        runtimes = [r["runtime_s"] for r in rows if r["runtime_s"] is not None]
+        memory = [r["peak_memory_mb"] for r in rows if r["peak_memory_mb"] is not None]
+        summary.append({
+            "commit": rows[0]["commit"],
+            "engine": engine,
+            "instances": len(rows),
+            "feasible": sum(1 for r in rows if r["feasible"]),
+            "mean_gap_percent": float(np.mean(gaps)) if gaps else None,
+            "median_gap_percent": float(np.median(gaps)) if gaps else None,
+            "mean_runtime_s": float(np.mean(runtimes)) if runtimes else None,
+            "max_peak_memory_mb": max(memory) if memory else None,
+        })
+    return summary
+
+
+def compare(previous: List[Dict[str, Any]], current: List[Dict[str, Any]]):
+    """Print per-instance objective and runtime changes against an earlier results file"""
+    before = {(r["instance"], r["engine"]): r for r in previous}
+    print(f"\n{'instance':<20} {'engine':<18} {'objective':>22} {'runtime (s)':>22}")
+    for r in current:
+        old = before.get((r["instance"], r["engine"]))
+        if old is None:
+            continue
+        print(f"{r['instance']:<20} {r['engine']:<18} "
+              f"{_fmt(old['objective']):>10} -> {_fmt(r['objective']):<10} "
+              f"{_fmt(old['runtime_s']):>10} -> {_fmt(r['runtime_s']):<10}")
+
+
+def _fmt(value) -> str:
+    return "-" if value is None else f"{value:.2f}"
+
+
+def write_results(records: List[Dict[str, Any]], summary: List[Dict[str, Any]], output: str) -> str:
+    """Write <commit>_results.csv/.json and <commit>_summary.csv, return the JSON path"""
+    os.makedirs(output, exist_ok=True)
+    prefix = os.path.join(output, f"{records[0]['commit']}" if records else "empty")
+    for rows, suffix in ((records, "results"), (summary, "summary")):
+        if rows:
+            with open(f"{prefix}_{suffix}.csv", "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+                writer.writeheader()
+                writer.writerows(rows)
+    with open(f"{prefix}_results.json", "w") as f:
+        json.dump({"records": records, "summary": summary}, f, indent=2)
+    return f"{prefix}_results.json"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the routing engines on CVRPLIB instances")
+    parser.add_argument("directory", help="directory with .vrp (and optional .sol) files")
+    parser.add_argument("--engines", nargs="+", default=["mip", "heuristic", "alns"], choices=ENGINES)
+    parser.add_argument("--time-limit", type=int, default=30, help="seconds per run")
+    parser.add_argument("--max-size", type=int, default=None, help="skip instances with more clients")
+    parser.add_argument("--output", default="benchmark_results", help="output directory")
+    parser.add_argument("--compare", default=None, help="earlier *_results.json to compare with")
+    args = parser.parse_args()
+
+    records = run_benchmark(args.directory, args.engines, args.time_limit, args.max_size)
+    summary = summarize(records)
+    path = write_results(records, summary, args.output)
+
+    print(f"\n{'engine':<18} {'feasible':>9} {'mean gap %':>11} {'median gap %':>13} "
+          f"{'mean time s':>12} {'peak MB':>9}")
+    for row in summary:
+        print(f"{row['engine']:<18} {row['feasible']:>4}/{row['instances']:<4} "
+              f"{_fmt(row['mean_gap_percent']):>11} {_fmt(row['median_gap_percent']):>13} "
+              f"{_fmt(row['mean_runtime_s']):>12} {_fmt(row['max_peak_memory_mb']):>9}")
+    print(f"\nResults written to {path}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f)["records"], records)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,484 @@
+import heapq
+import time
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+from solver import PersonnelRoutingSolver, Solution, gp, GRB
+from alns import ALNSSolver
+from heuristics import TimeConstraints, objective_weights
+from local_search import nearest_neighbors
+
+
+class ColumnGenerationSolver(PersonnelRoutingSolver):
+    """
+    Set-partitioning solver with routes as columns
+
+    The master LP selects routes so that every client is covered exactly once
+    and every vehicle type drives exactly as many routes as it has vehicles
+    (as in the MIP models, every rep leaves the depot). Columns are priced by
+    a labelling algorithm for the elementary shortest path problem with
+    resource constraints (load, time windows, shift), relaxed to ng-routes:
+    a label only remembers the visited clients that lie in the ng
+    neighbourhood of its current node. A heuristic pricing pass on a sparse
+    graph runs first; exact pricing proves the LP bound. The integer solution
+    comes from the restricted master solved as a MIP over all generated
+    columns plus the routes of a short ALNS run (no branching), so the
+    reported gap is against the LP bound.
+    """
+
+    EPS = 1e-6
+    HEURISTIC_BUCKET = 8  # Labels kept per node by the heuristic pricing
+
+    def __init__(self, time_limit: int = 30, mip_gap: float = 0.01,
+                 ng_size: int = 8,
+                 heuristic_neighbors: int = 10,
+                 max_new_columns: int = 30,
+                 max_columns: int = 1500,
+                 label_limit: int = 200000,
+                 heuristic_time_fraction: float = 0.15,
+                 lp_time_fraction: float = 0.6):
+        super().__init__(time_limit=time_limit, mip_gap=mip_gap)
+        self.ng_size = ng_size  # Size of the ng neighbourhoods (nearest clients, node included)
+        self.heuristic_neighbors = heuristic_neighbors  # Arcs kept by the heuristic pricing
+        self.max_new_columns = max_new_columns  # Columns added per pricing round and vehicle type
+        self.max_columns = max_columns  # Column pool size (non-basic columns are purged beyond it)
+        self.label_limit = label_limit  # Labels per pricing call; exceeding it voids the proof
+        self.heuristic_time_fraction = heuristic_time_fraction  # Share of the time limit for ALNS
+        self.lp_time_fraction = lp_time_fraction  # Share of the time limit for the LP phase
+        self._heuristic = None
+
+    def solve_vrp(self,
+                  distances: np.ndarray,
+                  n_vehicles: int = 1,
+                  vehicle_capacities: List[int] = None,
+                  demands: List[int] = None,
+                  service_times: Optional[List[float]] = None,
+                  time_windows: Optional[List[Optional[Tuple[float, float]]]] = None,
+                  max_shift_duration=None,
+                  travel_times: Optional[np.ndarray] = None,
+                  prizes: Optional[List[float]] = None,
+                  objective: str = "total",
+                  makespan_weight: float = 1.0,
+                  travel_profile=None,
+                  **kwargs) -> Solution:
+        """
+        Solve the VRP by column generation
+
+        Accepts the same arguments as PersonnelRoutingSolver.solve_vrp and
+        minimizes total travel time like the MIP models. With prizes, clients
+        are covered at most once, reps may stay idle and every column is
+        credited with the prizes of its clients. Pricing always works on
+        travel time: with a makespan term in the objective, the integer
+        master bounds the longest selected column instead and the LP bound
+        no longer proves a gap (gap is reported as 1). The
+        Solution reports the LP bound gap in gap, the number of column
+        generation iterations in node_count and the details in stats.
+        Labels use static travel times: travel_profile is not supported.
+        """
+        if travel_profile is not None:
+            raise ValueError("ColumnGenerationSolver does not support travel_profile")
+        if gp is None:
+            # No LP solver: fall back to the heuristic pipeline
+            return super().solve_vrp(distances, n_vehicles, vehicle_capacities, demands, service_times,
+                                     time_windows=time_windows, max_shift_duration=max_shift_duration,
+                                     travel_times=travel_times, prizes=prizes, objective=objective,
+                                     makespan_weight=makespan_weight)
+
+        start_time = time.time()
+        self._start_progress()
+        n = len(distances)
+
+        if service_times is None:
+            service_times = [0] * n
+        if demands is None:
+            demands = [0] * n
+        if vehicle_capacities is None:
+            vehicle_capacities = [1000] * n_vehicles
+
+        self.model = None
+        distances = np.asarray(distances, dtype=float)
+        travel_times = self._travel_times(distances, travel_times)
+        time_constraints = self._make_time_constraints(
+            distances, service_times, n_vehicles, time_windows, max_shift_duration, travel_times)
+        tc = time_constraints or TimeConstraints(travel_times, list(service_times))
+
+        if n - 1 < n_vehicles:
+            return Solution([], 0, 0, 0, 0, "Infeasible", time.time() - start_time)
+
+        # Vehicle types: identical (capacity, return limit) pairs share one fleet constraint
+        types: Dict[Tuple[float, float], int] = {}
+        self._vehicle_types = [types.setdefault((vehicle_capacities[k], tc.return_limit(k)), len(types))
+                               for k in range(n_vehicles)]
+        self._types = list(types)
+
+        self._n = n
+        self._tau = travel_times.tolist()
+        self._service = list(service_times)
+        self._demands = list(demands)
+        self._tc = tc
+        self._prizes = prizes
+        self._weights = objective_weights(objective, makespan_weight)
+        self._ng = [sum(1 << j for j in row) for row in self._ng_neighbourhoods(travel_times)]
+        self._full_arcs = [[j for j in range(1, n) if j != i] for i in range(n)]
+        sparse = nearest_neighbors(travel_times, self.heuristic_neighbors).tolist()
+        self._sparse_arcs = [[j for j in sparse[i] if j != i] for i in range(n)]
+
+        try:
+            self._build_master(travel_times)
+
+            # Initial columns: a short ALNS run (upper bound and MIP start) and
+            # one single-client route per client
+            heuristic = ALNSSolver(time_limit=max(1, int(self.heuristic_time_fraction * self.time_limit)))
+            heuristic.progress_callback = self.progress_callback
+            heuristic.progress_interval = self.progress_interval
+            self._heuristic = heuristic
+            heuristic.solve_vrp(travel_times, n_vehicles, vehicle_capacities, demands, service_times,
+                                time_windows=time_windows, max_shift_duration=max_shift_duration,
+                                travel_times=travel_times, prizes=prizes, objective=objective,
+                                makespan_weight=makespan_weight)
+            self._heuristic = None
+            start_routes = heuristic.solution.routes
+            self._incumbent = (start_routes, self._weighted_objective(
+                start_routes, travel_times, service_times, self._weights, tc, prizes))
+            self._protected = set()
+            for k, route in enumerate(start_routes[:n_vehicles]):
+                if self._route_feasible(route, self._vehicle_types[k]):
+                    self._protected.add(self._add_column(route, self._vehicle_types[k]))
+            for route in [route for route in start_routes if len(route) > 2] + \
+                    [[0, i, 0] for i in range(1, n)]:
+                for t in range(len(self._types)):
+                    if self._route_feasible(route, t):
+                        self._add_column(route, t)
+
+            lp_bound, exact, iterations = self._column_generation(
+                start_time + (self.heuristic_time_fraction + self.lp_time_fraction) * self.time_limit)
+
+            routes, objective = self._integer_master(start_time)
+            if routes is None:
+                return Solution([], 0, 0, 0, 0, "Infeasible", time.time() - start_time)
+
+            if self._weights[1] > 0:
+                lp_bound = None  # Bounds the travel time only
+            gap = (objective - lp_bound) / objective if lp_bound is not None and objective > 0 else 1.0
+            gap = max(0.0, gap)
+            if lp_bound is not None and gap <= self.mip_gap:
+                status = "Optimal (column generation)"
+            else:
+                status = "Column generation"
+                routes = self._polish(routes, travel_times, vehicle_capacities, demands,
+                                      time_constraints, prizes, service_times, self._weights)
+
+            self.solution = self._build_solution(routes, distances, service_times, status,
+                                                 start_time, node_count=iterations, gap=gap,
+                                                 time_constraints=time_constraints,
+                                                 travel_times=travel_times, prizes=prizes)
+            self.solution.stats = {
+                "iterations": iterations,
+                "columns": len(self._columns),
+                "lp_bound": lp_bound,
+                "pricing_exact": exact,
+                "master_objective": objective,
+            }
+            return self.solution
+
+        except gp.GurobiError as e:
+            print(f"Gurobi error: {e}")
+            return Solution([], 0, 0, 0, 0, f"Error: {e}", time.time() - start_time)
+
+    # ------------------------------------------------------------------
+    # Master problem
+    # ------------------------------------------------------------------
+
+    def _build_master(self, travel_times: np.ndarray):
+        """
+        Set-partitioning LP with artificial columns that keep it feasible
+        (set packing with the prizes as a constant, prize-collecting mode)
+        """
+        n = self._n
+        self.model = gp.Model("Set_Partitioning_Master")
+        self.model.setParam('OutputFlag', 0)
+        for name, value in self.gurobi_params.items():
+            self.model.setParam(name, value)
+        sense = GRB.EQUAL if self._prizes is None else GRB.LESS_EQUAL
+        self._cover = [None] + [self.model.addLConstr(gp.LinExpr(), sense, 1, name=f"cover_{i}")
+                                for i in range(1, n)]
+        self._fleet = [self.model.addLConstr(gp.LinExpr(), sense, len(self._fleet_vehicles(t)),
+                                             name=f"fleet_{t}")
+                       for t in range(len(self._types))]
+        if self._prizes is not None:
+            self.model.ObjCon = float(sum(self._prizes[1:]))
+        self._columns: List[Tuple[Tuple[int, ...], int]] = []
+        self._vars = []
+        self._known = set()
+
+        penalty = 2.0 * float(travel_times.max()) * n + 1.0
+        self._artificial = [self.model.addVar(obj=penalty, column=gp.Column([1.0], [self._cover[i]]),
+                                              name=f"artificial_{i}")
+                            for i in range(1, n)]
+
+    def _add_column(self, route: List[int], t: int) -> Tuple[Tuple[int, ...], int]:
+        """Add a route for vehicle type t to the master (once), return its key"""
+        key = (tuple(route), t)
+        if key in self._known:
+            return key
+        counts = {}
+        for node in route[1:-1]:
+            counts[node] = counts.get(node, 0) + 1
+        constrs = [self._cover[i] for i in counts] + [self._fleet[t]]
+        coeffs = [float(c) for c in counts.values()] + [1.0]
+        cost = sum(self._tau[a][b] for a, b in zip(route, route[1:]))
+        if self._prizes is not None:
+            cost -= sum(self._prizes[i] * c for i, c in counts.items())
+        var = self.model.addVar(obj=cost, column=gp.Column(coeffs, constrs))
+        self._columns.append(key)
+        self._vars.append(var)
+        self._known.add(key)
+        return key
+
+    def _column_generation(self, deadline: float) -> Tuple[Optional[float], bool, int]:
+        """
+        Solve the master LP by column generation until no negative reduced
+        cost route exists or the deadline
+
+        Returns:
+            (LP bound or None if not proven, exact pricing completed, iterations)
+        """
+        lp_bound, exact, iterations = None, False, 0
+        while time.time() < deadline and not self._stop_requested:
+            iterations += 1
+            self.model.optimize()
+            if self.model.status != GRB.OPTIMAL:
+                return None, False, iterations
+            duals = [0.0] + [constr.Pi for constr in self._cover[1:]]
+            if self._prizes is not None:
+                # Pricing works on travel time: credit each client with its prize
+                duals = [dual + prize for dual, prize in zip(duals, self._prizes)]
+            sigma = [constr.Pi for constr in self._fleet]
+
+            new_columns = []
+            for t in range(len(self._types)):
+                columns, _ = self._price(duals, sigma[t], t, heuristic=True, deadline=deadline)
+                new_columns += [(route, t) for route, _ in columns]
+
+            if not new_columns:
+                exact, best = True, []
+                for t in range(len(self._types)):
+                    columns, complete = self._price(duals, sigma[t], t, heuristic=False,
+                                                    deadline=deadline)
+                    exact = exact and complete
+                    best.append(min([rc for _, rc in columns], default=0.0))
+                    new_columns += [(route, t) for route, _ in columns]
+                if exact:
+                    # Lagrangian bound, valid at every iteration with exact pricing
+                    bound = self.model.ObjVal + sum(len(self._fleet_vehicles(t)) * min(0.0, best[t])
+                                                    for t in range(len(self._types)))
+                    lp_bound = bound if lp_bound is None else max(lp_bound, bound)
+                    self._report_incumbent(*self._incumbent,
+                                           bound=lp_bound if self._weights[1] == 0 else None)
+                if not new_columns:
+                    break
+
+            self._purge(len(new_columns))
+            for route, t in new_columns:
+                self._add_column(route, t)
+        else:
+            exact = False
+
+        return lp_bound, exact, iterations
+
+    def _purge(self, incoming: int):
+        """Drop the non-basic columns of highest reduced cost when the pool is full"""
+        excess = len(self._columns) + incoming - self.max_columns
+        if excess <= 0:
+            return
+        reduced = self.model.getAttr('RC', self._vars)
+        basis = self.model.getAttr('VBasis', self._vars)
+        candidates = sorted((c for c in range(len(self._vars))
+                             if basis[c] != 0 and self._columns[c] not in self._protected),
+                            key=lambda c: -reduced[c])[:excess]
+        drop = set(candidates)
+        for c in drop:
+            self.model.remove(self._vars[c])
+            self._known.discard(self._columns[c])
+        self._columns = [column for c, column in enumerate(self._columns) if c not in drop]
+        self._vars = [var for c, var in enumerate(self._vars) if c not in drop]
+
+    def _integer_master(self, start_time: float) -> Tuple[Optional[List[List[int]]], Optional[float]]:
+        """Restricted master as a MIP over the generated columns, started from the savings routes"""
+        for var in self._artificial:
+            var.UB = 0
+        self.model.setAttr('VType', self._vars, [GRB.BINARY] * len(self._vars))
+        self.model.setParam('TimeLimit', max(1.0, self.time_limit - (time.time() - start_time)))
+        self.model.setParam('MIPGap', self.mip_gap)
+        self.model.setAttr('Start', self._vars,
+                           [1.0 if key in self._protected else 0.0 for key in self._columns])
+        travel_weight, makespan_weight = self._weights
+        if makespan_weight > 0:
+            # Longest route: at least the duration of every selected column
+            self.model.update()
+            makespan = self.model.addVar(lb=0.0, name="makespan")
+            for var, (route, _) in zip(self._vars, self._columns):
+                _, _, back = self._tc.schedule(list(route))
+                self.model.addLConstr(makespan >= (back - self._tc.departure) * var)
+            self.model.setObjective(travel_weight * self.model.getObjective() + makespan_weight * makespan,
+                                    GRB.MINIMIZE)
+        if self._stop_requested:
+            return self._incumbent
+        if self.progress_callback is not None:
+            self.model.optimize(self._master_callback)
+        else:
+            self.model.optimize()
+        if self.model.SolCount == 0:
+            return None, None
+        return self._master_routes(self.model.getAttr('X', self._vars)), self.model.ObjVal
+
+    def _master_routes(self, values: List[float]) -> List[List[int]]:
+        """Routes of the selected columns, route k driven by vehicle k"""
+        routes = [[0, 0] for _ in self._vehicle_types]  # Idle reps keep an empty route
+        free = {t: list(self._fleet_vehicles(t)) for t in range(len(self._types))}
+        for c, value in enumerate(values):
+            if value > 0.5:
+                route, t = self._columns[c]
+                routes[free[t].pop(0)] = list(route)
+        return routes
+
+    def _master_callback(self, model, where):
+        """Report the incumbents of the integer master"""
+        if where == GRB.Callback.MIP:
+            self._flush_incumbent()
+        elif where == GRB.Callback.MIPSOL:
+            bound = model.cbGet(GRB.Callback.MIPSOL_OBJBND)
+            self._report_incumbent(self._master_routes(model.cbGetSolution(self._vars)),
+                                   model.cbGet(GRB.Callback.MIPSOL_OBJ),
+                                   bound if abs(bound) < GRB.INFINITY else None)
+
+    def stop(self):
+        """Stop the solve, including the ALNS run that seeds the columns"""
+        super().stop()
+        heuristic = self._heuristic
+        if heuristic is not None:
+            heuristic.stop()
+
+    # ------------------------------------------------------------------
+    # Pricing
+    # ------------------------------------------------------------------
+
+    def _fleet_vehicles(self, t: int) -> List[int]:
+        """Vehicles of type t"""
+        return [k for k, vehicle_type in enumerate(self._vehicle_types) if vehicle_type == t]
+
+    def _ng_neighbourhoods(self, travel_times: np.ndarray) -> List[List[int]]:
+        """ng_size - 1 nearest clients of every node, plus the node itself"""
+        nearest = nearest_neighbors(travel_times, max(0, self.ng_size - 1)).tolist()
+        return [[i] + row if i else [] for i, row in enumerate(nearest)]
+
+    def _route_feasible(self, route: List[int], t: int) -> bool:
+        capacity, limit = self._types[t]
+        if sum(self._demands[i] for i in route) > capacity + self.EPS:
+            return False
+        _, _, back = self._tc.schedule(route)
+        return self._tc.feasible(route) and back <= limit + self.EPS
+
+    def _price(self, duals: List[float], sigma: float, t: int, heuristic: bool,
+               deadline: float = float("inf")) -> Tuple[List[Tuple[List[int], float]], bool]:
+        """
+        Labelling algorithm for negative reduced cost ng-routes of type t
+
+        A label is [cost, load, time, memory, node, parent, alive]; memory is
+        a bitset of the clients that may not be visited next. Label L1
+        dominates L2 at the same node if it is no worse on cost, load and
+        time and its memory is a subset of L2's. The heuristic pass only
+        follows the sparse arcs, keeps the cheapest labels of every node and
+        stops once enough columns are found.
+
+        Returns:
+            (routes with their reduced cost, True if the search was complete)
+        """
+        capacity, limit = self._types[t]
+        tau, service, demands, tc = self._tau, self._service, self._demands, self._tc
+        earliest, latest = tc.earliest, tc.latest
+        arcs = self._sparse_arcs if heuristic else self._full_arcs
+        max_labels = self.label_limit // 10 if heuristic else self.label_limit
+        max_bucket = self.HEURISTIC_BUCKET if heuristic else None
+
+        buckets = [[] for _ in range(self._n)]
+        root = [0.0, 0.0, tc.departure, 0, 0, None, True]
+        heap = [(0.0, root[2], 0, root)]
+        counter, created = 1, 0
+        next_check = 1000  # Labels created before the next deadline check
+        found = []
+        complete = True
+
+        while heap:
+            _, _, _, label = heapq.heappop(heap)
+            if not label[6]:
+                continue
+            cost, load, now, memory, i = label[0], label[1], label[2], label[3], label[4]
+
+            if i != 0:
+                reduced = cost + tau[i][0] - sigma
+                if reduced < -self.EPS:
+                    found.append((reduced, label))
+
+            leave = now + service[i]
+            for j in arcs[i]:
+                if memory >> j & 1:
+                    continue
+                new_load = load + demands[j]
+                if new_load > capacity + self.EPS:
+                    continue
+                arrival = leave + tau[i][j]
+                if arrival > latest[j] + self.EPS:
+                    continue
+                arrival = max(arrival, earliest[j])
+                if arrival + service[j] + tau[j][0] > limit + self.EPS:
+                    continue
+                new_cost = cost + tau[i][j] - duals[j]
+                new_memory = (memory & self._ng[j]) | (1 << j)
+
+                bucket = buckets[j]
+                if any(other[0] <= new_cost + self.EPS and other[1] <= new_load
+                       and other[2] <= arrival and not (other[3] & ~new_memory) for other in bucket):
+                    continue
+                new = [new_cost, new_load, arrival, new_memory, j, label, True]
+                for other in bucket:
+                    if new_cost <= other[0] and new_load <= other[1] \
+                            and arrival <= other[2] and not (new_memory & ~other[3]):
+                        other[6] = False
+                bucket = [other for other in bucket if other[6]]
+                bucket.append(new)
+                if max_bucket is not None and len(bucket) > max_bucket:
+                    worst = max(bucket, key=lambda other: other[0])
+                    worst[6] = False
+                    bucket.remove(worst)
+                buckets[j] = bucket
+                heapq.heappush(heap, (new_load, arrival, counter, new))
+                counter += 1
+                created += 1
+
+            if created > max_labels or (heuristic and len(found) >= 5 * self.max_new_columns):
+                complete = False
+                break
+            if created >= next_check:
+                # Several labels may be created per pop: compare, do not test a multiple
+                next_check = created + 1000
+                if time.time() > deadline or self._stop_requested:
+                    complete = False
+                    break
+
+        found.sort(key=lambda item: item[0])
+        routes, seen = [], set()
+        for reduced, label in found:
+            path = []
+            while label is not None:
+                path.append(label[4])
+                label = label[5]
+            route = path[::-1] + [0]
+            key = tuple(route)
+            if key in seen or (key, t) in self._known:
+                continue
+            seen.add(key)
+            routes.append((route, reduced))
+            if len(routes) >= self.max_new_columns:
+                break
+        return routes, complete
@@ -1,17 +1,80 @@
 import json
 import csv
 import random
+import struct
+import zipfile
 import numpy as np
 from typing import List, Tuple, Dict, Any
 
+from distance_matrix import DistanceMatrix
+
+# Version of the binary (.npz) instance layout written by DataManager.save_to_npz
+BINARY_SCHEMA_VERSION = 1
+
+# Client fields stored as columns of the structured array; every other field
+# (and non-numeric values such as null windows or priority labels) goes to
+# the JSON metadata
+CLIENT_DTYPE = np.dtype([
+    ("id", np.int64),
+    ("x", np.float64),
+    ("y", np.float64),
+    ("name", "U64"),
+    ("demand", np.float64),
+    ("service_time", np.float64),
+    ("priority", np.float64),
+    ("time_window_start", np.float64),
+    ("time_window_end", np.float64),
+])
+
+MATRIX_KEYS = ("distance_matrix", "travel_time_matrix")
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(value, bool)
+
+
+def _mmap_npz_member(filename: str, member: str) -> np.ndarray:
+    """
+    Memory-map an array stored uncompressed inside an .npz archive
+
+    np.load ignores mmap_mode for archives, but members written by np.savez
+    are stored as plain .npy files, so the array data can be mapped at its
+    offset in the zip file. Compressed members are read normally.
+    """
+    with zipfile.ZipFile(filename) as archive:
+        info = archive.getinfo(member + ".npy")
+        if info.compress_type != zipfile.ZIP_STORED:
+            with archive.open(info) as f:
+                return np.lib.format.read_array(f)
+
+    with open(filename, "rb") as f:
+        f.seek(info.header_offset)
+        local_header = f.read(30)
+        name_length, extra_length = struct.unpack("<HH", local_header[26:30])
+        f.seek(info.header_offset + 30 + name_length + extra_length)
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+    return np.memmap(filename, dtype=dtype, mode="r", offset=offset, shape=shape,
+                     order="F" if fortran_order else "C")
+
 
 class DataManager:
     """Manages problem data generation and persistence for sales representatives routing"""
 
     @staticmethod
     def generate_sample_data(n_clients: int = 15,
-                             grid_size: int = 100) -> Dict[str, Any]:
-        """Generate random but realistic sales routing data"""
+                             grid_size: int = 100,
+                             n_depots: int = 1) -> Dict[str, Any]:
+        """
+        Generate random but realistic sales routing data
+
+        With n_depots > 1 the extra depots are branch offices, stored under
+        "branches" and placed after the clients in the distance matrix
+        """
         data = {
             "depot": {"id": 0, "x": grid_size / 2, "y": grid_size / 2, "name": "Office"},
             "clients": [],
@@ -38,9 +101,20 @@ class DataManager:
 
         data["clients"] = clients
 
+        if n_depots > 1:
+            data["branches"] = []
+            for b in range(1, n_depots):
+                data["branches"].append({
+                    "id": n_clients + b,
+                    "x": random.uniform(10, grid_size - 10),
+                    "y": random.uniform(10, grid_size - 10),
+                    "name": f"Branch_{b}"
+                })
+                data["service_times"].append(0)
+                data["priorities"].append(2)
+
         # Create locations list for distance matrix
-        locations = [(data["depot"]["x"], data["depot"]["y"])]
-        locations.extend([(c["x"], c["y"]) for c in clients])
+        locations = DataManager.get_locations(data)
 
         # Calculate distance matrix (in km)
         from solver import PersonnelRoutingSolver
@@ -49,17 +123,234 @@ class DataManager:
 
         return data
 
+    @staticmethod
+    def get_locations(data: Dict[str, Any]) -> List[Tuple[float, float]]:
+        """(x, y) of the depot, every client and every branch office, in distance-matrix order"""
+        locations = [(data["depot"]["x"], data["depot"]["y"])]
+        locations.extend([(c["x"], c["y"]) for c in data["clients"]])
+        locations.extend([(b["x"], b["y"]) for b in data.get("branches", [])])
+        return locations
+
+    @staticmethod
+    def get_depots(data: Dict[str, Any]) -> List[int]:
+        """Distance-matrix indices of the depots: the office (0), then the branch offices"""
+        first = len(data["clients"]) + 1
+        return [0] + list(range(first, first + len(data.get("branches", []))))
+
+    @staticmethod
+    def distance_store(data: Dict[str, Any]) -> DistanceMatrix:
+        """Editable copy of the distance matrix, locations keyed by name (see add_client)"""
+        keys = [data["depot"].get("name", "Office")]
+        keys.extend(c.get("name", f"Client_{c['id']}") for c in data["clients"])
+        keys.extend(b.get("name", f"Branch_{i + 1}") for i, b in enumerate(data.get("branches", [])))
+        return DistanceMatrix.from_matrix(data["distance_matrix"], keys, DataManager.get_locations(data))
+
+    @staticmethod
+    def add_client(data: Dict[str, Any], client: Dict[str, Any], distances: DistanceMatrix) -> int:
+        """
+        Add a client without recomputing the distance matrix
+
+        The client goes after the existing clients (before the branch
+        offices, whose ids shift by one) and its distances are computed from
+        its coordinates (O(n)). data["distance_matrix"] gets a copy of the
+        store's matrix, so it stays valid after later edits of the store.
+
+        Args:
+            data: problem data, updated in place
+            client: client fields; x and y are required, id and name are set
+            distances: DataManager.distance_store(data), kept in sync
+
+        Returns:
+            Distance-matrix index (= id) of the new client
+        """
+        if data.get("travel_time_matrix") is not None:
+            raise ValueError("Road-network matrices cannot be extended, use apply_road_network again")
+        index = len(data["clients"]) + 1
+        client = dict(client, id=index)
+        if "name" not in client:
+            number = index  # Names are the keys of the store, ids are renumbered
+            while f"Client_{number}" in distances.key_index:
+                number += 1
+            client["name"] = f"Client_{number}"
+        client.setdefault("demand", 1)
+        client.setdefault("service_time", 30)
+        client.setdefault("priority", 2)
+        distances.insert(index, client["name"], client["x"], client["y"])
+
+        data["clients"].append(client)
+        for branch in data.get("branches", []):
+            branch["id"] += 1
+        for key, value in (("service_times", client["service_time"]), ("priorities", client["priority"])):
+            if key in data:
+                data[key].insert(index, value)
+        # A copy: the store's matrix is a view on a buffer that later edits overwrite
+        data["distance_matrix"] = distances.matrix.copy()
+        return index
+
+    @staticmethod
+    def remove_client(data: Dict[str, Any], client_id: int, distances: DistanceMatrix) -> Dict[str, Any]:
+        """
+        Remove a client without recomputing the distance matrix
+
+        The clients and branch offices after it move up one index and their
+        ids are renumbered, since ids are distance-matrix indices.
+        data["distance_matrix"] gets a copy of the store's matrix (see
+        add_client).
+
+        Returns:
+            The removed client
+        """
+        if data.get("travel_time_matrix") is not None:
+            raise ValueError("Road-network matrices cannot be edited, use apply_road_network again")
+        if not 1 <= client_id <= len(data["clients"]):
+            raise ValueError(f"No client with id {client_id}")
+        distances.remove(distances.keys[client_id])
+
+        client = data["clients"].pop(client_id - 1)
+        for site in data["clients"][client_id - 1:] + data.get("branches", []):
+            site["id"] -= 1
+        for key in ("service_times", "priorities"):
+            if key in data:
+                del data[key][client_id]
+        data["distance_matrix"] = distances.matrix.copy()
+        return client
+
+    @staticmethod
+    def apply_road_network(data: Dict[str, Any], network, cache=None) -> Dict[str, Any]:
+        """
+        Replace the Euclidean matrix by road distances and travel times
+
+        Args:
+            data: problem data (depot and client coordinates in the network's system)
+            network: road_network.RoadNetwork
+            cache: optional road_network.MatrixCache
+
+        Returns:
+            The same data with distance_matrix and travel_time_matrix set
+        """
+        distances, travel_times = network.travel_matrices(DataManager.get_locations(data), cache)
+        data["distance_matrix"] = distances
+        data["travel_time_matrix"] = travel_times
+        return data
+
     @staticmethod
     def save_to_json(data: Dict[str, Any], filename: str):
         """Save data to JSON file"""
         # Convert numpy arrays to lists
         serializable_data = data.copy()
-        if "distance_matrix" in serializable_data:
-            serializable_data["distance_matrix"] = serializable_data["distance_matrix"].tolist()
+        for key in ("distance_matrix", "travel_time_matrix"):
+            if key in serializable_data:
+                serializable_data[key] = np.asarray(serializable_data[key]).tolist()
 
         with open(filename, 'w') as f:
             json.dump(serializable_data, f, indent=2)
 
+    @staticmethod
+    def save_to_npz(data: Dict[str, Any], filename: str):
+        """
+        Save data in the binary instance format
+
+        Clients become a structured array (CLIENT_DTYPE), the matrices are
+        stored as raw float32 and the remaining fields as JSON metadata,
+        together with the schema version.
+        """
+        clients = data.get("clients", [])
+        table = np.zeros(len(clients), dtype=CLIENT_DTYPE)
+        extras = []
+        integer_fields = set(CLIENT_DTYPE.names) - {"id", "name"}
+        for row, client in enumerate(clients):
+            extra = {}
+            for field in CLIENT_DTYPE.names:
+                value = client.get(field)
+                if field == "name" and isinstance(value, str) and len(value) <= 64:
+                    table[row][field] = value
+                elif field != "name" and _is_number(value):
+                    table[row][field] = value
+                    if not isinstance(value, (int, np.integer)):
+                        integer_fields.discard(field)
+                else:
+                    if field != "name":
+                        table[row][field] = np.nan
+                    if field in client:
+                        extra[field] = value
+            extra.update({k: v for k, v in client.items() if k not in CLIENT_DTYPE.names})
+            extras.append(extra)
+
+        metadata = {k: v for k, v in data.items() if k not in MATRIX_KEYS and k != "clients"}
+        metadata = json.loads(json.dumps(metadata, default=lambda v: np.asarray(v).tolist()))
+        metadata["schema_version"] = BINARY_SCHEMA_VERSION
+        metadata["client_extras"] = extras if any(extras) else None
+        metadata["integer_fields"] = sorted(integer_fields)  # Restored as int on load
+
+        arrays = {"clients": table,
+                  "metadata": np.frombuffer(json.dumps(metadata).encode(), dtype=np.uint8)}
+        for key in MATRIX_KEYS:
+            if data.get(key) is not None:
+                arrays[key] = np.asarray(data[key], dtype=np.float32)
+
+        with open(filename, "wb") as f:
+            np.savez(f, **arrays)  # uncompressed, so the matrices can be memory-mapped
+
+    @staticmethod
+    def load_from_npz(filename: str, mmap: bool = True) -> Dict[str, Any]:
+        """
+        Load data saved by save_to_npz
+
+        Args:
+            filename: .npz instance file
+            mmap: map the matrices read-only instead of reading them
+
+        Returns:
+            Problem data, with the matrices as float32 arrays
+        """
+        with np.load(filename) as archive:
+            metadata = json.loads(archive["metadata"].tobytes().decode())
+            table = archive["clients"]
+            members = set(archive.files)
+
+        version = metadata.pop("schema_version", None)
+        if version is None or version > BINARY_SCHEMA_VERSION:
+            raise ValueError(f"Unsupported instance schema version: {version}")
+        extras = metadata.pop("client_extras", None)
+        integer_fields = set(metadata.pop("integer_fields", []))
+
+        columns = {field: table[field].tolist() for field in CLIENT_DTYPE.names}
+        clients = []
+        for row in range(len(table)):
+            client = {}
+            for field in CLIENT_DTYPE.names:
+                value = columns[field][row]
+                if field == "name" and value == "":
+                    continue
+                if isinstance(value, float) and value != value:  # NaN: not numeric in the source
+                    continue
+                client[field] = int(value) if field in integer_fields else value
+            if extras:
+                client.update(extras[row])
+            clients.append(client)
+
+        data = metadata
+        data["clients"] = clients
+        for key in MATRIX_KEYS:
+            if key in members:
+                data[key] = _mmap_npz_member(filename, key) if mmap else np.load(filename)[key]
+        return data
+
+    @staticmethod
+    def save(data: Dict[str, Any], filename: str):
+        """Save data as JSON or binary (.npz) depending on the extension"""
+        if filename.lower().endswith(".npz"):
+            DataManager.save_to_npz(data, filename)
+        else:
+            DataManager.save_to_json(data, filename)
+
+    @staticmethod
+    def load(filename: str) -> Dict[str, Any]:
+        """Load a JSON or binary (.npz) instance"""
+        if filename.lower().endswith(".npz"):
+            return DataManager.load_from_npz(filename)
+        return DataManager.load_from_json(filename)
+
     @staticmethod
     def load_from_json(filename: str) -> Dict[str, Any]:
         """Load data from JSON file"""
@@ -67,7 +358,8 @@ class DataManager:
             data = json.load(f)
 
         # Convert lists back to numpy arrays if needed
-        if "distance_matrix" in data:
-            data["distance_matrix"] = np.array(data["distance_matrix"])
+        for key in ("distance_matrix", "travel_time_matrix"):
+            if key in data:
+                data[key] = np.array(data[key])
 
         return data
\ No newline at end of file
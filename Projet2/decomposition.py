@@ -0,0 +1,241 @@
+import math
+import os
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+from solver import PersonnelRoutingSolver, Solution
+from local_search import LocalSearch
+from heuristics import prize_objective, select_visits, balance_routes, objective_weights
+
+
+def sweep_clusters(locations: List[Tuple[float, float]], n_clusters: int,
+                   weights: List[float], capacities: List[float]) -> List[List[int]]:
+    """
+    Sweep partition: clients sorted by polar angle around the depot are cut
+    into n_clusters contiguous sectors of balanced weight (never above the
+    capacity of the sector's vehicle). The sweep starts after the widest
+    angular gap so that no natural group is split at the origin.
+    """
+    depot_x, depot_y = locations[0]
+    clients = list(range(1, len(locations)))
+    if not clients:
+        return [[] for _ in range(n_clusters)]
+    angles = {i: math.atan2(locations[i][1] - depot_y, locations[i][0] - depot_x) for i in clients}
+    order = sorted(clients, key=lambda i: angles[i])
+
+    gaps = [(angles[order[(p + 1) % len(order)]] - angles[order[p]]) % (2 * math.pi)
+            for p in range(len(order))]
+    start = (int(np.argmax(gaps)) + 1) % len(order)
+    order = order[start:] + order[:start]
+
+    total = float(sum(weights[i] for i in clients))
+    clusters = [[] for _ in range(n_clusters)]
+    k, load, cumulative = 0, 0.0, 0.0
+    for i in order:
+        target = total * (k + 1) / n_clusters
+        if k < n_clusters - 1 and clusters[k] and (
+                load + weights[i] > capacities[k] or cumulative + weights[i] / 2 > target):
+            k += 1
+            load = 0.0
+        clusters[k].append(i)
+        load += weights[i]
+        cumulative += weights[i]
+    return clusters
+
+
+def capacitated_kmeans(locations: List[Tuple[float, float]], n_clusters: int,
+                       weights: List[float], capacities: List[float],
+                       max_iterations: int = 25) -> List[List[int]]:
+    """
+    Capacitated k-means seeded with the sweep partition
+
+    Clients are assigned by decreasing regret (distance to the second best
+    centroid minus distance to the best) to the nearest centroid with
+    remaining capacity; centroids are then moved to their cluster mean.
+    """
+    clusters = sweep_clusters(locations, n_clusters, weights, capacities)
+    points = np.asarray(locations, dtype=float)
+    clients = np.arange(1, len(points))
+    if len(clients) == 0:
+        return clusters
+
+    for _ in range(max_iterations):
+        centroids = np.array([points[c].mean(axis=0) if c else points[0] for c in clusters])
+        dist = np.linalg.norm(points[clients][:, None, :] - centroids[None, :, :], axis=2)
+        ranked = np.sort(dist, axis=1)
+        regret = ranked[:, 1] - ranked[:, 0] if n_clusters > 1 else ranked[:, 0]
+
+        new_clusters = [[] for _ in range(n_clusters)]
+        loads = [0.0] * n_clusters
+        for idx in np.argsort(-regret, kind="stable"):
+            client = int(clients[idx])
+            for k in np.argsort(dist[idx], kind="stable"):
+                if loads[k] + weights[client] <= capacities[k]:
+                    break
+            else:
+                k = int(np.argmin(dist[idx]))  # nothing fits: nearest centroid
+            new_clusters[k].append(client)
+            loads[k] += weights[client]
+
+        new_clusters = [sorted(c) for c in new_clusters]
+        if new_clusters == [sorted(c) for c in clusters]:
+            break
+        clusters = new_clusters
+    return clusters
+
+
+def _solve_cluster(args) -> Tuple[List[int], bool]:
+    """
+    Route one cluster with a single vehicle (runs in a worker process)
+
+    Returns:
+        route, False if the sub-solve failed and the route is the cluster in
+        its original order (possibly breaking windows or the shift)
+    """
+    (nodes, sub, sub_times, capacity, demands, service_times, time_windows, shift, time_limit, fast,
+     prizes, profile) = args
+    if len(nodes) <= 1:
+        return [0, 0], True
+    solver = PersonnelRoutingSolver(time_limit=time_limit, fast_mode=fast)
+    solution = solver.solve_vrp(sub, n_vehicles=1, vehicle_capacities=[capacity], demands=demands,
+                                service_times=service_times, time_windows=time_windows,
+                                max_shift_duration=shift, travel_times=sub_times, prizes=prizes,
+                                travel_profile=profile)
+    if not solution.routes and solution.dropped:
+        return [0, 0], True  # No client of the cluster is worth its detour
+    if not solution.routes:
+        # Sub-solve failed: keep the cluster in its original order
+        return list(nodes) + [0], False
+    return [nodes[i] for i in solution.routes[0]], True
+
+
+class ClusterFirstSolver(PersonnelRoutingSolver):
+    """
+    Cluster-first route-second decomposition
+
+    Clients are partitioned into one geographic cluster per vehicle (sweep or
+    capacitated k-means on the coordinates), each cluster is routed as a
+    single-vehicle problem in a process pool, and a final local search pass
+    repairs the cluster borders with inter-route moves.
+    """
+
+    def __init__(self, time_limit: int = 30, mip_gap: float = 0.01,
+                 method: str = "sweep", max_workers: Optional[int] = None,
+                 exact_limit: int = 40):
+        super().__init__(time_limit=time_limit, mip_gap=mip_gap)
+        self.method = method  # "sweep" or "kmeans"
+        self.max_workers = max_workers  # None: one worker per CPU
+        self.exact_limit = exact_limit  # Larger clusters are routed heuristically
+
+    def cluster(self, locations: List[Tuple[float, float]], n_vehicles: int,
+                vehicle_capacities: List[int], demands: List[int]) -> List[List[int]]:
+        """Partition the clients into n_vehicles clusters"""
+        weights = demands if any(d > 0 for d in demands[1:]) else [0] + [1] * (len(locations) - 1)
+        capacities = vehicle_capacities if any(d > 0 for d in demands[1:]) else [float("inf")] * n_vehicles
+        if self.method == "sweep":
+            return sweep_clusters(locations, n_vehicles, weights, capacities)
+        return capacitated_kmeans(locations, n_vehicles, weights, capacities)
+
+    def solve_vrp(self,
+                  distances: np.ndarray,
+                  n_vehicles: int = 1,
+                  vehicle_capacities: List[int] = None,
+                  demands: List[int] = None,
+                  service_times: Optional[List[float]] = None,
+                  time_windows: Optional[List[Optional[Tuple[float, float]]]] = None,
+                  max_shift_duration=None,
+                  locations: Optional[List[Tuple[float, float]]] = None,
+                  travel_times: Optional[np.ndarray] = None,
+                  prizes: Optional[List[float]] = None,
+                  objective: str = "total",
+                  makespan_weight: float = 1.0,
+                  travel_profile=None,
+                  **kwargs) -> Solution:
+        """
+        Solve the VRP by decomposition
+
+        Accepts the same arguments as PersonnelRoutingSolver.solve_vrp plus the
+        (x, y) coordinates of every location (depot first), which drive the
+        clustering (see DataManager.get_locations). With a makespan term in
+        the objective, the final pass also rebalances the routes. Every
+        cluster gets the travel profile of its locations.
+        """
+        if locations is None:
+            raise ValueError("ClusterFirstSolver needs the location coordinates")
+        start_time = time.time()
+        self._start_progress()
+        n = len(distances)
+        weights = objective_weights(objective, makespan_weight)
+
+        if service_times is None:
+            service_times = [0] * n
+        if demands is None:
+            demands = [0] * n
+        if vehicle_capacities is None:
+            vehicle_capacities = [1000] * n_vehicles
+
+        self.model = None
+        distances = np.asarray(distances, dtype=float)
+        if travel_times is None and travel_profile is not None:
+            travel_times = travel_profile.mean_times()
+        travel_times = self._travel_times(distances, travel_times)
+        time_constraints = self._make_time_constraints(
+            distances, service_times, n_vehicles, time_windows, max_shift_duration, travel_times,
+            travel_profile)
+        shifts = time_constraints.shift_limits if time_constraints and time_constraints.shift_limits \
+            else [None] * n_vehicles
+
+        clusters = self.cluster(locations, n_vehicles, vehicle_capacities, demands)
+
+        # Route every cluster in parallel, keeping part of the budget for the
+        # final pass; clusters beyond the number of workers run in waves
+        workers = self.max_workers or os.cpu_count() or 1
+        waves = math.ceil(sum(1 for cluster in clusters if cluster) / workers)
+        sub_time = max(1, int(0.8 * self.time_limit / max(1, waves)))
+        jobs = []
+        for k in range(n_vehicles):
+            nodes = [0] + list(clusters[k])  # Only the sub-matrix is sent to the worker
+            sub = np.ix_(nodes, nodes)
+            jobs.append((nodes, distances[sub], travel_times[sub], vehicle_capacities[k],
+                         [demands[i] for i in nodes], [service_times[i] for i in nodes],
+                         [time_windows[i] for i in nodes] if time_windows else None,
+                         shifts[k], sub_time, len(nodes) - 1 > self.exact_limit,
+                         [prizes[i] for i in nodes] if prizes is not None else None,
+                         travel_profile.subset(nodes) if travel_profile is not None else None))
+        with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+            results = list(pool.map(_solve_cluster, jobs))
+        routes = [route for route, _ in results]
+        unsolved = [k for k, (_, solved) in enumerate(results) if not solved]
+        if unsolved:
+            print(f"Warning: no route found for cluster(s) {unsolved}, visiting them in input order")
+        self._report_incumbent(routes, prize_objective(routes, travel_times, prizes or [0.0] * n))
+
+        # Inter-cluster improvement
+        remaining = max(1.0, self.time_limit - (time.time() - start_time))
+        search = LocalSearch(travel_times, demands, vehicle_capacities, time_limit=remaining,
+                             time_constraints=time_constraints)
+        improved = search.improve(routes)
+        if prizes is not None:
+            # Clients dropped by their cluster may be worth a detour from a neighbouring one
+            improved = select_visits(improved, travel_times, prizes, demands, vehicle_capacities,
+                                     n_vehicles, time_constraints)
+        if weights[1] > 0:
+            improved = balance_routes(improved, travel_times, service_times, demands,
+                                      vehicle_capacities, weights, time_constraints)
+            if self._weighted_objective(improved, travel_times, service_times, weights,
+                                        time_constraints, prizes) > \
+                    self._weighted_objective(routes, travel_times, service_times, weights,
+                                             time_constraints, prizes):
+                improved = routes
+        routes = improved
+
+        status = self._heuristic_status("Decomposition", routes, n_vehicles, vehicle_capacities,
+                                        demands, time_constraints)
+        self.solution = self._build_solution(routes, distances, service_times, status,
+                                             start_time, time_constraints=time_constraints,
+                                             travel_times=travel_times, prizes=prizes)
+        self.solution.stats = {"clusters": [len(c) for c in clusters], "local_search_moves": search.moves,
+                               "unsolved_clusters": unsolved}
+        return self.solution
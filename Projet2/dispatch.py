@@ -0,0 +1,227 @@
+import time
+import numpy as np
+from typing import Iterable, List, Optional, Tuple
+
+from heuristics import route_load
+from solver import PersonnelRoutingSolver, Solution, SPEED_KM_PER_MIN
+
+
+def extend_matrix(matrix: np.ndarray, to_new: List[float],
+                  from_new: Optional[List[float]] = None) -> np.ndarray:
+    """
+    Add one location to an n x n matrix
+
+    Args:
+        matrix: current matrix
+        to_new: value from every existing location to the new one (n values)
+        from_new: value from the new location to every existing one
+            (defaults to to_new, i.e. a symmetric matrix)
+
+    Returns:
+        (n + 1) x (n + 1) matrix, existing entries unchanged
+    """
+    n = len(matrix)
+    to_new = np.asarray(to_new, dtype=float)
+    from_new = to_new if from_new is None else np.asarray(from_new, dtype=float)
+    if len(to_new) != n or len(from_new) != n:
+        raise ValueError(f"Expected {n} values for the new row and column")
+    extended = np.empty((n + 1, n + 1))
+    extended[:n, :n] = matrix
+    extended[:n, n] = to_new
+    extended[n, :n] = from_new
+    extended[n, n] = 0.0
+    return extended
+
+
+class RealTimeDispatcher:
+    """
+    Insert clients that come in during the day into dispatched routes
+
+    Visits already completed are frozen: a rep can only take the new client
+    after its last completed visit. The client goes to the cheapest feasible
+    position (capacity, time windows, shift), then a bounded relocate repair
+    around it lets nearby pending visits move to cheaper positions. Nothing
+    is re-solved and the matrices grow by one row and one column per client.
+    """
+
+    EPS = 1e-9
+
+    def __init__(self, distances: np.ndarray, service_times: List[float],
+                 demands: Optional[List[float]] = None,
+                 vehicle_capacities: Optional[List[int]] = None,
+                 n_vehicles: Optional[int] = None,
+                 time_windows: Optional[List[Optional[Tuple[float, float]]]] = None,
+                 max_shift_duration=None,
+                 travel_times: Optional[np.ndarray] = None,
+                 n_neighbors: int = 10,
+                 max_repair_moves: int = 50,
+                 repair_time_limit: float = 0.05):
+        self.distances = np.asarray(distances, dtype=float)
+        n = len(self.distances)
+        self.travel_times = PersonnelRoutingSolver._travel_times(self.distances, travel_times)
+        self.service_times = list(service_times)
+        self.demands = list(demands) if demands is not None else [0] * n
+        self.vehicle_capacities = vehicle_capacities
+        self.n_vehicles = n_vehicles if n_vehicles is not None else \
+            (len(vehicle_capacities) if vehicle_capacities else None)
+        self.time_windows = list(time_windows) if time_windows is not None else None
+        self.max_shift_duration = max_shift_duration
+        self.n_neighbors = n_neighbors
+        self.max_repair_moves = max_repair_moves  # Relocations tried by the repair
+        self.repair_time_limit = repair_time_limit  # Seconds
+        self._update_time_constraints()
+
+    def _update_time_constraints(self):
+        n_vehicles = self.n_vehicles or 1
+        self.time_constraints = PersonnelRoutingSolver._make_time_constraints(
+            self.distances, self.service_times, n_vehicles, self.time_windows,
+            self.max_shift_duration, self.travel_times)
+
+    def add_client(self, distances_to: List[float], distances_from: Optional[List[float]] = None,
+                   service_time: float = 0, demand: float = 1,
+                   time_window: Optional[Tuple[float, float]] = None,
+                   times_to: Optional[List[float]] = None,
+                   times_from: Optional[List[float]] = None) -> int:
+        """
+        Register a new client location
+
+        Args:
+            distances_to: distance (km) from every existing location to the client
+            distances_from: distance from the client (defaults to distances_to)
+            service_time: service time at the client (minutes)
+            demand: demand of the client
+            time_window: [earliest, latest] service start, or None
+            times_to, times_from: travel times (minutes); derived from the
+                distances at constant speed if not given
+
+        Returns:
+            Index of the new client in the matrices
+        """
+        if times_to is None:
+            times_to = np.asarray(distances_to, dtype=float) / SPEED_KM_PER_MIN
+            if distances_from is not None:
+                times_from = np.asarray(distances_from, dtype=float) / SPEED_KM_PER_MIN
+        self.distances = extend_matrix(self.distances, distances_to, distances_from)
+        self.travel_times = extend_matrix(self.travel_times, times_to, times_from)
+        self.service_times.append(service_time)
+        self.demands.append(demand)
+        if self.time_windows is not None or time_window is not None:
+            if self.time_windows is None:
+                self.time_windows = [None] * (len(self.distances) - 1)
+            self.time_windows.append(time_window)
+        self._update_time_constraints()
+        return len(self.distances) - 1
+
+    def insert(self, routes: List[List[int]], completed: Iterable[int], client: int,
+               vehicles: Optional[List[int]] = None) -> Tuple[List[List[int]], List[int]]:
+        """
+        Insert a client into the current routes
+
+        Args:
+            routes: current routes (Solution.routes)
+            completed: clients already visited; every route is frozen up to
+                its last completed visit
+            client: index of the client to insert (see add_client)
+            vehicles: rep of every route (Solution.vehicles), default route
+                k driven by rep k
+
+        Returns:
+            Updated routes and the rep of every route (an idle rep may have
+            taken the client)
+        """
+        start = time.time()
+        routes = self._rep_routes(routes, vehicles)
+        completed = set(completed)
+        frozen = [max([p for p, node in enumerate(route) if node in completed], default=0)
+                  for route in routes]
+        self._routes, self._frozen = routes, frozen
+
+        best = self._cheapest_insertion(client)
+        if best is None:
+            raise ValueError(f"No feasible insertion for client {client}")
+        _, r, p = best
+        routes[r].insert(p, client)
+
+        self._repair(client, start)
+        vehicles = [k for k, route in enumerate(routes) if len(route) > 2]
+        return [routes[k] for k in vehicles], vehicles
+
+    def solution(self, routes: List[List[int]], status: str = "Dispatch",
+                 vehicles: Optional[List[int]] = None) -> Solution:
+        """Metrics of the updated routes (vehicles: rep of every route, see insert)"""
+        return PersonnelRoutingSolver._build_solution(
+            self._rep_routes(routes, vehicles), self.distances, self.service_times,
+            status, time.time(), time_constraints=self.time_constraints,
+            travel_times=self.travel_times)
+
+    def _rep_routes(self, routes: List[List[int]], vehicles: Optional[List[int]] = None) -> List[List[int]]:
+        """One route per rep, route k = rep k, idle reps [0, 0]"""
+        vehicles = list(vehicles) if vehicles is not None else list(range(len(routes)))
+        rep_routes = [[0, 0] for _ in range(max(self.n_vehicles or 0, max(vehicles, default=-1) + 1))]
+        for k, route in zip(vehicles, routes):
+            rep_routes[k] = list(route)
+        return rep_routes
+
+    def _capacity(self, r: int) -> float:
+        if not self.vehicle_capacities:
+            return float("inf")
+        return self.vehicle_capacities[r] if r < len(self.vehicle_capacities) else max(self.vehicle_capacities)
+
+    def _cheapest_insertion(self, client: int):
+        """(delta, route, position) of the cheapest feasible open position, or None"""
+        d = self.travel_times
+        candidates = []
+        for r, route in enumerate(self._routes):
+            if route_load(route, self.demands) + self.demands[client] > self._capacity(r) + self.EPS:
+                continue
+            for p in range(self._frozen[r] + 1, len(route)):
+                a, b = route[p - 1], route[p]
+                candidates.append((d[a, client] + d[client, b] - d[a, b], r, p))
+        # Time feasibility is O(route length): only checked from the cheapest position on
+        for delta, r, p in sorted(candidates):
+            route = self._routes[r]
+            if self.time_constraints is None or \
+                    self.time_constraints.feasible(route[:p] + [client] + route[p:], r):
+                return delta, r, p
+        return None
+
+    def _repair(self, client: int, start: float):
+        """Relocate pending visits near the new client while it pays off"""
+        d = self.travel_times
+        row = d[client, 1:].copy()
+        row[client - 1] = np.inf
+        k = min(self.n_neighbors, len(row) - 1)
+        nearby = (np.argpartition(row, k - 1)[:k] + 1).tolist() if k > 0 else []
+        candidates = [client] + nearby
+        moves = 0
+        improved = True
+        while improved and moves < self.max_repair_moves:
+            improved = False
+            for u in candidates:
+                if time.time() - start > self.repair_time_limit or moves >= self.max_repair_moves:
+                    return
+                position = self._locate(u)
+                if position is None:
+                    continue
+                r, p = position
+                route = self._routes[r]
+                gain = d[route[p - 1], u] + d[u, route[p + 1]] - d[route[p - 1], route[p + 1]]
+                del route[p]
+                if self.time_constraints is not None and not self.time_constraints.feasible(route, r):
+                    route.insert(p, u)
+                    continue
+                best = self._cheapest_insertion(u)
+                if best is not None and best[0] < gain - self.EPS:
+                    _, r2, p2 = best
+                    self._routes[r2].insert(p2, u)
+                    moves += 1
+                    improved = True
+                else:
+                    route.insert(p, u)
+
+    def _locate(self, node: int) -> Optional[Tuple[int, int]]:
+        """(route, position) of a pending (not frozen) visit"""
+        for r, route in enumerate(self._routes):
+            if node in route[self._frozen[r] + 1:-1]:
+                return r, route.index(node, self._frozen[r] + 1)
+        return None
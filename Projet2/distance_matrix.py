@@ -0,0 +1,170 @@
+import numpy as np
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+
+class DistanceMatrix:
+    """
+    Distance matrix that grows and shrinks one location at a time
+
+    Locations are stored in a preallocated square buffer whose capacity
+    doubles when full, so appending a location computes and writes one row
+    and one column (O(n)) and reallocations are amortized. Removing a
+    location compacts the indices of the locations after it, which keeps
+    the matrix order (depot first, branch offices last). Every location has
+    a key (e.g. a client name) and key_index maps it to its current index.
+
+    matrix is a view on the buffer: it stays valid until the next edit.
+    """
+
+    MIN_CAPACITY = 16
+
+    def __init__(self, locations: Optional[Sequence[Tuple[float, float]]] = None,
+                 keys: Optional[Sequence[Hashable]] = None, capacity: int = 0):
+        """
+        Args:
+            locations: (x, y) of the initial locations, distances are Euclidean
+            keys: key of every location (default: its index)
+            capacity: initial number of locations the buffer can hold
+        """
+        points = np.asarray(locations if locations is not None else [], dtype=float).reshape(-1, 2)
+        n = len(points)
+        self._capacity = max(capacity, n, self.MIN_CAPACITY)
+        self._buffer = np.zeros((self._capacity, self._capacity))
+        self._points = np.full((self._capacity, 2), np.nan)  # NaN: location without coordinates
+        self._points[:n] = points
+        delta = points[:, None, :] - points[None, :, :]
+        self._buffer[:n, :n] = np.sqrt((delta ** 2).sum(axis=2))
+        self.n = n
+        self.keys: List[Hashable] = []
+        self.key_index: Dict[Hashable, int] = {}
+        self._set_keys(list(keys) if keys is not None else list(range(n)))
+
+    @classmethod
+    def from_matrix(cls, matrix: np.ndarray, keys: Optional[Sequence[Hashable]] = None,
+                    locations: Optional[Sequence[Tuple[float, float]]] = None) -> "DistanceMatrix":
+        """
+        Wrap an existing matrix (e.g. road distances); with the locations,
+        later insertions can still be Euclidean
+        """
+        matrix = np.asarray(matrix, dtype=float)
+        store = cls(capacity=len(matrix), keys=[])
+        n = len(matrix)
+        store._buffer[:n, :n] = matrix
+        if locations is not None:
+            store._points[:n] = np.asarray(locations, dtype=float).reshape(-1, 2)
+        store.n = n
+        store._set_keys(list(keys) if keys is not None else list(range(n)))
+        return store
+
+    def _set_keys(self, keys: List[Hashable]):
+        if len(keys) != self.n:
+            raise ValueError(f"Expected {self.n} keys")
+        self.keys = keys
+        self.key_index = {key: i for i, key in enumerate(keys)}
+        if len(self.key_index) != len(keys):
+            raise ValueError("Location keys must be unique")
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """n x n distances (a view, valid until the next edit)"""
+        return self._buffer[:self.n, :self.n]
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    def __len__(self) -> int:
+        return self.n
+
+    def _reserve(self, size: int):
+        """Double the capacity until size locations fit"""
+        if size <= self._capacity:
+            return
+        capacity = self._capacity
+        while capacity < size:
+            capacity *= 2
+        buffer = np.zeros((capacity, capacity))
+        buffer[:self.n, :self.n] = self.matrix
+        points = np.full((capacity, 2), np.nan)
+        points[:self.n] = self._points[:self.n]
+        self._buffer, self._points, self._capacity = buffer, points, capacity
+
+    def insert(self, index: int, key: Hashable, x: Optional[float] = None, y: Optional[float] = None,
+               to_new: Optional[Sequence[float]] = None,
+               from_new: Optional[Sequence[float]] = None) -> int:
+        """
+        Insert a location at index, shifting the locations after it
+
+        The distances are Euclidean from (x, y), or given: to_new from every
+        existing location to the new one, from_new back (default to_new).
+        Appending (index = n) costs O(n); inserting before the last k
+        locations moves their rows and columns, O(n k).
+
+        Returns:
+            index of the new location
+        """
+        n = self.n
+        if not 0 <= index <= n:
+            raise IndexError(f"Insert position {index} out of range 0..{n}")
+        if key in self.key_index:
+            raise ValueError(f"Location {key!r} already exists")
+        if to_new is None:
+            if x is None or y is None:
+                raise ValueError("Give the coordinates or the distances of the new location")
+            if np.isnan(self._points[:n]).any():
+                raise ValueError("Some locations have no coordinates, give the distances of the new location")
+            to_new = np.hypot(self._points[:n, 0] - x, self._points[:n, 1] - y)
+        to_new = np.asarray(to_new, dtype=float)
+        from_new = to_new if from_new is None else np.asarray(from_new, dtype=float)
+        if len(to_new) != n or len(from_new) != n:
+            raise ValueError(f"Expected {n} values for the new row and column")
+
+        self._reserve(n + 1)
+        M = self._buffer
+        if index < n:
+            # Overlapping slices: numpy copies through a buffer when needed
+            M[index + 1:n + 1, :n] = M[index:n, :n]
+            M[:n + 1, index + 1:n + 1] = M[:n + 1, index:n]
+            self._points[index + 1:n + 1] = self._points[index:n]
+        others = np.r_[0:index, index + 1:n + 1]
+        M[others, index] = to_new
+        M[index, others] = from_new
+        M[index, index] = 0.0
+        self._points[index] = (x, y) if x is not None and y is not None else (np.nan, np.nan)
+        self.n = n + 1
+
+        self.keys.insert(index, key)
+        for i in range(index, self.n):
+            self.key_index[self.keys[i]] = i
+        return index
+
+    def append(self, key: Hashable, x: Optional[float] = None, y: Optional[float] = None,
+               to_new: Optional[Sequence[float]] = None,
+               from_new: Optional[Sequence[float]] = None) -> int:
+        """Add a location at the end (O(n), see insert)"""
+        return self.insert(self.n, key, x, y, to_new, from_new)
+
+    def remove(self, key: Hashable) -> int:
+        """
+        Delete a location; the locations after it move up one index
+        (O(n k) for the k locations after it)
+
+        Returns:
+            former index of the location
+        """
+        index = self.key_index.pop(key)
+        n = self.n
+        M = self._buffer
+        if index < n - 1:
+            M[index:n - 1, :n] = M[index + 1:n, :n]
+            M[:n - 1, index:n - 1] = M[:n - 1, index + 1:n]
+            self._points[index:n - 1] = self._points[index + 1:n]
+        self.n = n - 1
+        del self.keys[index]
+        for i in range(index, self.n):
+            self.key_index[self.keys[i]] = i
+        return index
+
+    def distance(self, a: Hashable, b: Hashable) -> float:
+        """Distance between two locations given by key"""
+        return float(self._buffer[self.key_index[a], self.key_index[b]])
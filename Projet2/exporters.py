@@ -0,0 +1,189 @@
+import csv
+import json
+import os
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export only
+    pa = None
+    pq = None
+
+from data_manager import DataManager
+from solver import Solution, format_solution
+
+# Columns of the per-stop exports
+STOP_FIELDS = ("rep", "sequence", "node", "name", "x", "y", "arrival_min", "service_min",
+               "cumulative_km")
+
+# Version of the compact dispatch JSON layout
+DISPATCH_SCHEMA_VERSION = 1
+
+
+def node_names(data: Dict[str, Any]) -> List[str]:
+    """Name of every location, in distance-matrix order"""
+    names = [data["depot"].get("name", "Office")]
+    names.extend(c.get("name", f"Client_{c.get('id', i + 1)}") for i, c in enumerate(data["clients"]))
+    names.extend(b.get("name", f"Branch_{i + 1}") for i, b in enumerate(data.get("branches", [])))
+    return names
+
+
+def _stops(solution: Solution, route: List[int]) -> List[int]:
+    """Positions of a route that are exported (open routes do not return to the depot)"""
+    last = len(route) - 1 if solution.open_routes else len(route)
+    return list(range(last))
+
+
+def _rep(solution: Solution, k: int) -> int:
+    """1-based rep number of route k (idle reps have no route)"""
+    return (solution.vehicles[k] if solution.vehicles else k) + 1
+
+
+def iter_stops(solution: Solution, data: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """
+    One row per stop of every route, depots included
+
+    Rows have the STOP_FIELDS keys: rep (1-based), sequence (0 = start),
+    arrival time (minutes, same clock as the time windows), service time
+    and distance driven since the start of the route (km).
+    """
+    distances = data["distance_matrix"]
+    locations = DataManager.get_locations(data)
+    names = node_names(data)
+    service_times = data.get("service_times")
+    for k, route in enumerate(solution.routes):
+        arrivals = solution.arrival_times[k] if solution.arrival_times else None
+        cumulative = 0.0
+        for p in _stops(solution, route):
+            node = route[p]
+            if p > 0:
+                cumulative += float(distances[route[p - 1]][node])
+            x, y = locations[node]
+            yield {
+                "rep": _rep(solution, k),
+                "sequence": p,
+                "node": node,
+                "name": names[node],
+                "x": x,
+                "y": y,
+                "arrival_min": round(float(arrivals[p]), 2) if arrivals else None,
+                "service_min": float(service_times[node]) if service_times else 0.0,
+                "cumulative_km": round(cumulative, 3),
+            }
+
+
+def iter_route_features(solution: Solution, data: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """
+    One GeoJSON LineString feature per route
+
+    Coordinates are the (x, y) of the instance, i.e. (lon, lat) when the
+    locations come from a map.
+    """
+    locations = DataManager.get_locations(data)
+    for k, route in enumerate(solution.routes):
+        stops = [route[p] for p in _stops(solution, route)]
+        properties = {"rep": _rep(solution, k), "clients": len([node for node in stops[1:] if node != route[0]]),
+                      "stops": stops}
+        if solution.route_durations:
+            properties["duration_min"] = round(float(solution.route_durations[k]), 2)
+        yield {
+            "type": "Feature",
+            "geometry": {"type": "LineString",
+                         "coordinates": [list(locations[node]) for node in stops]},
+            "properties": properties,
+        }
+
+
+def write_geojson(features: Iterable[Dict[str, Any]], filename: str):
+    """Write a FeatureCollection one feature at a time"""
+    with open(filename, "w") as f:
+        f.write('{"type": "FeatureCollection", "features": [\n')
+        for i, feature in enumerate(features):
+            if i:
+                f.write(",\n")
+            f.write(json.dumps(feature))
+        f.write("\n]}\n")
+
+
+def write_csv(rows: Iterable[Dict[str, Any]], filename: str, fields=STOP_FIELDS):
+    """Write rows as CSV, one line at a time"""
+    with open(filename, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(fields))
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+
+
+def write_parquet(rows: Iterable[Dict[str, Any]], filename: str, fields=STOP_FIELDS,
+                  batch_size: int = 10000):
+    """Write rows as Parquet, one row group of at most batch_size rows at a time"""
+    if pa is None:
+        raise ImportError("Parquet export requires pyarrow (pip install pyarrow)")
+    writer = None
+    batch = []
+
+    def flush():
+        nonlocal writer
+        table = pa.Table.from_pylist(batch)
+        if writer is None:
+            writer = pq.ParquetWriter(filename, table.schema)
+        writer.write_table(table)
+        batch.clear()
+
+    try:
+        for row in rows:
+            batch.append({field: row[field] for field in fields})
+            if len(batch) >= batch_size:
+                flush()
+        if batch or writer is None:
+            flush()
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def write_dispatch_json(solution: Solution, data: Dict[str, Any], filename: str):
+    """
+    Compact JSON for the dispatch API, one route at a time:
+    {"version", "status", "open_routes", "routes": [{"rep", "stops": [[node,
+    arrival_min, cumulative_km], ...]}, ...], "skipped": [...]}
+    """
+    compact = (",", ":")
+    with open(filename, "w") as f:
+        header = {"version": DISPATCH_SCHEMA_VERSION, "status": str(solution.status),
+                  "open_routes": solution.open_routes}
+        f.write(json.dumps(header, separators=compact)[:-1] + ',"routes":[')
+        rep, stops = None, []
+        for row in iter_stops(solution, data):
+            if row["rep"] != rep:
+                if rep is not None:
+                    f.write(json.dumps({"rep": rep, "stops": stops}, separators=compact) + ",")
+                rep, stops = row["rep"], []
+            stops.append([row["node"], row["arrival_min"], row["cumulative_km"]])
+        if rep is not None:
+            f.write(json.dumps({"rep": rep, "stops": stops}, separators=compact))
+        f.write('],"skipped":' + json.dumps(list(solution.dropped or []), separators=compact) + "}")
+
+
+def export_solution(solution: Solution, data: Dict[str, Any], filename: str,
+                    fmt: Optional[str] = None):
+    """
+    Export routes in the format given by fmt or the file extension:
+    "geojson", "csv", "parquet", "json" (dispatch) or "txt" (report)
+    """
+    if fmt is None:
+        fmt = os.path.splitext(filename)[1].lstrip(".").lower()
+    if fmt == "geojson":
+        write_geojson(iter_route_features(solution, data), filename)
+    elif fmt == "csv":
+        write_csv(iter_stops(solution, data), filename)
+    elif fmt == "parquet":
+        write_parquet(iter_stops(solution, data), filename)
+    elif fmt == "json":
+        write_dispatch_json(solution, data, filename)
+    elif fmt == "txt":
+        with open(filename, "w") as f:
+            f.write(format_solution(solution))
+    else:
+        raise ValueError(f"Unknown export format: {fmt}")
@@ -2,26 +2,54 @@ from PyQt5.QtWidgets import (
     QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QPushButton,
     QLabel, QSpinBox, QTableWidget, QTableWidgetItem, QGroupBox,
     QTextEdit, QFileDialog, QMessageBox, QSplitter, QProgressBar,
-    QTabWidget, QCheckBox, QListWidget, QListWidgetItem, QFrame
+    QTabWidget, QCheckBox, QListWidget, QListWidgetItem, QFrame, QComboBox, QShortcut
 )
 from PyQt5.QtCore import Qt, QThread, pyqtSignal
-from PyQt5.QtGui import QColor, QFont
+from PyQt5.QtGui import QColor, QFont, QKeySequence
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
+from matplotlib.collections import LineCollection
+from matplotlib.lines import Line2D
 import numpy as np
 import sys
 
 from solver import PersonnelRoutingSolver, Solution
+from alns import ALNSSolver
+from column_generation import ColumnGenerationSolver
+from portfolio import PortfolioSolver
+from multi_depot import MultiDepotSolver
 from data_manager import DataManager
+from heuristics import priority_prizes
+from exporters import export_solution
+from route_editor import RouteEditor
+from tuning import list_profiles
+
+# Solver engines selectable in the GUI
+SOLVER_ENGINES = {
+    "MIP (Gurobi)": PersonnelRoutingSolver,
+    "ALNS (large instances)": ALNSSolver,
+    "Column generation": ColumnGenerationSolver,
+    "Parallel portfolio": PortfolioSolver,
+}
+
+# Objective modes of solve_vrp (see heuristics.objective_weights)
+OBJECTIVES = {
+    "Total travel time": "total",
+    "Shortest longest route": "makespan",
+    "Balanced (total + longest)": "balanced",
+}
 
 
 class SolveThread(QThread):
     """Thread for running solver to keep GUI responsive"""
     finished = pyqtSignal(object)
     progress = pyqtSignal(str)
+    incumbent = pyqtSignal(object, object, object, object)  # routes, objective, bound, gap
 
-    def __init__(self, solver, distances, n_vehicles=1, service_times=None, demands=None, capacities=None):
+    def __init__(self, solver, distances, n_vehicles=1, service_times=None, demands=None, capacities=None,
+                 time_windows=None, max_shift=None, travel_times=None, prizes=None, objective="total",
+                 depot_options=None):
         super().__init__()
         self.solver = solver
         self.distances = distances
@@ -29,25 +57,64 @@ class SolveThread(QThread):
         self.service_times = service_times
         self.demands = demands
         self.capacities = capacities
+        self.time_windows = time_windows
+        self.max_shift = max_shift
+        self.travel_times = travel_times
+        self.prizes = prizes
+        self.objective = objective
+        self.depot_options = depot_options or {}  # depots, vehicle_depots, open_routes (MultiDepotSolver)
 
     def run(self):
         try:
-            self.progress.emit(f"Optimizing routes for {self.n_vehicles} sales reps...")
+            engine = {ALNSSolver: "ALNS", ColumnGenerationSolver: "column generation",
+                      PortfolioSolver: "parallel portfolio", MultiDepotSolver: "multi-depot"}.get(
+                type(self.solver), "MIP")
+            self.progress.emit(f"Optimizing routes for {self.n_vehicles} sales reps ({engine})...")
+            self.solver.progress_callback = self.incumbent.emit
             solution = self.solver.solve_vrp(
                 self.distances,
                 n_vehicles=self.n_vehicles,
                 vehicle_capacities=self.capacities,
                 demands=self.demands,
-                service_times=self.service_times
+                service_times=self.service_times,
+                time_windows=self.time_windows,
+                max_shift_duration=self.max_shift,
+                travel_times=self.travel_times,
+                prizes=self.prizes,
+                objective=self.objective,
+                **self.depot_options
             )
             self.finished.emit(solution)
         except Exception as e:
             self.progress.emit(f"Error: {str(e)}")
             self.finished.emit(None)
+        finally:
+            self.solver.progress_callback = None
 
 
 class PlotCanvas(FigureCanvas):
-    """Enhanced matplotlib canvas for plotting routes"""
+    """
+    Matplotlib canvas for plotting routes
+
+    Clients are drawn with a single scatter, routes with one LineCollection
+    and their direction arrows with one quiver, so a redraw costs a handful
+    of artists whatever the number of clients. Client labels follow a level
+    of detail: boxed labels on small maps, plain labels on medium ones and
+    none beyond MAX_LABELS visible clients (zooming in brings them back).
+    When only the routes change, the route artists are updated in place.
+
+    With editable set, a client can be dragged onto another route or an
+    office: the canvas reports the cursor position while dragging
+    (client_dragged) and at the drop (client_dropped), the window finds the
+    target with route_at and depot_at and redraws the changed routes with
+    update_route.
+    """
+
+    client_dragged = pyqtSignal(object, object, object)  # client id, x, y (None outside the axes)
+    client_dropped = pyqtSignal(object, object, object)
+
+    MAX_LABELS = 150  # Visible clients above which labels are hidden
+    BOXED_LABELS = 40  # Visible clients up to which labels get a box
 
     def __init__(self, parent=None, width=6, height=5, dpi=100):
         self.fig = Figure(figsize=(width, height), dpi=dpi, facecolor='#f8f9fa')
@@ -58,93 +125,66 @@ class PlotCanvas(FigureCanvas):
         self.data = None
         self.routes = None
         self.vehicle_colors = None
-
-    def plot_data(self, data, routes=None):
+        self.index = {}  # client or branch id -> row in self.coords (depot at row 0)
+        self.coords = None
+        self.n_clients = 0
+        self.route_lines = None
+        self.route_arrows = None
+        self.route_segments = []
+        self.segment_route = np.empty(0, dtype=int)
+        self.open_routes = False
+        self.labels = []
+        self.editable = False
+        self.drag_client = None
+        self.drag_marker = None
+        self.mpl_connect('button_press_event', self.on_press)
+        self.mpl_connect('motion_notify_event', self.on_motion)
+        self.mpl_connect('button_release_event', self.on_release)
+
+    def plot_data(self, data, routes=None, open_routes=False):
         """Plot clients and routes with enhanced visualization"""
+        if data is self.data and self.coords is not None:
+            self.update_routes(routes, open_routes)
+            return
+
         self.ax.clear()
         self.ax.set_facecolor('#f8f9fa')
+        self.ax.callbacks.connect('xlim_changed', lambda ax: self.update_labels())
+        self.ax.callbacks.connect('ylim_changed', lambda ax: self.update_labels())
         self.data = data
-        self.routes = routes
-
-        # Generate distinct colors for each sales representative
-        if routes:
-            color_cycle = plt.cm.tab10(np.linspace(0, 1, len(routes)))
-            self.vehicle_colors = color_cycle
-        else:
-            self.vehicle_colors = ['#4285F4']
-
-        # Plot depot (office)
+        self.routes = None
+        self.route_lines = None
+        self.route_arrows = None
+        self.route_segments = []
+        self.segment_route = np.empty(0, dtype=int)
+        self.drag_client = None
+        self.drag_marker = None
+        self.labels = []
+
+        # Coordinates indexed once: depot at row 0, then clients and branch
+        # offices (matrix order), looked up by id
         depot = data["depot"]
+        clients = data["clients"]
+        branches = data.get("branches", [])
+        self.n_clients = len(clients)
+        self.index = {site["id"]: i + 1 for i, site in enumerate(clients + branches)}
+        self.coords = np.array([(depot["x"], depot["y"])] + [(c["x"], c["y"]) for c in clients + branches],
+                               dtype=float).reshape(-1, 2)
+        self.client_ids = [client["id"] for client in clients]
+
+        # Plot depot (office) and branch offices
         self.ax.plot(depot["x"], depot["y"], 'P', color='#000000', markersize=18,
                      label='Office (Depot)', zorder=10, markeredgewidth=2,
                      markeredgecolor='white', markerfacecolor='#4285F4')
+        if branches:
+            self.ax.plot(self.coords[-len(branches):, 0], self.coords[-len(branches):, 1], 'P',
+                         linestyle='none', markersize=15, label='Branch Office', zorder=10,
+                         markeredgewidth=2, markeredgecolor='white', markerfacecolor='#34A853')
 
         # Plot clients
-        clients = data["clients"]
-        for client in clients:
-            x, y = client["x"], client["y"]
-            client_id = client["id"]
-
-            # Plot client point
-            self.ax.plot(x, y, 'o', color='#EA4335', markersize=12,
-                         alpha=0.9, zorder=5, markeredgecolor='white',
-                         markeredgewidth=1.5)
-
-            # Add client ID label
-            self.ax.text(x, y + 2.2, f"{client_id}", fontsize=10,
-                         ha='center', fontweight='bold', color='#202124',
-                         bbox=dict(boxstyle="round,pad=0.3", facecolor="white",
-                                   edgecolor='#DADCE0', alpha=0.9))
-
-        # Plot routes if available
-        if routes and len(routes) > 0:
-            all_locations = [depot] + clients
-
-            for vehicle_idx, route in enumerate(routes):
-                if len(route) > 2:  # Not just depot->depot
-                    route_coords = []
-                    route_nodes = []
-                    for node in route:
-                        if node == 0:
-                            route_coords.append((depot["x"], depot["y"]))
-                            route_nodes.append("Depot")
-                        else:
-                            client = next(c for c in clients if c["id"] == node)
-                            route_coords.append((client["x"], client["y"]))
-                            route_nodes.append(f"C{node}")
-
-                    x_coords, y_coords = zip(*route_coords)
-                    color = self.vehicle_colors[vehicle_idx % len(self.vehicle_colors)]
-
-                    # Plot route line with gradient effect
-                    line = self.ax.plot(x_coords, y_coords, '-', color=color,
-                                        linewidth=3, alpha=0.8,
-                                        label=f'Rep {vehicle_idx + 1}', zorder=1,
-                                        solid_capstyle='round')
-
-                    # Add arrows at segments
-                    arrow_length = 5
-                    for i in range(len(route_coords) - 1):
-                        x1, y1 = route_coords[i]
-                        x2, y2 = route_coords[i + 1]
-                        dx, dy = x2 - x1, y2 - y1
-                        dist = np.sqrt(dx ** 2 + dy ** 2)
-
-                        if dist > arrow_length * 2:  # Only add arrow if segment is long enough
-                            # Place arrow at 70% of segment
-                            arrow_x = x1 + dx * 0.7
-                            arrow_y = y1 + dy * 0.7
-
-                            # Normalize direction
-                            dx_norm = dx / dist
-                            dy_norm = dy / dist
-
-                            self.ax.arrow(arrow_x, arrow_y,
-                                          dx_norm * arrow_length * 0.3,
-                                          dy_norm * arrow_length * 0.3,
-                                          head_width=2.5, head_length=3,
-                                          fc=color, ec=color, alpha=0.7,
-                                          zorder=2, width=0.5)
+        marker_size = 144 if len(clients) <= self.BOXED_LABELS else max(9, 144 * self.BOXED_LABELS / len(clients))
+        self.ax.scatter(self.coords[1:self.n_clients + 1, 0], self.coords[1:self.n_clients + 1, 1],
+                        s=marker_size, c='#EA4335', alpha=0.9, zorder=5, edgecolors='white', linewidths=1.5)
 
         # Customize axes
         self.ax.set_xlabel('X Coordinate (km)', fontsize=11, fontweight='medium', color='#5F6368')
@@ -159,14 +199,191 @@ class PlotCanvas(FigureCanvas):
         self.ax.spines['left'].set_color('#DADCE0')
         self.ax.spines['bottom'].set_color('#DADCE0')
 
-        # Add legend
+        self.update_labels()
+        self.update_routes(routes, open_routes)
+
+    def update_routes(self, routes, open_routes=False):
+        """Replace the route artists without redrawing the clients (open routes: no return leg)"""
+        self.routes = [list(route) for route in routes] if routes else routes
+        self.open_routes = open_routes
+
+        # Generate distinct colors for each sales representative
         if routes:
-            self.ax.legend(loc='upper left', bbox_to_anchor=(1.02, 1),
+            self.vehicle_colors = plt.cm.tab10(np.linspace(0, 1, len(routes)))
+        else:
+            self.vehicle_colors = ['#4285F4']
+
+        self.route_segments = [self._segments(route) for route in self.routes or []]
+        self._draw_routes()
+        self.fig.tight_layout(rect=[0, 0, 0.85, 1])  # Make space for legend
+        self.draw_idle()
+
+    def update_route(self, vehicle_idx, route):
+        """Redraw the segments of a single edited route"""
+        self.routes[vehicle_idx] = list(route)
+        self.route_segments[vehicle_idx] = self._segments(route)
+        self._draw_routes()
+        self.draw_idle()
+
+    def _segments(self, route):
+        """Segments of a route as an m x 2 x 2 array (none for depot->depot)"""
+        if len(route) <= 2:
+            return np.empty((0, 2, 2))
+        rows = [0 if node == 0 else self.index[node] for node in route]
+        if self.open_routes:
+            rows = rows[:-1]
+        points = self.coords[rows]
+        return np.stack([points[:-1], points[1:]], axis=1)
+
+    def _draw_routes(self):
+        """Rebuild the route collection, arrows and legend from the per-route segments"""
+        if self.route_lines is not None:
+            self.route_lines.remove()
+            self.route_lines = None
+        if self.route_arrows is not None:
+            self.route_arrows.remove()
+            self.route_arrows = None
+        if self.ax.get_legend() is not None:
+            self.ax.get_legend().remove()
+
+        colors, handles = [], []
+        for vehicle_idx, segments in enumerate(self.route_segments):
+            if not len(segments):
+                continue
+            color = self.vehicle_colors[vehicle_idx % len(self.vehicle_colors)]
+            colors.extend([color] * len(segments))
+            handles.append(Line2D([], [], color=color, linewidth=3, label=f'Rep {vehicle_idx + 1}'))
+        # Route of every segment, for picking a route under the cursor
+        self.segment_route = np.repeat(np.arange(len(self.route_segments)),
+                                       [len(segments) for segments in self.route_segments])
+
+        if colors:
+            segments = np.concatenate(self.route_segments)
+            self.route_lines = LineCollection(segments, colors=colors, linewidths=3, alpha=0.8,
+                                              zorder=1, capstyle='round')
+            self.ax.add_collection(self.route_lines)
+
+            # One arrow at 70% of every segment long enough to carry one
+            arrow_length = 5
+            start, end = segments[:, 0], segments[:, 1]
+            delta = end - start
+            dist = np.hypot(delta[:, 0], delta[:, 1])
+            long_enough = dist > arrow_length * 2
+            if long_enough.any():
+                direction = delta[long_enough] / dist[long_enough, None]
+                position = start[long_enough] + 0.7 * delta[long_enough]
+                self.route_arrows = self.ax.quiver(
+                    position[:, 0], position[:, 1], direction[:, 0], direction[:, 1],
+                    color=np.asarray(colors)[long_enough], alpha=0.7, zorder=2,
+                    angles='xy', scale_units='width', scale=40, width=0.006,
+                    headwidth=4, headlength=4, headaxislength=3.5, pivot='middle')
+
+        # Add legend
+        if handles:
+            depot_handle = [h for h in self.ax.get_lines()
+                            if h.get_label() in ('Office (Depot)', 'Branch Office')]
+            self.ax.legend(handles=depot_handle + handles, loc='upper left', bbox_to_anchor=(1.02, 1),
                            borderaxespad=0., framealpha=0.9,
                            facecolor='white', edgecolor='#DADCE0')
 
-        self.fig.tight_layout(rect=[0, 0, 0.85, 1])  # Make space for legend
-        self.draw()
+    def _pick_radius(self):
+        """Picking tolerance in data units (3% of the visible span)"""
+        (x0, x1), (y0, y1) = self.ax.get_xlim(), self.ax.get_ylim()
+        return 0.03 * max(abs(x1 - x0), abs(y1 - y0))
+
+    def client_at(self, x, y):
+        """Id of the client nearest to (x, y) within the pick radius, else None"""
+        if self.coords is None or not self.n_clients:
+            return None
+        clients = self.coords[1:self.n_clients + 1]
+        dist = np.hypot(clients[:, 0] - x, clients[:, 1] - y)
+        i = int(np.argmin(dist))
+        return self.client_ids[i] if dist[i] <= self._pick_radius() else None
+
+    def route_at(self, x, y):
+        """Index of the route whose segment is nearest to (x, y) within the pick radius, else None"""
+        if not len(self.segment_route):
+            return None
+        segments = np.concatenate(self.route_segments)
+        start, delta = segments[:, 0], segments[:, 1] - segments[:, 0]
+        length2 = np.maximum((delta ** 2).sum(axis=1), 1e-12)
+        t = np.clip(((x - start[:, 0]) * delta[:, 0] + (y - start[:, 1]) * delta[:, 1]) / length2, 0, 1)
+        dist = np.hypot(start[:, 0] + t * delta[:, 0] - x, start[:, 1] + t * delta[:, 1] - y)
+        i = int(np.argmin(dist))
+        return int(self.segment_route[i]) if dist[i] <= self._pick_radius() else None
+
+    def depot_at(self, x, y):
+        """Matrix index of the office or branch office nearest to (x, y) within the pick radius, else None"""
+        if self.coords is None:
+            return None
+        rows = [0] + list(range(self.n_clients + 1, len(self.coords)))
+        dist = np.hypot(self.coords[rows, 0] - x, self.coords[rows, 1] - y)
+        i = int(np.argmin(dist))
+        return rows[i] if dist[i] <= self._pick_radius() else None
+
+    def on_press(self, event):
+        """Start dragging the client under the cursor"""
+        if not self.editable or event.button != 1 or event.inaxes is not self.ax:
+            return
+        client = self.client_at(event.xdata, event.ydata)
+        if client is None:
+            return
+        self.drag_client = client
+        x, y = self.coords[self.index[client]]
+        self.drag_marker, = self.ax.plot([x], [y], 'o', markersize=14, markerfacecolor='none',
+                                         markeredgecolor='#202124', markeredgewidth=2, zorder=11)
+        self.draw_idle()
+
+    def on_motion(self, event):
+        """Move the dragged client and report the route under the cursor"""
+        if self.drag_client is None or event.inaxes is not self.ax:
+            return
+        self.drag_marker.set_data([event.xdata], [event.ydata])
+        self.draw_idle()
+        self.client_dragged.emit(self.drag_client, event.xdata, event.ydata)
+
+    def on_release(self, event):
+        """Drop the dragged client on the route under the cursor"""
+        if self.drag_client is None:
+            return
+        client, self.drag_client = self.drag_client, None
+        self.drag_marker.remove()
+        self.drag_marker = None
+        self.draw_idle()
+        if event.inaxes is self.ax:
+            self.client_dropped.emit(client, event.xdata, event.ydata)
+        else:
+            self.client_dropped.emit(client, None, None)
+
+    def update_labels(self):
+        """Label the clients in view according to the level of detail"""
+        if self.coords is None:
+            return
+        # Reading the limits may autoscale and re-enter through the callbacks
+        (x0, x1), (y0, y1) = self.ax.get_xlim(), self.ax.get_ylim()
+        for label in self.labels:
+            label.remove()
+        self.labels = []
+
+        clients = self.coords[1:self.n_clients + 1]
+        visible = np.flatnonzero((clients[:, 0] >= min(x0, x1)) & (clients[:, 0] <= max(x0, x1)) &
+                                 (clients[:, 1] >= min(y0, y1)) & (clients[:, 1] <= max(y0, y1)))
+        if len(visible) > self.MAX_LABELS:
+            return
+
+        boxed = len(visible) <= self.BOXED_LABELS
+        offset = 0.022 * abs(y1 - y0)
+        for i in visible:
+            x, y = clients[i]
+            if boxed:
+                label = self.ax.text(x, y + offset, f"{self.client_ids[i]}", fontsize=10,
+                                     ha='center', fontweight='bold', color='#202124',
+                                     bbox=dict(boxstyle="round,pad=0.3", facecolor="white",
+                                               edgecolor='#DADCE0', alpha=0.9))
+            else:
+                label = self.ax.text(x, y + offset, f"{self.client_ids[i]}", fontsize=7,
+                                     ha='center', color='#202124')
+            self.labels.append(label)
 
 
 class MainWindow(QMainWindow):
@@ -177,6 +394,8 @@ class MainWindow(QMainWindow):
         self.solver = PersonnelRoutingSolver()
         self.data = None
         self.solution = None
+        self.editor = None  # RouteEditor of the displayed solution
+        self.solve_inputs = {}
         self.init_ui()
         self.load_sample_data()
 
@@ -235,20 +454,33 @@ class MainWindow(QMainWindow):
         clients_label.setFont(QFont("Segoe UI", 9))
         clients_layout.addWidget(clients_label)
         self.n_clients_spin = QSpinBox()
-        self.n_clients_spin.setRange(5, 40)
+        self.n_clients_spin.setRange(5, 1000)
         self.n_clients_spin.setValue(15)
         self.n_clients_spin.setFont(QFont("Segoe UI", 9))
         self.n_clients_spin.valueChanged.connect(self.generate_new_data)
         clients_layout.addWidget(self.n_clients_spin)
         setup_layout.addLayout(clients_layout)
 
+        # Number of offices (main office plus branch offices)
+        depots_layout = QHBoxLayout()
+        depots_label = QLabel("Offices:")
+        depots_label.setFont(QFont("Segoe UI", 9))
+        depots_layout.addWidget(depots_label)
+        self.n_depots_spin = QSpinBox()
+        self.n_depots_spin.setRange(1, 5)
+        self.n_depots_spin.setValue(1)
+        self.n_depots_spin.setFont(QFont("Segoe UI", 9))
+        self.n_depots_spin.valueChanged.connect(self.generate_new_data)
+        depots_layout.addWidget(self.n_depots_spin)
+        setup_layout.addLayout(depots_layout)
+
         # Number of sales representatives
         reps_layout = QHBoxLayout()
         reps_label = QLabel("Sales Reps:")
         reps_label.setFont(QFont("Segoe UI", 9))
         reps_layout.addWidget(reps_label)
         self.n_vehicles_spin = QSpinBox()
-        self.n_vehicles_spin.setRange(1, 5)
+        self.n_vehicles_spin.setRange(1, 50)
         self.n_vehicles_spin.setValue(2)
         self.n_vehicles_spin.setFont(QFont("Segoe UI", 9))
         reps_layout.addWidget(self.n_vehicles_spin)
@@ -260,18 +492,86 @@ class MainWindow(QMainWindow):
         capacity_label.setFont(QFont("Segoe UI", 9))
         capacity_layout.addWidget(capacity_label)
         self.capacity_spin = QSpinBox()
-        self.capacity_spin.setRange(1, 20)
+        self.capacity_spin.setRange(1, 200)
         self.capacity_spin.setValue(8)
         self.capacity_spin.setFont(QFont("Segoe UI", 9))
         capacity_layout.addWidget(self.capacity_spin)
         setup_layout.addLayout(capacity_layout)
 
+        # Solver engine
+        engine_layout = QHBoxLayout()
+        engine_label = QLabel("Solver:")
+        engine_label.setFont(QFont("Segoe UI", 9))
+        engine_layout.addWidget(engine_label)
+        self.engine_combo = QComboBox()
+        self.engine_combo.addItems(list(SOLVER_ENGINES))
+        self.engine_combo.setFont(QFont("Segoe UI", 9))
+        engine_layout.addWidget(self.engine_combo)
+        setup_layout.addLayout(engine_layout)
+
+        # Objective: total travel time or balanced routes
+        objective_layout = QHBoxLayout()
+        objective_label = QLabel("Objective:")
+        objective_label.setFont(QFont("Segoe UI", 9))
+        objective_layout.addWidget(objective_label)
+        self.objective_combo = QComboBox()
+        self.objective_combo.addItems(list(OBJECTIVES))
+        self.objective_combo.setFont(QFont("Segoe UI", 9))
+        objective_layout.addWidget(self.objective_combo)
+        setup_layout.addLayout(objective_layout)
+
+        # Gurobi parameter profile saved by tuning.py
+        tuning_layout = QHBoxLayout()
+        tuning_label = QLabel("MIP Tuning:")
+        tuning_label.setFont(QFont("Segoe UI", 9))
+        tuning_layout.addWidget(tuning_label)
+        self.tuning_combo = QComboBox()
+        self.tuning_combo.addItem("Gurobi defaults", None)
+        self.tuning_combo.addItem("Auto (by instance size)", "auto")
+        for name in list_profiles():
+            self.tuning_combo.addItem(name, name)
+        self.tuning_combo.setFont(QFont("Segoe UI", 9))
+        tuning_layout.addWidget(self.tuning_combo)
+        setup_layout.addLayout(tuning_layout)
+
         # Checkbox for service times
         self.include_service_cb = QCheckBox("Include client service times")
         self.include_service_cb.setChecked(True)
         self.include_service_cb.setFont(QFont("Segoe UI", 9))
         setup_layout.addWidget(self.include_service_cb)
 
+        # Checkbox for fast mode (savings heuristic only, no MIP)
+        self.fast_mode_cb = QCheckBox("Fast mode (heuristic only)")
+        self.fast_mode_cb.setChecked(False)
+        self.fast_mode_cb.setFont(QFont("Segoe UI", 9))
+        setup_layout.addWidget(self.fast_mode_cb)
+
+        # Checkbox for prize-collecting mode (low-priority clients may be skipped)
+        self.optional_visits_cb = QCheckBox("Optional visits (skip low-priority clients)")
+        self.optional_visits_cb.setChecked(False)
+        self.optional_visits_cb.setFont(QFont("Segoe UI", 9))
+        setup_layout.addWidget(self.optional_visits_cb)
+
+        # Checkbox for open routes (reps go home after their last client)
+        self.open_routes_cb = QCheckBox("Open routes (reps finish at home)")
+        self.open_routes_cb.setChecked(False)
+        self.open_routes_cb.setFont(QFont("Segoe UI", 9))
+        setup_layout.addWidget(self.open_routes_cb)
+
+        # Maximum shift duration per rep (0 = no limit)
+        shift_layout = QHBoxLayout()
+        shift_label = QLabel("Max Shift (min):")
+        shift_label.setFont(QFont("Segoe UI", 9))
+        shift_layout.addWidget(shift_label)
+        self.shift_spin = QSpinBox()
+        self.shift_spin.setRange(0, 1440)
+        self.shift_spin.setSingleStep(30)
+        self.shift_spin.setValue(0)
+        self.shift_spin.setSpecialValueText("No limit")
+        self.shift_spin.setFont(QFont("Segoe UI", 9))
+        shift_layout.addWidget(self.shift_spin)
+        setup_layout.addLayout(shift_layout)
+
         # Solver time limit
         time_layout = QHBoxLayout()
         time_label = QLabel("Solver Time (s):")
@@ -321,6 +621,17 @@ class MainWindow(QMainWindow):
         self.solve_btn.clicked.connect(self.solve_problem)
         left_layout.addWidget(self.solve_btn)
 
+        self.stop_btn = QPushButton(" Stop && Keep Best")
+        self.stop_btn.setStyleSheet(button_style + """
+            QPushButton {
+                background-color: #EA4335;
+                color: white;
+            }
+        """)
+        self.stop_btn.clicked.connect(self.stop_solve)
+        self.stop_btn.setEnabled(False)
+        left_layout.addWidget(self.stop_btn)
+
         # Data management buttons
         data_layout = QHBoxLayout()
         self.load_btn = QPushButton(" Load")
@@ -453,6 +764,9 @@ class MainWindow(QMainWindow):
         map_layout.setContentsMargins(5, 5, 5, 5)
         self.plot_canvas = PlotCanvas(self, width=7, height=5.5)
         map_layout.addWidget(self.plot_canvas)
+        self.plot_canvas.client_dragged.connect(self.on_client_dragged)
+        self.plot_canvas.client_dropped.connect(self.on_client_dropped)
+        QShortcut(QKeySequence.Undo, self, self.undo_move)
         tabs.addTab(map_tab, "📍 Route Map")
 
         # Clients Information tab
@@ -567,17 +881,18 @@ class MainWindow(QMainWindow):
     def load_sample_data(self):
         """Load sample data on startup"""
         n_clients = self.n_clients_spin.value()
-        self.data = DataManager.generate_sample_data(n_clients)
+        self.data = DataManager.generate_sample_data(n_clients, n_depots=self.n_depots_spin.value())
         self.update_data_display()
         self.status_label.setText("✅ Sample data loaded")
 
     def generate_new_data(self):
         """Generate new random data"""
         n_clients = self.n_clients_spin.value()
-        self.data = DataManager.generate_sample_data(n_clients)
+        self.data = DataManager.generate_sample_data(n_clients, n_depots=self.n_depots_spin.value())
         self.update_data_display()
         self.status_label.setText(f"✅ Generated data for {n_clients} clients")
         self.solution = None
+        self.set_editor(None)
         self.solution_text.clear()
         self.export_btn.setEnabled(False)
 
@@ -633,9 +948,25 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "Warning", "Please load or generate data first!")
             return
 
-        # Update solver parameters
-        self.solver.time_limit = self.time_limit_spin.value()
+        # Update solver parameters; several offices or open routes go
+        # through the depot decomposition with the chosen engine
+        engine = SOLVER_ENGINES[self.engine_combo.currentText()]
         n_vehicles = self.n_vehicles_spin.value()
+        depots = DataManager.get_depots(self.data)
+        open_routes = self.open_routes_cb.isChecked()
+        depot_options = None
+        if len(depots) > 1 or open_routes:
+            self.solver = MultiDepotSolver(engine=engine,
+                                           engine_options={"fast_mode": self.fast_mode_cb.isChecked(),
+                                                           "tuning_profile": self.tuning_combo.currentData()})
+            depot_options = {"depots": depots, "open_routes": open_routes,
+                             "vehicle_depots": [depots[k % len(depots)] for k in range(n_vehicles)]}
+        elif type(self.solver) is not engine:
+            self.solver = engine()
+        self.solver.time_limit = self.time_limit_spin.value()
+        self.solver.fast_mode = self.fast_mode_cb.isChecked()
+        self.solver.tuning_profile = self.tuning_combo.currentData()
+        n_branches = len(depots) - 1  # Branch offices come last in the matrix
 
         # Prepare data
         distances = self.data["distance_matrix"]
@@ -645,31 +976,78 @@ class MainWindow(QMainWindow):
         if self.include_service_cb.isChecked():
             service_times = [0]  # Depot has 0 service time
             service_times.extend([c.get("service_time", 30) for c in self.data["clients"]])
+            service_times.extend([0] * n_branches)
 
         # Get demands from clients (each client has demand = 1)
         demands = [0]  # Depot has 0 demand
         demands.extend([1 for _ in self.data["clients"]])  # Each client has demand 1
+        demands.extend([0] * n_branches)
 
         # Set capacities (max clients per sales rep)
         capacity = self.capacity_spin.value()
         capacities = [capacity] * n_vehicles
 
+        # Client appointment windows (if the data defines any) and shift limit
+        time_windows = self.client_time_windows()
+        if time_windows is not None:
+            time_windows.extend([None] * n_branches)
+        max_shift = self.shift_spin.value() or None
+
+        # Prizes from the client priorities: a client is only visited if worth its detour
+        prizes = None
+        if self.optional_visits_cb.isChecked():
+            priorities = self.data.get("priorities") or \
+                [2] + [c.get("priority", 2) for c in self.data["clients"]] + [2] * n_branches
+            prizes = priority_prizes(priorities)
+            for depot in depots:
+                prizes[depot] = 0.0
+
+        # Kept to edit the routes of the solution
+        self.solve_inputs = {"n_vehicles": n_vehicles,
+                             "vehicle_depots": depot_options["vehicle_depots"] if depot_options else None,
+                             "travel_times": self.data.get("travel_time_matrix"),
+                             "service_times": service_times, "demands": demands,
+                             "vehicle_capacities": capacities, "time_windows": time_windows,
+                             "max_shift_duration": max_shift}
+        self.set_editor(None)
+
         # Show progress
         self.progress_bar.setVisible(True)
         self.progress_bar.setRange(0, 100)
         self.progress_bar.setValue(20)
         self.status_label.setText("🔄 Setting up optimization problem...")
         self.solve_btn.setEnabled(False)
+        self.stop_btn.setEnabled(True)
 
         # Create and start solver thread
         self.solve_thread = SolveThread(
             self.solver, distances, n_vehicles,
-            service_times, demands, capacities
+            service_times, demands, capacities,
+            time_windows, max_shift,
+            self.data.get("travel_time_matrix"),  # Road-network times, if computed
+            prizes, OBJECTIVES[self.objective_combo.currentText()],
+            depot_options
         )
         self.solve_thread.finished.connect(self.on_solve_finished)
         self.solve_thread.progress.connect(self.on_solve_progress)
+        self.solve_thread.incumbent.connect(self.on_incumbent)
         self.solve_thread.start()
 
+    def stop_solve(self):
+        """Interrupt the running solve; its best solution is reported as usual"""
+        self.stop_btn.setEnabled(False)
+        self.status_label.setText("⏹ Stopping, keeping the best solution found...")
+        self.solver.stop()
+
+    def client_time_windows(self):
+        """[earliest, latest] per location from the client data, None if no client has a window"""
+        clients = self.data["clients"]
+        windows = [(c.get("time_window_start"), c.get("time_window_end")) for c in clients]
+        if all(start is None and end is None for start, end in windows):
+            return None
+        return [None] + [None if start is None and end is None else (start, end)
+                         for start, end in windows]
+
     def on_solve_progress(self, message):
         """Update progress during solving"""
         self.status_label.setText(message)
@@ -678,20 +1056,37 @@ class MainWindow(QMainWindow):
         elif "Optimizing" in message:
             self.progress_bar.setValue(75)
 
+    def on_incumbent(self, routes, objective, bound, gap):
+        """Draw a new incumbent while the solver is still running"""
+        if not self.stop_btn.isEnabled():
+            return  # Stop requested: the final solution follows
+        self.plot_canvas.update_routes(routes, self.open_routes_cb.isChecked())
+        message = f"🔄 Incumbent: {objective:.0f} min travel"
+        if bound is not None:
+            message += f", bound {bound:.0f}"
+        if gap is not None:
+            message += f", gap {100 * gap:.1f}%"
+        self.status_label.setText(message)
+
     def on_solve_finished(self, solution):
         """Handle solver completion"""
         self.progress_bar.setValue(100)
         self.progress_bar.setVisible(False)
         self.solve_btn.setEnabled(True)
+        self.stop_btn.setEnabled(False)
 
         if solution and solution.routes:
             self.solution = solution
             self.display_solution(solution)
-            self.display_routes_list(solution)
+            # The map and the routes list show one route per rep, idle reps
+            # included, so that route k stays rep k while editing
+            self.set_editor(RouteEditor.from_solution(solution, self.data["distance_matrix"],
+                                                      **self.solve_inputs))
+            self.display_routes_list(self.editor.routes, solution.open_routes)
             self.export_btn.setEnabled(True)
 
             # Update plot with routes
-            self.plot_canvas.plot_data(self.data, solution.routes)
+            self.plot_canvas.plot_data(self.data, self.editor.routes, solution.open_routes)
 
             # Show success message
             hours = solution.total_time // 60
@@ -727,7 +1122,13 @@ class MainWindow(QMainWindow):
         text += f"Total Time: {time_str}\n"
         text += f"  • Travel: {travel_str}\n"
         text += f"  • Service: {service_str}\n"
+        if solution.waiting_time:
+            text += f"  • Waiting: {solution.waiting_time:.0f}min\n"
+        if solution.route_durations:
+            text += f"Longest Route: {max(solution.route_durations):.0f}min\n"
         text += f"Solver Time: {solution.solve_time:.1f}s\n"
+        if solution.dropped:
+            text += f"Skipped Clients: {', '.join(f'C{i}' for i in solution.dropped)}\n"
 
         if solution.routes:
             text += "\n━━━━━━━━━━━━━━━━━━━━━━━━\n"
@@ -736,29 +1137,31 @@ class MainWindow(QMainWindow):
 
             for i, route in enumerate(solution.routes):
                 clients_count = len(route) - 2  # Exclude depot at start and end
-                text += f"Rep {i + 1}: {clients_count} clients\n"
+                rep = solution.vehicles[i] if solution.vehicles else i
+                text += f"Rep {rep + 1}: {clients_count} clients\n"
                 text += "  Route: " + " → ".join(
-                    ["Office" if node == 0 else f"C{node}" for node in route]
+                    [self.node_name(node) for node in route[:-1]] +
+                    ["Home" if solution.open_routes else self.node_name(route[-1])]
                 ) + "\n\n"
 
         self.solution_text.setText(text)
 
-    def display_routes_list(self, solution: Solution):
-        """Display routes in the list widget"""
+    def node_name(self, node: int) -> str:
+        """Display name of a location: the office, a branch office or a client"""
+        if node == 0:
+            return "Office"
+        branch = node - len(self.data["clients"]) - 1
+        if 0 <= branch < len(self.data.get("branches", [])):
+            return self.data["branches"][branch]["name"].replace("_", " ")
+        return f"C{node}"
+
+    def display_routes_list(self, routes, open_routes: bool = False):
+        """Display routes in the list widget (route i = rep i)"""
         self.routes_list.clear()
 
-        if solution.routes:
-            for i, route in enumerate(solution.routes):
-                # Count clients in this route
-                clients_in_route = [node for node in route if node != 0]
-
-                item_text = f"👤 Sales Representative {i + 1}\n"
-                item_text += f"   📍 Clients: {len(clients_in_route)}\n"
-                item_text += f"   🛣️  Route: Office → "
-                item_text += " → ".join(f"C{node}" for node in route[1:-1])
-                item_text += " → Office"
-
-                item = QListWidgetItem(item_text)
+        if routes:
+            for i, route in enumerate(routes):
+                item = QListWidgetItem(self.route_item_text(i, route, open_routes))
                 item.setFont(QFont("Segoe UI", 9))
 
                 # Set alternating background colors
@@ -769,17 +1172,92 @@ class MainWindow(QMainWindow):
 
                 self.routes_list.addItem(item)
 
+    def route_item_text(self, i: int, route, open_routes: bool) -> str:
+        """Text of the routes list item of rep i"""
+        item_text = f"👤 Sales Representative {i + 1}\n"
+        item_text += f"   📍 Clients: {len(route) - 2}\n"  # Exclude depot at start and end
+        if len(route) <= 2:
+            return item_text + f"   🛣️  Idle at {self.node_name(route[0])}"
+        item_text += f"   🛣️  Route: {self.node_name(route[0])} → "
+        item_text += " → ".join(f"C{node}" for node in route[1:-1])
+        item_text += " → Home" if open_routes else f" → {self.node_name(route[-1])}"
+        return item_text
+
+    def set_editor(self, editor):
+        """Enable route editing on the map (None disables it)"""
+        self.editor = editor
+        self.plot_canvas.editable = editor is not None
+
+    def drop_target(self, x, y):
+        """First idle rep of the office under (x, y), else the route under (x, y), else None"""
+        if x is None:
+            return None
+        # Every route of an office passes over it: the office itself selects an idle rep
+        depot = self.plot_canvas.depot_at(x, y)
+        target = self.editor.idle_route(depot) if depot is not None else None
+        if target is None:
+            target = self.plot_canvas.route_at(x, y)
+        return target
+
+    def on_client_dragged(self, client, x, y):
+        """Show the cost and feasibility of dropping the dragged client on the route under the cursor"""
+        target = self.drop_target(x, y)
+        if client not in self.editor.route_of:
+            self.status_label.setText(f"C{client} is not visited")
+        elif target is None:
+            self.status_label.setText(f"✋ Drop C{client} on a route, or on an office for an idle rep")
+        else:
+            self.status_label.setText(self.move_text(self.editor.evaluate(client, target)))
+
+    def move_text(self, move) -> str:
+        """One-line summary of an evaluated move"""
+        text = (f"C{move.client} → Rep {move.target + 1}: {move.delta_distance:+.1f} km, "
+                f"{move.delta_time:+.0f} min travel")
+        return f"✅ {text}" if move.feasible else f"⚠️ {text} (violates {move.reason})"
+
+    def on_client_dropped(self, client, x, y):
+        """Insert the dropped client at its cheapest feasible position of the route, refresh only the changed routes"""
+        target = self.drop_target(x, y)
+        if target is None or client not in self.editor.route_of:
+            self.status_label.setText("Move cancelled")
+            return
+        move = self.editor.evaluate(client, target)
+        if not move.feasible:
+            self.status_label.setText(f"{self.move_text(move)}, not applied")
+            return
+        self.refresh_routes(self.editor.apply(move))
+        self.status_label.setText(f"{self.move_text(move)}, total {self.editor.total_distance:.1f} km")
+
+    def undo_move(self):
+        """Revert the last route edit"""
+        if self.editor is None or not self.editor.history:
+            return
+        self.refresh_routes(self.editor.undo())
+        self.status_label.setText(f"↩ Move undone, total {self.editor.total_distance:.1f} km")
+
+    def refresh_routes(self, changed):
+        """Update the map, the routes list and the summary after an edit of the given routes"""
+        dropped = self.solution.dropped
+        self.solution = self.editor.solution()
+        self.solution.dropped = dropped
+        for r in changed:
+            route = self.editor.routes[r]
+            self.plot_canvas.update_route(r, route)
+            self.routes_list.item(r).setText(self.route_item_text(r, route, self.editor.open_routes))
+        self.display_solution(self.solution)
+
     def load_data(self):
         """Load data from file"""
         filename, _ = QFileDialog.getOpenFileName(
-            self, "Load Data", "", "JSON Files (*.json)"
+            self, "Load Data", "", "Instances (*.json *.npz);;JSON Files (*.json);;Binary Instances (*.npz)"
         )
         if filename:
             try:
-                self.data = DataManager.load_from_json(filename)
+                self.data = DataManager.load(filename)
                 self.update_data_display()
                 self.status_label.setText(f"✅ Loaded data from {filename.split('/')[-1]}")
                 self.solution = None
+                self.set_editor(None)
                 self.solution_text.clear()
                 self.export_btn.setEnabled(False)
             except Exception as e:
@@ -792,11 +1270,12 @@ class MainWindow(QMainWindow):
             return
 
         filename, _ = QFileDialog.getSaveFileName(
-            self, "Save Data", "sales_routing_data.json", "JSON Files (*.json)"
+            self, "Save Data", "sales_routing_data.json",
+            "JSON Files (*.json);;Binary Instances (*.npz)"
         )
         if filename:
             try:
-                DataManager.save_to_json(self.data, filename)
+                DataManager.save(self.data, filename)
                 self.status_label.setText(f"✅ Data saved to {filename.split('/')[-1]}")
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Failed to save data: {str(e)}")
@@ -808,11 +1287,14 @@ class MainWindow(QMainWindow):
             return
 
         filename, _ = QFileDialog.getSaveFileName(
-            self, "Export Solution", "solution_report.txt", "Text Files (*.txt)"
+            self, "Export Solution", "solution_report.txt",
+            "Text Files (*.txt);;GeoJSON Routes (*.geojson);;Stops CSV (*.csv);;"
+            "Stops Parquet (*.parquet);;Dispatch JSON (*.json)"
         )
         if filename:
             try:
-                self.solver.save_solution(filename)
+                # Written from the displayed solution, route edits included
+                export_solution(self.solution, self.data, filename)
                 self.status_label.setText(f"✅ Solution exported to {filename.split('/')[-1]}")
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Failed to export: {str(e)}")
\ No newline at end of file
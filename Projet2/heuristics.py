@@ -0,0 +1,497 @@
+import numpy as np
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+
+def route_load(route: List[int], demands: List[int]) -> float:
+    """Total demand served by a route (depot excluded)"""
+    return sum(demands[node] for node in route if node != 0)
+
+
+def route_cost(route: List[int], distances: np.ndarray) -> float:
+    """Length of a route given as [0, ..., 0]"""
+    return float(sum(distances[route[i]][route[i + 1]] for i in range(len(route) - 1)))
+
+
+@dataclass
+class TimeConstraints:
+    """
+    Time data of the VRPTW mode
+
+    Every vehicle leaves the depot at the depot's earliest time. A client may
+    be reached early (the rep waits until the window opens) but never after
+    its latest time. A vehicle must be back at the depot before the depot's
+    latest time and within its maximum shift duration (travel + service +
+    waiting). With a travel time profile, the time of an arc depends on the
+    departure time from its tail (travel_times is then a static average).
+    """
+    travel_times: np.ndarray  # minutes
+    service_times: List[float]  # minutes
+    time_windows: Optional[List[Optional[Tuple[float, float]]]] = None  # [earliest, latest] per node
+    shift_limits: Optional[List[float]] = None  # maximum shift duration per vehicle
+    profile: Optional["TimeDependentTravelTimes"] = None  # see travel_profile
+
+    EPS = 1e-6
+
+    def __post_init__(self):
+        n = len(self.travel_times)
+        windows = self.time_windows or [None] * n
+        self.earliest = [float(w[0]) if w is not None and w[0] is not None else 0.0 for w in windows]
+        self.latest = [float(w[1]) if w is not None and w[1] is not None else float("inf")
+                       for w in windows]
+
+    @property
+    def departure(self) -> float:
+        return self.earliest[0]
+
+    def return_limit(self, vehicle: Optional[int] = None) -> float:
+        """Latest return time at the depot (most generous vehicle if None)"""
+        if not self.shift_limits:
+            shift = float("inf")
+        elif vehicle is None or vehicle >= len(self.shift_limits):
+            shift = max(self.shift_limits)
+        else:
+            shift = self.shift_limits[vehicle]
+        return min(self.latest[0], self.departure + shift)
+
+    def travel(self, prev: int, node: int, departure: float) -> float:
+        """Travel time of an arc leaving its tail at the given time"""
+        if self.profile is None:
+            return self.travel_times[prev][node]
+        return self.profile.travel_time(prev, node, departure)
+
+    def schedule(self, route: List[int]) -> Tuple[List[float], float, float]:
+        """Arrival time at every stop, total waiting time and return time"""
+        t = self.departure
+        arrivals = [t]
+        waiting = 0.0
+        for prev, node in zip(route, route[1:]):
+            t += self.service_times[prev]
+            t += self.travel(prev, node, t)
+            arrivals.append(t)
+            if node != 0 and t < self.earliest[node]:
+                waiting += self.earliest[node] - t
+                t = self.earliest[node]
+        return arrivals, waiting, t
+
+    def starts(self, route: List[int]) -> List[float]:
+        """Service start time at every stop (prefix array for feasible_from)"""
+        starts = [self.departure]
+        for prev, node in zip(route, route[1:]):
+            t = starts[-1] + self.service_times[prev]
+            t += self.travel(prev, node, t)
+            starts.append(max(t, self.earliest[node]) if node != 0 else t)
+        return starts
+
+    def feasible(self, route: List[int], vehicle: Optional[int] = None) -> bool:
+        """Check windows along the route and the return limit of the vehicle"""
+        return self.feasible_from(route, 0, self.departure, vehicle)
+
+    def feasible_from(self, route: List[int], p: int, start: float, vehicle: Optional[int] = None,
+                      old_starts: Optional[List[float]] = None, suffix: int = 0) -> bool:
+        """
+        Check a route from position p on, service starting at start there
+
+        With the start times of a feasible route (old_starts) that ends with
+        the same suffix nodes, the check stops as soon as a suffix node
+        starts at its old time: FIFO makes the rest of the route unchanged.
+        """
+        t = start
+        first_shared = len(route) - suffix
+        for q in range(p + 1, len(route)):
+            prev, node = route[q - 1], route[q]
+            t += self.service_times[prev]
+            t += self.travel(prev, node, t)
+            if node != 0:
+                if t > self.latest[node] + self.EPS:
+                    return False
+                t = max(t, self.earliest[node])
+                if q >= first_shared and t <= old_starts[q - len(route)] + self.EPS:
+                    return True
+        return t <= self.return_limit(vehicle) + self.EPS
+
+
+def clarke_wright(distances: np.ndarray,
+                  n_vehicles: int,
+                  vehicle_capacities: Optional[List[int]] = None,
+                  demands: Optional[List[int]] = None,
+                  max_neighbors: int = 40,
+                  time_constraints: Optional[TimeConstraints] = None) -> List[List[int]]:
+    """
+    Clarke-Wright parallel savings construction
+
+    Routes are merged by decreasing saving d(i,0) + d(0,j) - d(i,j) while the
+    merged load fits the largest vehicle. The result is then adjusted to use
+    exactly n_vehicles routes (forced merges or splits), so it can be used as
+    a start for the MIP, which requires every vehicle to leave the depot.
+
+    Args:
+        distances: n x n distance matrix, depot at index 0
+        n_vehicles: number of routes to build
+        vehicle_capacities: capacity of each vehicle
+        demands: demand at each location
+        max_neighbors: savings are only computed between each client and its
+            nearest neighbours, which keeps large instances tractable
+        time_constraints: if given, merges must keep every route time-feasible
+            (checked against the longest shift)
+
+    Returns:
+        List of routes, each starting and ending at the depot
+    """
+    n = len(distances)
+    if demands is None:
+        demands = [0] * n
+    if vehicle_capacities is None:
+        vehicle_capacities = [1000] * n_vehicles
+    capacity = max(vehicle_capacities[:n_vehicles])
+
+    if n <= 1:
+        return []
+
+    dist = np.asarray(distances, dtype=float)
+    clients = np.arange(1, n)
+
+    # Candidate pairs: all pairs on small instances, nearest neighbours otherwise
+    if n - 1 <= max_neighbors + 1:
+        first, second = np.triu_indices(n - 1, k=1)
+        first, second = clients[first], clients[second]
+    else:
+        sub = dist[1:, 1:].copy()
+        np.fill_diagonal(sub, np.inf)
+        nearest = np.argpartition(sub, max_neighbors, axis=1)[:, :max_neighbors]
+        first = np.repeat(clients, max_neighbors)
+        second = clients[nearest.ravel()]
+        pairs = np.unique(np.stack([np.minimum(first, second), np.maximum(first, second)]), axis=1)
+        first, second = pairs[0], pairs[1]
+
+    savings = dist[first, 0] + dist[0, second] - dist[first, second]
+    order = np.argsort(-savings, kind="stable")
+
+    # One route per client to begin with
+    routes = {i: [i] for i in range(1, n)}
+    owner = {i: i for i in range(1, n)}
+    loads = {i: demands[i] for i in range(1, n)}
+
+    def merge(ri: int, rj: int, i: int, j: int) -> bool:
+        """Join route ri and rj through the edge (i, j) if both are endpoints"""
+        a, b = routes[ri], routes[rj]
+        if loads[ri] + loads[rj] > capacity:
+            return False
+        if a[-1] != i:
+            if a[0] != i:
+                return False
+            a = a[::-1]
+        if b[0] != j:
+            if b[-1] != j:
+                return False
+            b = b[::-1]
+        if time_constraints is not None and not time_constraints.feasible([0] + a + b + [0]):
+            return False
+        routes[ri] = a + b
+        loads[ri] += loads.pop(rj)
+        for node in b:
+            owner[node] = ri
+        del routes[rj]
+        return True
+
+    for idx in order:
+        if savings[idx] <= 0:
+            break
+        i, j = int(first[idx]), int(second[idx])
+        ri, rj = owner[i], owner[j]
+        if ri != rj:
+            merge(ri, rj, i, j)
+
+    # Too many routes: keep merging the best remaining endpoint pairs
+    while len(routes) > n_vehicles:
+        candidates = []
+        keys = list(routes)
+        for p, ri in enumerate(keys):
+            for rj in keys[p + 1:]:
+                if loads[ri] + loads[rj] > capacity:
+                    continue
+                a, b = routes[ri], routes[rj]
+                for i in {a[0], a[-1]}:
+                    for j in {b[0], b[-1]}:
+                        candidates.append((dist[i, 0] + dist[0, j] - dist[i, j], ri, rj, i, j))
+        candidates.sort(key=lambda c: -c[0])
+        if not any(merge(*candidate[1:]) for candidate in candidates):
+            break
+
+    result = list(routes.values())
+
+    # Too few routes: split the longest route where it costs least
+    while len(result) < n_vehicles:
+        result.sort(key=len)
+        longest = result[-1]
+        if len(longest) < 2:
+            break
+        cut = min(range(1, len(longest)),
+                  key=lambda c: dist[longest[c - 1], 0] + dist[0, longest[c]]
+                  - dist[longest[c - 1], longest[c]])
+        result[-1:] = [longest[:cut], longest[cut:]]
+
+    return [[0] + route + [0] for route in result]
+
+
+# Prize of a visit in minutes of travel time, by client priority (1 = high, 3 = low)
+PRIORITY_PRIZES = {1: 240.0, 2: 120.0, 3: 60.0}
+
+
+def priority_prizes(priorities: List[int], prizes_by_priority: Optional[dict] = None) -> List[float]:
+    """Prize of every location from its priority, the depot (index 0) gets none"""
+    table = PRIORITY_PRIZES if prizes_by_priority is None else prizes_by_priority
+    return [0.0] + [float(table[p]) for p in priorities[1:]]
+
+
+def prize_objective(routes: List[List[int]], travel_times: np.ndarray, prizes: List[float]) -> float:
+    """Prize-collecting objective: travel time plus the prizes of the clients left out"""
+    visited = {node for route in routes for node in route}
+    return sum(route_cost(route, travel_times) for route in routes) + \
+        sum(prize for i, prize in enumerate(prizes) if i > 0 and i not in visited)
+
+
+def select_visits(routes: List[List[int]],
+                  travel_times: np.ndarray,
+                  prizes: List[float],
+                  demands: List[int],
+                  vehicle_capacities: List[int],
+                  n_vehicles: int,
+                  time_constraints: Optional[TimeConstraints] = None) -> List[List[int]]:
+    """
+    Choose the visited clients under the prize-collecting objective
+
+    1. Routes beyond n_vehicles are dissolved, and routes over their
+       capacity or time limits drop their least valuable clients until
+       they fit.
+    2. Clients whose removal saves more travel time than their prize are
+       dropped.
+    3. Unvisited clients are inserted, highest prize first, at their
+       cheapest feasible position as long as it costs less than the prize.
+
+    Returns:
+        One route per vehicle (route k for vehicle k, [0, 0] if unused)
+    """
+    d = np.asarray(travel_times, dtype=float)
+    routes = [list(route) for route in routes[:n_vehicles]]
+    routes += [[0, 0] for _ in range(n_vehicles - len(routes))]
+
+    def fits(route: List[int], k: int) -> bool:
+        return route_load(route, demands) <= vehicle_capacities[k] + 1e-9 and \
+            (time_constraints is None or len(route) <= 2 or time_constraints.feasible(route, k))
+
+    def profit(route: List[int], p: int) -> float:
+        """Travel time saved by removing position p, minus the prize lost"""
+        a, u, b = route[p - 1], route[p], route[p + 1]
+        return d[a, u] + d[u, b] - d[a, b] - prizes[u]
+
+    for k, route in enumerate(routes):
+        while not fits(route, k):
+            del route[max(range(1, len(route) - 1), key=lambda p: profit(route, p))]
+
+    while True:
+        moves = [(profit(route, p), k, p) for k, route in enumerate(routes)
+                 for p in range(1, len(route) - 1)]
+        gain, k, p = max(moves, default=(0.0, None, None))
+        if gain <= 1e-9:
+            break
+        candidate = routes[k][:p] + routes[k][p + 1:]
+        if not fits(candidate, k):
+            break  # Only possible on matrices that break the triangle inequality
+        routes[k] = candidate
+
+    visited = {node for route in routes for node in route}
+    for client in sorted((i for i in range(1, len(d)) if i not in visited), key=lambda i: -prizes[i]):
+        options = []
+        for k, route in enumerate(routes):
+            if route_load(route, demands) + demands[client] > vehicle_capacities[k] + 1e-9:
+                continue
+            arr = np.asarray(route)
+            costs = d[arr[:-1], client] + d[client, arr[1:]] - d[arr[:-1], arr[1:]]
+            options.extend((float(cost), k, p + 1) for p, cost in enumerate(costs))
+        for cost, k, p in sorted(options):
+            if cost >= prizes[client]:
+                break
+            candidate = routes[k][:p] + [client] + routes[k][p:]
+            if time_constraints is None or time_constraints.feasible(candidate, k):
+                routes[k] = candidate
+                break
+    return routes
+
+
+# Objective modes: total travel time, longest route (makespan) or a weighted sum of both
+OBJECTIVES = ("total", "makespan", "balanced")
+# Weight of the total travel time in makespan mode, so that among routes with
+# the same longest duration the shortest overall is preferred
+MAKESPAN_TIE_BREAK = 0.01
+
+
+def objective_weights(objective: str = "total", makespan_weight: float = 1.0) -> Tuple[float, float]:
+    """(travel weight, longest route weight) of an objective mode"""
+    if objective == "total":
+        return 1.0, 0.0
+    if objective == "makespan":
+        return MAKESPAN_TIE_BREAK, 1.0
+    if objective == "balanced":
+        return 1.0, float(makespan_weight)
+    raise ValueError(f"Unknown objective: {objective} (expected one of {', '.join(OBJECTIVES)})")
+
+
+def route_duration(route: List[int], travel_times: np.ndarray, service_times: List[float],
+                   time_constraints: Optional[TimeConstraints] = None) -> float:
+    """Working time of a route: travel, service and waiting for windows (minutes)"""
+    if len(route) <= 2:
+        return 0.0
+    if time_constraints is not None:
+        _, _, back = time_constraints.schedule(route)
+        return back - time_constraints.departure
+    return route_cost(route, travel_times) + sum(service_times[node] for node in route[1:-1])
+
+
+def balanced_objective(routes: List[List[int]], travel_times: np.ndarray, service_times: List[float],
+                       weights: Tuple[float, float],
+                       time_constraints: Optional[TimeConstraints] = None) -> float:
+    """Weighted sum of the total travel time and the longest route duration"""
+    travel_weight, makespan_weight = weights
+    longest = max((route_duration(route, travel_times, service_times, time_constraints)
+                   for route in routes), default=0.0)
+    return travel_weight * sum(route_cost(route, travel_times) for route in routes) + \
+        makespan_weight * longest
+
+
+def balance_routes(routes: List[List[int]],
+                   travel_times: np.ndarray,
+                   service_times: List[float],
+                   demands: List[int],
+                   vehicle_capacities: List[int],
+                   weights: Tuple[float, float],
+                   time_constraints: Optional[TimeConstraints] = None,
+                   max_moves: int = 1000) -> List[List[int]]:
+    """
+    Min-max descent on the longest route
+
+    Every step applies the best move that lowers the balanced objective:
+    relocating a client of the longest route to any position of another
+    route, or swapping it with a client of another route. Stops when no
+    move improves or after max_moves moves. When the total travel time
+    also counts, a second descent starts from the routes balanced on the
+    longest route alone: single moves rarely help when several routes are
+    equally long.
+
+    Returns:
+        The routes in the same order (route k still driven by vehicle k)
+    """
+    if weights[1] <= 0 or len(routes) < 2:
+        return [list(route) for route in routes]
+    args = (travel_times, service_times, demands, vehicle_capacities)
+    result = _min_max_descent(routes, *args, weights, time_constraints, max_moves)
+    if weights[0] > MAKESPAN_TIE_BREAK * weights[1]:
+        balanced = _min_max_descent(routes, *args, objective_weights("makespan"), time_constraints,
+                                    max_moves)
+        balanced = _min_max_descent(balanced, *args, weights, time_constraints, max_moves)
+        if balanced_objective(balanced, travel_times, service_times, weights, time_constraints) < \
+                balanced_objective(result, travel_times, service_times, weights, time_constraints):
+            result = balanced
+    return result
+
+
+def _min_max_descent(routes: List[List[int]], travel_times: np.ndarray, service_times: List[float],
+                     demands: List[int], vehicle_capacities: List[int], weights: Tuple[float, float],
+                     time_constraints: Optional[TimeConstraints], max_moves: int) -> List[List[int]]:
+    """Best-improvement relocate/swap descent of balance_routes"""
+    d = np.asarray(travel_times, dtype=float)
+    s = np.asarray(service_times, dtype=float)
+    tc = time_constraints
+    travel_weight, makespan_weight = weights
+    routes = [list(route) for route in routes]
+    m = len(routes)
+    capacity = [vehicle_capacities[k] if k < len(vehicle_capacities) else max(vehicle_capacities)
+                for k in range(m)]
+
+    def duration(route: List[int]) -> float:
+        return route_duration(route, d, service_times, tc)
+
+    def feasible(route: List[int], k: int) -> bool:
+        return tc is None or len(route) <= 2 or tc.feasible(route, k)
+
+    durations = np.array([duration(route) for route in routes])
+    costs = np.array([route_cost(route, d) for route in routes])
+    loads = [route_load(route, demands) for route in routes]
+    current = travel_weight * costs.sum() + makespan_weight * durations.max()
+
+    for _ in range(max_moves):
+        a = int(np.argmax(durations))
+        source = routes[a]
+        best_score, best_move = current - 1e-9, None
+        for p in range(1, len(source) - 1):
+            client, prev, nxt = source[p], source[p - 1], source[p + 1]
+            removal = d[prev, nxt] - d[prev, client] - d[client, nxt]
+            shorter = source[:p] + source[p + 1:]
+            if tc is None:
+                short_time = durations[a] + removal - s[client]
+            elif feasible(shorter, a):
+                short_time = duration(shorter)
+            else:
+                continue
+            for k in range(m):
+                if k == a:
+                    continue
+                route = np.asarray(routes[k])
+                others = np.delete(durations, [a, k]).max(initial=0.0)
+
+                # Relocate the client into route k, every position at once
+                if loads[k] + demands[client] <= capacity[k] + 1e-9:
+                    delta = d[route[:-1], client] + d[client, route[1:]] - d[route[:-1], route[1:]]
+                    if tc is None:
+                        times = durations[k] + delta + s[client]
+                    else:
+                        times = np.full(len(delta), np.inf)
+                        for q in np.argsort(delta, kind="stable"):
+                            longer = routes[k][:q + 1] + [client] + routes[k][q + 1:]
+                            if feasible(longer, k):
+                                times[q] = duration(longer)
+                    scores = travel_weight * (costs.sum() + removal + delta) + makespan_weight * \
+                        np.maximum(np.maximum(times, short_time), others)
+                    q = int(np.argmin(scores))
+                    if scores[q] < best_score:
+                        best_score, best_move = scores[q], ("relocate", a, p, k, q + 1)
+
+                # Swap it with every client of route k
+                if len(route) <= 2:
+                    continue
+                inner, before, after = route[1:-1], route[:-2], route[2:]
+                delta_k = d[before, client] + d[client, after] - d[before, inner] - d[inner, after]
+                delta_a = d[prev, inner] + d[inner, nxt] - d[prev, client] - d[client, nxt]
+                fits = (loads[a] - demands[client] + np.asarray(demands)[inner] <= capacity[a] + 1e-9) & \
+                    (loads[k] - np.asarray(demands)[inner] + demands[client] <= capacity[k] + 1e-9)
+                if tc is None:
+                    times_a = durations[a] + delta_a + s[inner] - s[client]
+                    times_k = durations[k] + delta_k + s[client] - s[inner]
+                else:
+                    times_a = np.full(len(inner), np.inf)
+                    times_k = np.full(len(inner), np.inf)
+                    for q in np.flatnonzero(fits):
+                        first = source[:p] + [int(inner[q])] + source[p + 1:]
+                        second = routes[k][:q + 1] + [client] + routes[k][q + 2:]
+                        if feasible(first, a) and feasible(second, k):
+                            times_a[q], times_k[q] = duration(first), duration(second)
+                scores = travel_weight * (costs.sum() + delta_a + delta_k) + makespan_weight * \
+                    np.maximum(np.maximum(times_a, times_k), others)
+                scores[~fits] = np.inf
+                q = int(np.argmin(scores))
+                if scores[q] < best_score:
+                    best_score, best_move = scores[q], ("swap", a, p, k, q + 1)
+        if best_move is None:
+            break
+        kind, a, p, k, q = best_move
+        client = routes[a][p]
+        if kind == "relocate":
+            routes[a] = routes[a][:p] + routes[a][p + 1:]
+            routes[k] = routes[k][:q] + [client] + routes[k][q:]
+        else:
+            routes[a][p], routes[k][q] = routes[k][q], client
+        for r in (a, k):
+            durations[r], costs[r] = duration(routes[r]), route_cost(routes[r], d)
+            loads[r] = route_load(routes[r], demands)
+        current = travel_weight * costs.sum() + makespan_weight * durations.max()
+    return routes
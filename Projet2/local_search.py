@@ -0,0 +1,348 @@
+import time
+import numpy as np
+from collections import deque
+from typing import List, Optional
+
+from heuristics import TimeConstraints
+
+
+def nearest_neighbors(distances: np.ndarray, k: int, chunk_size: int = 1024) -> np.ndarray:
+    """
+    K nearest clients of every node (depot excluded from the lists)
+
+    Rows are processed in chunks so that large matrices are never copied whole.
+    Row 0 holds the clients nearest to the depot.
+    """
+    n = len(distances)
+    k = max(0, min(k, n - 2))
+    neighbors = np.zeros((n, k), dtype=np.int64)
+    if k == 0:
+        return neighbors
+
+    for start in range(0, n, chunk_size):
+        stop = min(n, start + chunk_size)
+        block = np.array(distances[start:stop, 1:], dtype=float)
+        rows = np.arange(start, stop)
+        clients = rows >= 1
+        block[clients, rows[clients] - 1] = np.inf  # a node is not its own neighbour
+        part = np.argpartition(block, k - 1, axis=1)[:, :k]
+        order = np.argsort(np.take_along_axis(block, part, axis=1), axis=1)
+        neighbors[start:stop] = np.take_along_axis(part, order, axis=1) + 1
+
+    return neighbors
+
+
+class LocalSearch:
+    """
+    Granular local search for VRP routes
+
+    Moves are only evaluated when they create an arc (u, v) with v among the
+    K nearest neighbours of u. Every move delta is computed in O(1) from the
+    distance matrix, and loads are checked in O(1) through cumulative load
+    arrays. Neighbourhoods:
+        - or-opt: move a segment of 1..max_segment clients (relocate = 1)
+        - swap: exchange two clients
+        - 2-opt: reverse a route section (symmetric matrices only)
+        - 2-opt*: exchange the tails of two routes
+        - cross-exchange: exchange two segments between routes
+    Routes are never emptied, so route k stays assigned to vehicle k. With
+    time constraints, the routes changed by an improving move are re-scheduled
+    before the move is applied, starting from the cached service start time
+    of the last unchanged stop and stopping once the unchanged tail is
+    reached no later than before (valid for time-dependent travel times too,
+    by FIFO).
+    """
+
+    EPS = 1e-9
+
+    def __init__(self,
+                 distances: np.ndarray,
+                 demands: Optional[List[float]] = None,
+                 vehicle_capacities: Optional[List[float]] = None,
+                 n_neighbors: int = 10,
+                 max_segment: int = 3,
+                 time_limit: Optional[float] = None,
+                 time_constraints: Optional[TimeConstraints] = None):
+        self.distances = np.asarray(distances, dtype=float)
+        n = len(self.distances)
+        self.demands = list(demands) if demands is not None else [0] * n
+        self.vehicle_capacities = vehicle_capacities
+        self.max_segment = max_segment
+        self.time_limit = time_limit
+        self.time_constraints = time_constraints
+        self.symmetric = bool(np.allclose(self.distances, self.distances.T))
+        self.neighbors = nearest_neighbors(self.distances, n_neighbors).tolist()
+        self.moves = 0
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def improve(self, routes: List[List[int]]) -> List[List[int]]:
+        """Apply improving moves until a local optimum (or the time limit)"""
+        start = time.time()
+        n = len(self.distances)
+        self.routes = [list(route) for route in routes]
+        if self.vehicle_capacities is None:
+            self.capacity = [float("inf")] * len(self.routes)
+        else:
+            spare = max(self.vehicle_capacities) if self.vehicle_capacities else float("inf")
+            self.capacity = [self.vehicle_capacities[k] if k < len(self.vehicle_capacities) else spare
+                             for k in range(len(self.routes))]
+
+        self.route_of = [-1] * n
+        self.pos = [0] * n
+        self.cum_load = [0.0] * n
+        self.load = [0.0] * len(self.routes)
+        self.starts = [None] * len(self.routes)  # Service start times, with time constraints
+        self.time_feasible = [True] * len(self.routes)
+        for r in range(len(self.routes)):
+            self._refresh(r)
+
+        self.moves = 0
+        self._queue = deque(node for route in self.routes for node in route if node != 0)
+        self._queued = [False] * n
+        for node in self._queue:
+            self._queued[node] = True
+
+        while self._queue:
+            if self.time_limit is not None and time.time() - start > self.time_limit:
+                break
+            u = self._queue.popleft()
+            self._queued[u] = False
+            if self.route_of[u] >= 0:
+                self._improve_node(u)
+
+        return self.routes
+
+    # ------------------------------------------------------------------
+    # Bookkeeping
+    # ------------------------------------------------------------------
+
+    def _refresh(self, r: int):
+        """Recompute positions and cumulative loads of route r"""
+        route = self.routes[r]
+        load = 0.0
+        for p, node in enumerate(route):
+            if node != 0:
+                load += self.demands[node]
+                self.route_of[node] = r
+                self.pos[node] = p
+                self.cum_load[node] = load
+        self.load[r] = load
+        tc = self.time_constraints
+        if tc is not None:
+            self.starts[r] = starts = tc.starts(route)
+            self.time_feasible[r] = starts[-1] <= tc.return_limit(r) + tc.EPS and \
+                all(start <= tc.latest[node] + tc.EPS for start, node in zip(starts, route))
+
+    def _cum_at(self, r: int, p: int) -> float:
+        """Load served from the start of route r up to position p (inclusive)"""
+        node = self.routes[r][p]
+        if node != 0:
+            return self.cum_load[node]
+        return 0.0 if p == 0 else self.load[r]
+
+    def _activate(self, nodes):
+        """Put the endpoints of modified arcs back in the work queue"""
+        for node in nodes:
+            if node != 0 and not self._queued[node]:
+                self._queued[node] = True
+                self._queue.append(node)
+
+    def _commit(self, changed: dict, touched) -> bool:
+        """Install new route lists and requeue the touched nodes"""
+        if self.time_constraints is not None:
+            for r, route in changed.items():
+                if not self._time_feasible(r, route):
+                    return False
+        for r, route in changed.items():
+            self.routes[r] = route
+            self._refresh(r)
+        self._activate(touched)
+        self.moves += 1
+        return True
+
+    def _time_feasible(self, r: int, route: List[int]) -> bool:
+        """Schedule a candidate route of vehicle r from its first changed stop"""
+        old = self.routes[r]
+        shortest = min(len(old), len(route))
+        p = 1
+        while p < shortest and old[p] == route[p]:
+            p += 1
+        suffix = 0
+        if self.time_feasible[r]:
+            while suffix < shortest - p and old[-1 - suffix] == route[-1 - suffix]:
+                suffix += 1
+        return self.time_constraints.feasible_from(route, p - 1, self.starts[r][p - 1], r,
+                                                   self.starts[r], suffix)
+
+    def _feasible(self, r: int, load: float) -> bool:
+        """Capacity check of a candidate load for route r"""
+        return load <= self.capacity[r] + self.EPS
+
+    # ------------------------------------------------------------------
+    # Moves
+    # ------------------------------------------------------------------
+
+    def _improve_node(self, u: int) -> bool:
+        for v in self.neighbors[u]:
+            if self.route_of[v] < 0 or self.route_of[u] < 0:
+                continue
+            if (self._or_opt(u, v) or self._swap(u, v) or self._two_opt(u, v)
+                    or self._cross_exchange(u, v)):
+                return True
+        return False
+
+    def _or_opt(self, u: int, v: int) -> bool:
+        """Move the segment starting at u right after v (creates arc v -> u)"""
+        d = self.distances
+        ru, rv = self.route_of[u], self.route_of[v]
+        A, B = self.routes[ru], self.routes[rv]
+        pu, q = self.pos[u], self.pos[v]
+
+        for length in range(1, self.max_segment + 1):
+            pe = pu + length - 1
+            if pe > len(A) - 2:
+                break
+            if ru == rv and pu - 1 <= q <= pe:
+                break  # v inside the segment or already in front of it
+            if ru != rv and len(A) - 2 == length:
+                break  # would empty route ru
+
+            first, last = A[pu], A[pe]
+            prev_node, next_node = A[pu - 1], A[pe + 1]
+            a, b = B[q], B[q + 1]
+            removal = d[prev_node, next_node] - d[prev_node, first] - d[last, next_node]
+            delta = removal + d[a, first] + d[last, b] - d[a, b]
+            reverse = False
+            if self.symmetric and length > 1:
+                delta_rev = removal + d[a, last] + d[first, b] - d[a, b]
+                if delta_rev < delta:
+                    delta, reverse = delta_rev, True
+            if delta >= -self.EPS:
+                continue
+
+            segment = A[pu:pe + 1]
+            if reverse:
+                segment.reverse()
+            if ru != rv:
+                seg_load = self.cum_load[last] - self._cum_at(ru, pu - 1)
+                if not self._feasible(rv, self.load[rv] + seg_load):
+                    continue
+                changed = {ru: A[:pu] + A[pe + 1:], rv: B[:q + 1] + segment + B[q + 1:]}
+            else:
+                rest = A[:pu] + A[pe + 1:]
+                insert_at = q + 1 if q < pu else q + 1 - length
+                changed = {ru: rest[:insert_at] + segment + rest[insert_at:]}
+            if self._commit(changed, (prev_node, next_node, a, b, first, last)):
+                return True
+
+        return False
+
+    def _swap(self, u: int, v: int) -> bool:
+        """Exchange v with the successor of u (creates arc u -> v)"""
+        d = self.distances
+        ru, rv = self.route_of[u], self.route_of[v]
+        A, B = self.routes[ru], self.routes[rv]
+        pa, pv = self.pos[u] + 1, self.pos[v]
+        a = A[pa]
+        if a == 0 or a == v:
+            return False
+        if ru == rv and abs(pa - pv) <= 1:
+            return False
+
+        a_prev, a_next = A[pa - 1], A[pa + 1]
+        v_prev, v_next = B[pv - 1], B[pv + 1]
+        delta = (d[a_prev, v] + d[v, a_next] - d[a_prev, a] - d[a, a_next]
+                 + d[v_prev, a] + d[a, v_next] - d[v_prev, v] - d[v, v_next])
+        if delta >= -self.EPS:
+            return False
+
+        if ru != rv:
+            shift = self.demands[v] - self.demands[a]
+            if not (self._feasible(ru, self.load[ru] + shift) and
+                    self._feasible(rv, self.load[rv] - shift)):
+                return False
+            new_a, new_b = list(A), list(B)
+            new_a[pa], new_b[pv] = v, a
+            return self._commit({ru: new_a, rv: new_b}, (a_prev, a_next, v_prev, v_next, a, v))
+
+        new_a = list(A)
+        new_a[pa], new_a[pv] = v, a
+        return self._commit({ru: new_a}, (a_prev, a_next, v_prev, v_next, a, v))
+
+    def _two_opt(self, u: int, v: int) -> bool:
+        """2-opt inside a route or 2-opt* between routes (creates arc u -> v)"""
+        d = self.distances
+        ru, rv = self.route_of[u], self.route_of[v]
+        A, B = self.routes[ru], self.routes[rv]
+        pu, pv = self.pos[u], self.pos[v]
+
+        if ru == rv:
+            if not self.symmetric:
+                return False
+            i, j = min(pu, pv), max(pu, pv)
+            if j - i < 2:
+                return False
+            x, y = A[i], A[j]
+            x_next, y_next = A[i + 1], A[j + 1]
+            delta = d[x, y] + d[x_next, y_next] - d[x, x_next] - d[y, y_next]
+            if delta >= -self.EPS:
+                return False
+            new_a = A[:i + 1] + A[i + 1:j + 1][::-1] + A[j + 1:]
+            return self._commit({ru: new_a}, (x, y, x_next, y_next))
+
+        # 2-opt*: A[..u] + B[v..] and B[..prev(v)] + A[next(u)..]
+        u_next, v_prev = A[pu + 1], B[pv - 1]
+        delta = d[u, v] + d[v_prev, u_next] - d[u, u_next] - d[v_prev, v]
+        if delta >= -self.EPS:
+            return False
+        new_a = A[:pu + 1] + B[pv:]
+        new_b = B[:pv] + A[pu + 1:]
+        if len(new_a) <= 2 or len(new_b) <= 2:
+            return False
+        load_a = self.cum_load[u] + self.load[rv] - self._cum_at(rv, pv - 1)
+        load_b = self._cum_at(rv, pv - 1) + self.load[ru] - self.cum_load[u]
+        if not (self._feasible(ru, load_a) and self._feasible(rv, load_b)):
+            return False
+        return self._commit({ru: new_a, rv: new_b}, (u, v, u_next, v_prev))
+
+    def _cross_exchange(self, u: int, v: int) -> bool:
+        """Exchange the segment after u with the segment starting at v"""
+        d = self.distances
+        ru, rv = self.route_of[u], self.route_of[v]
+        if ru == rv:
+            return False
+        A, B = self.routes[ru], self.routes[rv]
+        pu, pv = self.pos[u], self.pos[v]
+        v_prev = B[pv - 1]
+
+        for l1 in range(1, self.max_segment + 1):
+            e1 = pu + l1
+            if e1 > len(A) - 2:
+                break
+            f1, last1, after1 = A[pu + 1], A[e1], A[e1 + 1]
+            load1 = self.cum_load[last1] - self._cum_at(ru, pu)
+            for l2 in range(1, self.max_segment + 1):
+                if l1 == 1 and l2 == 1:
+                    continue  # plain swap
+                e2 = pv + l2 - 1
+                if e2 > len(B) - 2:
+                    break
+                last2, after2 = B[e2], B[e2 + 1]
+                delta = (d[u, v] + d[last2, after1] + d[v_prev, f1] + d[last1, after2]
+                         - d[u, f1] - d[last1, after1] - d[v_prev, v] - d[last2, after2])
+                if delta >= -self.EPS:
+                    continue
+                load2 = self.cum_load[last2] - self._cum_at(rv, pv - 1)
+                if not (self._feasible(ru, self.load[ru] - load1 + load2) and
+                        self._feasible(rv, self.load[rv] - load2 + load1)):
+                    continue
+                new_a = A[:pu + 1] + B[pv:e2 + 1] + A[e1 + 1:]
+                new_b = B[:pv] + A[pu + 1:e1 + 1] + B[e2 + 1:]
+                if self._commit({ru: new_a, rv: new_b},
+                                (u, v, f1, last1, after1, v_prev, last2, after2)):
+                    return True
+
+        return False
@@ -0,0 +1,296 @@
+import math
+import os
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple, Type
+
+from solver import PersonnelRoutingSolver, Solution
+from heuristics import objective_weights, route_load
+
+
+def assign_to_depots(travel_times: np.ndarray, depots: List[int], capacities: List[float],
+                     weights: List[float]) -> List[List[int]]:
+    """
+    Nearest-depot assignment
+
+    Clients are taken by decreasing regret (round trip to the second best
+    depot minus round trip to the best one) and assigned to the nearest
+    depot with remaining capacity, or to the nearest depot if none has any.
+
+    Returns:
+        The clients of every depot, in the order of depots
+    """
+    tau = np.asarray(travel_times, dtype=float)
+    depot_set = set(depots)
+    clients = np.array([i for i in range(len(tau)) if i not in depot_set], dtype=int)
+    groups = [[] for _ in depots]
+    if len(clients) == 0:
+        return groups
+    open_depots = [d for d, capacity in enumerate(capacities) if capacity > 0]
+    rows = np.asarray(depots)[open_depots]
+    cost = tau[rows][:, clients] + tau[clients][:, rows].T  # depots x clients
+    ranked = np.sort(cost, axis=0)
+    regret = ranked[1] - ranked[0] if len(open_depots) > 1 else ranked[0]
+
+    loads = [0.0] * len(depots)
+    for idx in np.argsort(-regret, kind="stable"):
+        client = int(clients[idx])
+        for r in np.argsort(cost[:, idx], kind="stable"):
+            if loads[open_depots[r]] + weights[client] <= capacities[open_depots[r]]:
+                break
+        else:
+            r = int(np.argmin(cost[:, idx]))  # nothing fits: nearest depot
+        groups[open_depots[r]].append(client)
+        loads[open_depots[r]] += weights[client]
+    return [sorted(group) for group in groups]
+
+
+def _solve_depot(args) -> Tuple[List[List[int]], Optional[Solution]]:
+    """
+    Route the clients of one depot with its own reps, route k = rep k of the
+    depot's fleet (runs in a worker process)
+
+    If the engine finds no routes (e.g. an infeasible MIP), the depot is
+    routed by the savings heuristic, whose routes may break a limit but
+    visit every client of the depot.
+    """
+    nodes, engine, options, time_limit, problem = args
+    n_vehicles = problem["n_vehicles"]
+    routes = [[nodes[0], nodes[0]] for _ in range(n_vehicles)]
+    if len(nodes) <= 1:
+        return routes, None
+    solver = engine(time_limit=time_limit)
+    for name, value in options.items():
+        setattr(solver, name, value)
+    solution = solver.solve_vrp(**problem)
+    if not solution.routes and not solution.dropped:
+        print(f"Warning: no route found for depot {nodes[0]} ({solution.status}), "
+              f"using the heuristic routes")
+        fallback = {key: value for key, value in problem.items() if key != "locations"}
+        solution = PersonnelRoutingSolver(time_limit=time_limit, fast_mode=True).solve_vrp(**fallback)
+    for k, route in zip(solution.vehicles or range(len(solution.routes)), solution.routes):
+        if k < len(routes):
+            routes[k] = [nodes[i] for i in route]
+        else:
+            routes.append([nodes[i] for i in route])  # Surplus route of an infeasible depot
+    return routes, solution
+
+
+class MultiDepotSolver(PersonnelRoutingSolver):
+    """
+    Multi-depot routing by depot decomposition
+
+    Every rep has a home depot (a branch office). Clients are assigned to
+    the nearest depot that still has rep capacity, each depot is routed as
+    a single-depot problem by the chosen engine in a process pool, and a
+    final pass relocates clients between routes of different depots while
+    that lowers the total travel time. With open routes the reps go home
+    after their last client: the return legs cost nothing.
+    """
+
+    def __init__(self, time_limit: int = 30, mip_gap: float = 0.01,
+                 engine: Type[PersonnelRoutingSolver] = PersonnelRoutingSolver,
+                 engine_options: Optional[Dict] = None,
+                 max_workers: Optional[int] = None):
+        super().__init__(time_limit=time_limit, mip_gap=mip_gap)
+        self.engine = engine  # Solver class of the depot subproblems
+        self.engine_options = engine_options or {}  # Attributes set on every subproblem solver
+        self.max_workers = max_workers  # None: one worker per CPU
+
+    def solve_vrp(self,
+                  distances: np.ndarray,
+                  n_vehicles: int = 1,
+                  vehicle_capacities: List[int] = None,
+                  demands: List[int] = None,
+                  service_times: Optional[List[float]] = None,
+                  time_windows: Optional[List[Optional[Tuple[float, float]]]] = None,
+                  max_shift_duration=None,
+                  travel_times: Optional[np.ndarray] = None,
+                  prizes: Optional[List[float]] = None,
+                  objective: str = "total",
+                  makespan_weight: float = 1.0,
+                  depots: Optional[List[int]] = None,
+                  vehicle_depots: Optional[List[int]] = None,
+                  open_routes: bool = False,
+                  locations: Optional[List[Tuple[float, float]]] = None,
+                  travel_profile=None,
+                  **kwargs) -> Solution:
+        """
+        Solve the multi-depot VRP
+
+        Accepts the same arguments as PersonnelRoutingSolver.solve_vrp plus:
+
+        Args:
+            depots: location indices of the depots (default [0]); depots
+                have no demand or service time, and share the working day
+                of the time window of location 0
+            vehicle_depots: home depot (location index) of every vehicle,
+                default the first depot
+            open_routes: routes end at the rep's home after the last client,
+                without a return leg to the depot
+            locations: (x, y) of every location, forwarded to engines that
+                cluster on coordinates
+            travel_profile: time-dependent travel times, each depot gets the
+                profile of its locations (see PersonnelRoutingSolver.solve_vrp)
+
+        Returns:
+            Solution whose route k starts at the home depot of vehicle k
+        """
+        start_time = time.time()
+        self._start_progress()
+        self.model = None
+        n = len(distances)
+        depots = list(depots) if depots is not None else [0]
+        if vehicle_depots is None:
+            vehicle_depots = [depots[0]] * n_vehicles
+        if any(depot not in depots for depot in vehicle_depots):
+            raise ValueError("Every vehicle depot must be one of the depots")
+        if service_times is None:
+            service_times = [0] * n
+        if demands is None:
+            demands = [0] * n
+        if vehicle_capacities is None:
+            vehicle_capacities = [1000] * n_vehicles
+
+        distances = np.array(distances, dtype=float)
+        if travel_times is None and travel_profile is not None:
+            travel_times = travel_profile.mean_times()
+        travel_times = self._travel_times(distances, travel_times).copy()
+        if open_routes:
+            # Going home from the last client is not part of the route
+            distances[:, depots] = 0.0
+            travel_times[:, depots] = 0.0
+            if travel_profile is not None:
+                travel_profile = travel_profile.subset(range(n))  # A copy
+                travel_profile.tensor[:, :, depots] = 0.0
+        time_constraints = self._make_time_constraints(
+            distances, service_times, n_vehicles, time_windows, max_shift_duration, travel_times,
+            travel_profile)
+        shifts = time_constraints.shift_limits if time_constraints and time_constraints.shift_limits \
+            else None
+
+        # 1. Clients to depots, by rep capacity
+        has_demand = any(demands[i] > 0 for i in range(n) if i not in depots)
+        weights = demands if has_demand else [0 if i in depots else 1 for i in range(n)]
+        fleets = [[k for k in range(n_vehicles) if vehicle_depots[k] == depot] for depot in depots]
+        capacities = [sum(vehicle_capacities[k] for k in fleet) if has_demand else
+                      (float("inf") if fleet else 0.0) for fleet in fleets]
+        groups = assign_to_depots(travel_times, depots, capacities, weights)
+
+        # 2. One single-depot problem per depot with reps, solved in parallel,
+        # keeping part of the budget for the final pass; depots beyond the
+        # number of workers run in waves
+        workers = self.max_workers or os.cpu_count() or 1
+        waves = math.ceil(sum(1 for fleet in fleets if fleet) / workers)
+        sub_time = max(1, int(0.8 * self.time_limit / max(1, waves)))
+        jobs = []
+        for depot, fleet, group in zip(depots, fleets, groups):
+            if not fleet:
+                continue
+            nodes = [depot] + group
+            sub = np.ix_(nodes, nodes)
+            problem = {
+                "distances": distances[sub], "travel_times": travel_times[sub],
+                "n_vehicles": len(fleet), "vehicle_capacities": [vehicle_capacities[k] for k in fleet],
+                "demands": [0] + [demands[i] for i in group],
+                "service_times": [0] + [service_times[i] for i in group],
+                "time_windows": [time_windows[0]] + [time_windows[i] for i in group]
+                if time_windows else None,
+                "max_shift_duration": [shifts[k] for k in fleet] if shifts else None,
+                "prizes": [0.0] + [prizes[i] for i in group] if prizes is not None else None,
+                "objective": objective, "makespan_weight": makespan_weight,
+            }
+            if locations is not None:
+                problem["locations"] = [locations[i] for i in nodes]
+            if travel_profile is not None:
+                problem["travel_profile"] = travel_profile.subset(nodes)
+            jobs.append((nodes, self.engine, self.engine_options, sub_time, problem))
+        with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+            results = list(pool.map(_solve_depot, jobs))
+
+        routes = [[vehicle_depots[k], vehicle_depots[k]] for k in range(n_vehicles)]
+        fleets = [fleet for fleet in fleets if fleet]
+        surplus = []  # Routes beyond a depot's fleet (infeasible depot), kept after the reps
+        for fleet, (sub_routes, _) in zip(fleets, results):
+            for k, route in zip(fleet, sub_routes):
+                routes[k] = route
+            surplus += sub_routes[len(fleet):]
+        routes += surplus
+        route_depots = list(vehicle_depots) + [route[0] for route in surplus]
+        route_capacities = list(vehicle_capacities[:n_vehicles]) + [max(vehicle_capacities)] * len(surplus)
+        sub_solutions = [solution for _, solution in results if solution is not None]
+        self._report_incumbent(routes, self._weighted_objective(
+            routes, travel_times, service_times, objective_weights(objective, makespan_weight),
+            time_constraints, prizes))
+
+        # 3. Clients near a depot border may be cheaper to serve from the other side
+        moves = 0
+        if objective == "total":
+            remaining = max(1.0, self.time_limit - (time.time() - start_time))
+            routes, moves = self._relocate_between_depots(
+                routes, route_depots, travel_times, demands, route_capacities,
+                time_constraints, time.time() + remaining)
+
+        # Clients left out of every route (not dropped for their prize)
+        visited = {node for route in routes for node in route}
+        unrouted = [i for i in range(n) if i not in visited and i not in depots] if prizes is None else []
+        status = "Multi-depot"
+        if unrouted or any("infeasible" in str(solution.status).lower() for solution in sub_solutions):
+            status = "Multi-depot (infeasible)"
+        self.solution = self._build_solution(
+            routes, distances, service_times, status,
+            start_time, node_count=sum(solution.node_count for solution in sub_solutions),
+            gap=max((solution.gap for solution in sub_solutions), default=0.0),
+            time_constraints=time_constraints, travel_times=travel_times, prizes=prizes)
+        if self.solution.dropped is not None:
+            self.solution.dropped = [i for i in self.solution.dropped if i not in depots]
+        self.solution.open_routes = open_routes
+        self.solution.stats = {
+            "depot_clients": {depot: len(group) for depot, group in zip(depots, groups)},
+            "depot_status": [str(solution.status) for solution in sub_solutions],
+            "relocations": moves,
+            "unrouted": unrouted,
+        }
+        return self.solution
+
+    @staticmethod
+    def _relocate_between_depots(routes: List[List[int]], vehicle_depots: List[int],
+                                 travel_times: np.ndarray, demands: List[int],
+                                 vehicle_capacities: List[int], time_constraints,
+                                 deadline: float) -> Tuple[List[List[int]], int]:
+        """First-improvement relocation of clients to routes of another depot"""
+        d = travel_times
+        routes = [list(route) for route in routes]
+        moves, improved = 0, True
+        while improved and time.time() < deadline:
+            improved = False
+            for a, source in enumerate(routes):
+                p = 1
+                while p < len(routes[a]) - 1:
+                    source = routes[a]
+                    client, prev, nxt = source[p], source[p - 1], source[p + 1]
+                    gain = d[prev, client] + d[client, nxt] - d[prev, nxt]
+                    best = None
+                    for b, target in enumerate(routes):
+                        if vehicle_depots[b] == vehicle_depots[a] or \
+                                route_load(target, demands) + demands[client] > vehicle_capacities[b]:
+                            continue
+                        arr = np.asarray(target)
+                        costs = d[arr[:-1], client] + d[client, arr[1:]] - d[arr[:-1], arr[1:]]
+                        for q in np.argsort(costs, kind="stable"):
+                            if costs[q] >= gain - 1e-9 or (best is not None and costs[q] >= best[0]):
+                                break
+                            candidate = target[:q + 1] + [client] + target[q + 1:]
+                            if time_constraints is None or time_constraints.feasible(candidate, b):
+                                best = (costs[q], b, candidate)
+                                break
+                    if best is None:
+                        p += 1
+                        continue
+                    _, b, candidate = best
+                    routes[b] = candidate
+                    routes[a] = source[:p] + source[p + 1:]
+                    moves += 1
+                    improved = True
+        return routes, moves
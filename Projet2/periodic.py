@@ -0,0 +1,414 @@
+import math
+import os
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple, Type
+
+from solver import PersonnelRoutingSolver, Solution
+from heuristics import route_load
+
+# Visit period in working days by client priority (1 = weekly, 2 = every two
+# weeks, 3 = every four weeks)
+PRIORITY_PERIODS = {1: 5, 2: 10, 3: 20}
+
+
+def visit_frequencies(priorities: List[int], horizon_days: int,
+                      periods_by_priority: Optional[dict] = None) -> List[int]:
+    """Visits of every location over the horizon, at least one per client (none for the depot)"""
+    table = PRIORITY_PERIODS if periods_by_priority is None else periods_by_priority
+    return [0] + [max(1, math.ceil(horizon_days / table[p])) for p in priorities[1:]]
+
+
+def visit_patterns(frequency: int, horizon_days: int) -> List[Tuple[int, ...]]:
+    """Evenly spaced visit days for a frequency, one pattern per possible first day"""
+    if frequency <= 0:
+        return [()]
+    if frequency >= horizon_days:
+        return [tuple(range(horizon_days))]
+    spacing = horizon_days // frequency
+    return [tuple(first + j * spacing for j in range(frequency)) for first in range(spacing)]
+
+
+@dataclass
+class PeriodicPlan:
+    """Container for a multi-day plan"""
+    days: List[Solution]  # Routing solution of every day of the horizon
+    visit_days: Dict[int, Tuple[int, ...]]  # Days on which every client is visited
+    status: str
+    solve_time: float
+    stats: Dict = None
+
+    @property
+    def total_distance(self) -> float:
+        return sum(day.total_distance for day in self.days)
+
+    @property
+    def travel_time(self) -> float:
+        return sum(day.travel_time for day in self.days)
+
+    @property
+    def total_time(self) -> float:
+        return sum(day.total_time for day in self.days)
+
+
+def _solve_day(args) -> List[List[int]]:
+    """
+    Route the clients of one day, route k = rep k (runs in a worker process)
+
+    If the engine finds no routes (e.g. an infeasible MIP), the day is
+    routed by the savings heuristic, whose routes may break a limit but
+    visit every client of the day.
+    """
+    nodes, engine, options, time_limit, problem = args
+    routes = [[0, 0] for _ in range(problem["n_vehicles"])]
+    if len(nodes) <= 1:
+        return routes
+    solver = engine(time_limit=time_limit)
+    for name, value in options.items():
+        setattr(solver, name, value)
+    solution = solver.solve_vrp(**problem)
+    if not solution.routes:
+        print(f"Warning: no route found for a day of {len(nodes) - 1} clients ({solution.status}), "
+              f"using the heuristic routes")
+        solution = PersonnelRoutingSolver(time_limit=time_limit, fast_mode=True).solve_vrp(**problem)
+    for k, route in zip(solution.vehicles or range(len(solution.routes)), solution.routes):
+        if k < len(routes):
+            routes[k] = [nodes[i] for i in route]
+        else:
+            routes.append([nodes[i] for i in route])  # Surplus route of an infeasible day
+    return routes
+
+
+class PeriodicSolver(PersonnelRoutingSolver):
+    """
+    Periodic multi-day planning
+
+    Every client needs a number of visits over the horizon, on evenly spaced
+    days (a visit pattern). Patterns are chosen first, so that every day
+    gets a compact set of clients and a balanced workload; every day is then
+    routed by the chosen engine in a process pool. Finally clients switch to
+    another pattern when the routes of its days can absorb them for less
+    than they cost on their current days, and the changed days are routed
+    again.
+    """
+
+    def __init__(self, time_limit: int = 60, mip_gap: float = 0.01,
+                 engine: Type[PersonnelRoutingSolver] = PersonnelRoutingSolver,
+                 engine_options: Optional[Dict] = None,
+                 max_workers: Optional[int] = None,
+                 balance_penalty: float = 2.0,
+                 max_rounds: int = 3):
+        super().__init__(time_limit=time_limit, mip_gap=mip_gap)
+        self.engine = engine  # Solver class of the daily routing problems
+        self.engine_options = engine_options or {}  # Attributes set on every daily solver
+        self.max_workers = max_workers  # None: one worker per CPU
+        self.balance_penalty = balance_penalty  # Cost per minute of workload above the daily average
+        self.max_rounds = max_rounds  # Pattern improvement + re-routing rounds
+
+    def solve_periodic(self,
+                       distances: np.ndarray,
+                       frequencies: List[int],
+                       horizon_days: int = 5,
+                       n_vehicles: int = 1,
+                       vehicle_capacities: List[int] = None,
+                       demands: List[int] = None,
+                       service_times: Optional[List[float]] = None,
+                       time_windows: Optional[List[Optional[Tuple[float, float]]]] = None,
+                       max_shift_duration=None,
+                       travel_times: Optional[np.ndarray] = None,
+                       objective: str = "total",
+                       makespan_weight: float = 1.0) -> PeriodicPlan:
+        """
+        Plan visit days and daily routes over a horizon
+
+        Args:
+            distances: n x n distance matrix (in km)
+            frequencies: visits of every location over the horizon (see
+                visit_frequencies), 0 for the depot
+            horizon_days: number of working days planned
+            n_vehicles, vehicle_capacities, demands, service_times,
+            time_windows, max_shift_duration, travel_times, objective,
+            makespan_weight: daily problem, as in
+                PersonnelRoutingSolver.solve_vrp (the same every day)
+
+        Returns:
+            PeriodicPlan with one Solution per day
+        """
+        start_time = time.time()
+        self._start_progress()
+        self.model = None
+        n = len(distances)
+        if service_times is None:
+            service_times = [0] * n
+        if demands is None:
+            demands = [0] * n
+        if vehicle_capacities is None:
+            vehicle_capacities = [1000] * n_vehicles
+        distances = np.asarray(distances, dtype=float)
+        travel_times = self._travel_times(distances, travel_times)
+        time_constraints = self._make_time_constraints(
+            distances, service_times, n_vehicles, time_windows, max_shift_duration, travel_times)
+        daily = {"n_vehicles": n_vehicles, "vehicle_capacities": vehicle_capacities,
+                 "demands": demands, "service_times": service_times, "time_windows": time_windows,
+                 "max_shift_duration": max_shift_duration, "objective": objective,
+                 "makespan_weight": makespan_weight}
+
+        # 1. Visit patterns
+        patterns = self.assign_patterns(travel_times, frequencies, horizon_days, service_times,
+                                        demands, sum(vehicle_capacities[:n_vehicles]))
+
+        # 2. Daily routing in parallel
+        budget = start_time + self.time_limit
+        day_clients = self._day_clients(patterns, horizon_days)
+        routes = self._route_days(range(horizon_days), day_clients, distances, travel_times, daily,
+                                  max(1, int(0.6 * self.time_limit)))
+
+        # 3. Pattern changes priced on the actual routes, then re-routing
+        moves = rounds = 0
+        while rounds < self.max_rounds and time.time() < budget - 1:
+            rounds += 1
+            changed, count = self._improve_patterns(patterns, routes, frequencies, horizon_days,
+                                                    travel_times, service_times, demands,
+                                                    vehicle_capacities, time_constraints,
+                                                    self.balance_penalty)
+            moves += count
+            if not changed:
+                break
+            day_clients = self._day_clients(patterns, horizon_days)
+            remaining = max(1, int((budget - time.time()) / 2))
+            rerouted = self._route_days(sorted(changed), day_clients, distances, travel_times, daily,
+                                        remaining)
+            for t, day_routes in zip(sorted(changed), rerouted):
+                # Keep the repaired routes if the re-solve does not beat them
+                if self._weighted_travel(day_routes, travel_times) < \
+                        self._weighted_travel(routes[t], travel_times) - 1e-9:
+                    routes[t] = day_routes
+
+        # A day is infeasible if its routes break a limit or miss one of its clients
+        day_clients = self._day_clients(patterns, horizon_days)
+        days, missed = [], {}
+        for t, day_routes in enumerate(routes):
+            status = self._heuristic_status("Day", day_routes, n_vehicles, vehicle_capacities,
+                                            demands, time_constraints)
+            visited = {i for route in day_routes for i in route[1:-1]}
+            missing = sorted(set(day_clients[t]) - visited)
+            if missing:
+                missed[t] = missing
+                status = "Day (infeasible)"
+            days.append(self._build_solution(day_routes, distances, service_times, status, start_time,
+                                             time_constraints=time_constraints,
+                                             travel_times=travel_times))
+        status = "Periodic plan (infeasible)" if any("infeasible" in str(day.status) for day in days) \
+            else "Periodic plan"
+        plan = PeriodicPlan(days=days, visit_days={i: patterns[i] for i in range(1, n) if patterns[i]},
+                            status=status, solve_time=time.time() - start_time)
+        plan.stats = {"pattern_moves": moves, "rounds": rounds, "missed_visits": missed,
+                      "daily_workload": [float(day.total_time) for day in days],
+                      "daily_visits": [sum(len(route) - 2 for route in day.routes) for day in days]}
+        return plan
+
+    def assign_patterns(self, travel_times: np.ndarray, frequencies: List[int], horizon_days: int,
+                        service_times: List[float], demands: List[int],
+                        day_capacity: float) -> List[Tuple[int, ...]]:
+        """
+        Choose a visit pattern for every client
+
+        The cost of a client on a day is its round trip to the nearest
+        location already visited that day (the depot included), plus
+        balance_penalty per minute of workload (service + that trip) above
+        the daily average. Clients are placed greedily, most frequent and
+        farthest first, then moved to their cheapest pattern until no move
+        helps. Days never exceed the fleet capacity if another pattern fits.
+
+        Returns:
+            The visit days of every location (empty for the depot)
+        """
+        tau = np.asarray(travel_times, dtype=float)
+        round_trip = tau + tau.T
+        n = len(tau)
+        clients = [i for i in range(1, n) if frequencies[i] > 0]
+        options = {i: visit_patterns(frequencies[i], horizon_days) for i in clients}
+        target = sum((service_times[i] + round_trip[0, i] / 2) * frequencies[i]
+                     for i in clients) / max(1, horizon_days)
+
+        members = [[0] for _ in range(horizon_days)]
+        workload = [0.0] * horizon_days
+        load = [0.0] * horizon_days
+        chosen: List[Tuple[int, ...]] = [() for _ in range(n)]
+
+        def day_cost(i: int, t: int) -> Tuple[float, float]:
+            others = [j for j in members[t] if j != i]
+            trip = float(round_trip[i, others].min())
+            added = service_times[i] + trip
+            own = added if i in members[t] else 0.0
+            over = max(0.0, workload[t] - own + added - target) - max(0.0, workload[t] - own - target)
+            return trip + self.balance_penalty * over, added
+
+        def pattern_cost(i: int, pattern: Tuple[int, ...]) -> float:
+            own = demands[i] if chosen[i] else 0
+            if any(load[t] - (own if t in chosen[i] else 0) + demands[i] > day_capacity + 1e-9
+                   for t in pattern):
+                return float("inf")
+            return sum(day_cost(i, t)[0] for t in pattern)
+
+        def place(i: int, pattern: Tuple[int, ...], sign: int):
+            for t in pattern:
+                if sign > 0:
+                    _, added = day_cost(i, t)
+                    members[t].append(i)
+                else:
+                    members[t].remove(i)
+                    _, added = day_cost(i, t)
+                workload[t] += sign * added
+                load[t] += sign * demands[i]
+            chosen[i] = pattern if sign > 0 else ()
+
+        for i in sorted(clients, key=lambda i: (-frequencies[i], -round_trip[0, i])):
+            costs = [pattern_cost(i, pattern) for pattern in options[i]]
+            best = int(np.argmin(costs))
+            if not np.isfinite(costs[best]):  # Every pattern overloads a day: least loaded days
+                best = int(np.argmin([sum(load[t] for t in pattern) for pattern in options[i]]))
+            place(i, options[i][best], +1)
+
+        for _ in range(10):
+            moved = False
+            for i in clients:
+                if len(options[i]) < 2:
+                    continue
+                current = chosen[i]
+                place(i, current, -1)
+                costs = [pattern_cost(i, pattern) for pattern in options[i]]
+                best = options[i][int(np.argmin(costs))]
+                if best != current and min(costs) < pattern_cost(i, current) - 1e-9:
+                    place(i, best, +1)
+                    moved = True
+                else:
+                    place(i, current, +1)
+            if not moved:
+                break
+        return chosen
+
+    @staticmethod
+    def _day_clients(patterns: List[Tuple[int, ...]], horizon_days: int) -> List[List[int]]:
+        days = [[] for _ in range(horizon_days)]
+        for i, pattern in enumerate(patterns):
+            for t in pattern:
+                days[t].append(i)
+        return days
+
+    def _route_days(self, days, day_clients: List[List[int]], distances: np.ndarray,
+                    travel_times: np.ndarray, daily: Dict, time_limit: int) -> List[List[List[int]]]:
+        """Solve the routing problem of the given days in parallel within time_limit seconds"""
+        days = list(days)
+        workers = self.max_workers or os.cpu_count() or 1
+        waves = math.ceil(len(days) / workers)
+        time_limit = max(1, int(time_limit / max(1, waves)))
+        jobs = []
+        for t in days:
+            nodes = [0] + day_clients[t]
+            sub = np.ix_(nodes, nodes)
+            problem = dict(daily, distances=distances[sub], travel_times=travel_times[sub],
+                           demands=[daily["demands"][i] for i in nodes],
+                           service_times=[daily["service_times"][i] for i in nodes],
+                           time_windows=[daily["time_windows"][i] for i in nodes]
+                           if daily["time_windows"] else None)
+            jobs.append((nodes, self.engine, self.engine_options, time_limit, problem))
+        with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+            return list(pool.map(_solve_day, jobs))
+
+    @staticmethod
+    def _weighted_travel(routes: List[List[int]], travel_times: np.ndarray) -> float:
+        return float(sum(travel_times[a, b] for route in routes for a, b in zip(route, route[1:])))
+
+    @staticmethod
+    def _improve_patterns(patterns: List[Tuple[int, ...]], routes: List[List[List[int]]],
+                          frequencies: List[int], horizon_days: int, travel_times: np.ndarray,
+                          service_times: List[float], demands: List[int],
+                          vehicle_capacities: List[int], time_constraints,
+                          balance_penalty: float) -> Tuple[set, int]:
+        """
+        Move clients to another pattern when inserting them on its days costs
+        less than they save on their current days. Costs are travel minutes
+        plus balance_penalty per minute of daily workload above the average,
+        so that days are not emptied. Routes are edited in place.
+
+        Returns:
+            The changed days and the number of moves
+        """
+        d = travel_times
+        workload = [sum(d[a, b] + service_times[b] for route in day_routes
+                        for a, b in zip(route, route[1:])) for day_routes in routes]
+        target = sum(workload) / max(1, horizon_days)
+
+        def overload(t: int, delta: float) -> float:
+            """Increase of the workload above the average when day t changes by delta"""
+            return max(0.0, workload[t] + delta - target) - max(0.0, workload[t] - target)
+
+        changed, moves = set(), 0
+        for i in range(1, len(d)):
+            alternatives = [p for p in visit_patterns(frequencies[i], horizon_days) if p != patterns[i]]
+            if not alternatives:
+                continue
+            saving, positions, removal = 0.0, {}, {}
+            for t in patterns[i]:
+                for r, route in enumerate(routes[t]):
+                    if i in route:
+                        p = route.index(i)
+                        removal[t] = d[route[p - 1], i] + d[i, route[p + 1]] - d[route[p - 1], route[p + 1]]
+                        positions[t] = (r, p)
+            if len(positions) != len(patterns[i]):
+                continue  # Not routed on every day (infeasible day): leave it
+            for t in patterns[i]:
+                saving += removal[t] - balance_penalty * overload(t, -removal[t] - service_times[i])
+
+            best = None
+            for pattern in alternatives:
+                cost, inserts = 0.0, {}
+                for t in pattern:
+                    if t in positions:  # Staying on this day: no change
+                        inserts[t] = None
+                        cost += removal[t] - balance_penalty * overload(t, -removal[t] - service_times[i])
+                        continue
+                    option = None
+                    for r, route in enumerate(routes[t]):
+                        if r >= len(vehicle_capacities):
+                            break  # Surplus routes of an infeasible day have no rep
+                        if route_load(route, demands) + demands[i] > vehicle_capacities[r]:
+                            continue
+                        arr = np.asarray(route)
+                        delta = d[arr[:-1], i] + d[i, arr[1:]] - d[arr[:-1], arr[1:]]
+                        for q in np.argsort(delta, kind="stable"):
+                            if option is not None and delta[q] >= option[0]:
+                                break
+                            candidate = route[:q + 1] + [i] + route[q + 1:]
+                            if time_constraints is None or time_constraints.feasible(candidate, r):
+                                option = (float(delta[q]), r, candidate)
+                                break
+                    if option is None:
+                        cost = float("inf")
+                        break
+                    cost += option[0] + balance_penalty * overload(t, option[0] + service_times[i])
+                    inserts[t] = option
+                if cost < saving - 1e-6 and (best is None or cost < best[0]):
+                    best = (cost, pattern, inserts)
+
+            if best is None:
+                continue
+            _, pattern, inserts = best
+            for t in patterns[i]:
+                if t not in pattern:
+                    r, _ = positions[t]
+                    routes[t][r] = [node for node in routes[t][r] if node != i]
+                    workload[t] -= removal[t] + service_times[i]
+                    changed.add(t)
+            for t, option in inserts.items():
+                if option is not None:
+                    delta, r, candidate = option
+                    routes[t][r] = candidate
+                    workload[t] += delta + service_times[i]
+                    changed.add(t)
+            patterns[i] = pattern
+            moves += 1
+        return changed, moves
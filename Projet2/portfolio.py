@@ -0,0 +1,210 @@
+import os
+import threading
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from multiprocessing import Manager
+from typing import Dict, List, Optional, Tuple
+
+from solver import PersonnelRoutingSolver, Solution, GRB
+from heuristics import objective_weights
+
+
+def default_members(n_workers: int) -> List[Tuple[str, Dict]]:
+    """
+    Portfolio of n_workers configurations: MIPs that differ in MIPFocus and
+    Seed for a third of the workers (at least one), ALNS runs with different
+    seeds for the rest
+    """
+    focuses = (1, 0, 2, 3)  # Feasibility, balanced, optimality, bound
+    n_mip = max(1, n_workers // 3)
+    members = [("mip", {"gurobi_params": {"MIPFocus": focuses[m % len(focuses)], "Seed": m}})
+               for m in range(n_mip)]
+    members += [("alns", {"seed": s}) for s in range(n_workers - n_mip)]
+    return members
+
+
+def _make_member(engine: str, options: Dict, time_limit: int, mip_gap: float) -> PersonnelRoutingSolver:
+    options = dict(options)
+    gurobi_params = options.pop("gurobi_params", {})
+    if engine == "mip":
+        solver = PersonnelRoutingSolver(time_limit=time_limit, mip_gap=mip_gap, **options)
+    elif engine == "alns":
+        from alns import ALNSSolver
+        solver = ALNSSolver(time_limit=time_limit, **options)
+    elif engine == "column_generation":
+        from column_generation import ColumnGenerationSolver
+        solver = ColumnGenerationSolver(time_limit=time_limit, mip_gap=mip_gap, **options)
+    else:
+        raise ValueError(f"Unknown portfolio engine: {engine}")
+    solver.gurobi_params = gurobi_params
+    return solver
+
+
+def _run_member(args) -> Solution:
+    """Worker: solve with one configuration, publishing and polling the shared incumbent"""
+    (member, engine, options, time_limit, mip_gap, share_interval,
+     shared, lock, done, problem) = args
+    solver = _make_member(engine, options, time_limit, mip_gap)
+    solver.progress_interval = share_interval
+
+    def publish(routes, objective, bound, gap):
+        with lock:
+            best = shared.get("best")
+            if best is None or objective < best[0] - 1e-9:
+                shared["best"] = (objective, routes, member)
+
+    def incumbent():
+        best = shared.get("best")
+        return None if best is None or best[2] == member else best[:2]
+
+    solver.progress_callback = publish
+    solver.incumbent_source = incumbent
+
+    # Stop as soon as another member proves optimality (or the portfolio is stopped)
+    finished = threading.Event()
+
+    def watch():
+        while not finished.is_set():
+            if done.wait(share_interval):
+                solver.stop()
+                return
+
+    threading.Thread(target=watch, daemon=True).start()
+    try:
+        solution = solver.solve_vrp(**problem)
+    finally:
+        finished.set()
+    if GRB is not None and solution.status == GRB.OPTIMAL:  # Nothing left for the other members
+        done.set()
+    return solution
+
+
+class PortfolioSolver(PersonnelRoutingSolver):
+    """
+    Run several solver configurations in parallel processes
+
+    Members (MIPs with different MIPFocus/Seed, ALNS with different seeds)
+    share one wall-clock budget. Every member publishes its incumbents to a
+    manager-held store: MIPs inject better shared routes as heuristic
+    solutions, ALNS runs restart from them. The portfolio stops when the
+    budget is spent or a MIP proves optimality, and returns the best
+    feasible Solution.
+    """
+
+    def __init__(self, time_limit: int = 30, mip_gap: float = 0.01,
+                 n_workers: Optional[int] = None,
+                 members: Optional[List[Tuple[str, Dict]]] = None,
+                 share_interval: float = 0.2):
+        super().__init__(time_limit=time_limit, mip_gap=mip_gap)
+        self.n_workers = n_workers or min(8, os.cpu_count() or 1)
+        self.members = members  # (engine, constructor options); default_members() if None
+        self.share_interval = share_interval  # Seconds between incumbent exchanges
+        self._done = None
+
+    def solve_vrp(self,
+                  distances: np.ndarray,
+                  n_vehicles: int = 1,
+                  vehicle_capacities: List[int] = None,
+                  demands: List[int] = None,
+                  service_times: Optional[List[float]] = None,
+                  time_windows: Optional[List[Optional[Tuple[float, float]]]] = None,
+                  max_shift_duration=None,
+                  travel_times: Optional[np.ndarray] = None,
+                  prizes: Optional[List[float]] = None,
+                  objective: str = "total",
+                  makespan_weight: float = 1.0,
+                  travel_profile=None,
+                  **kwargs) -> Solution:
+        """
+        Solve the VRP with a parallel portfolio
+
+        Accepts the same arguments as PersonnelRoutingSolver.solve_vrp. The
+        returned Solution comes from the best member; stats lists the
+        objective and status of every member.
+        """
+        start_time = time.time()
+        self._start_progress()
+        self.model = None
+        members = self.members or default_members(self.n_workers)
+        if travel_profile is not None and any(engine == "column_generation" for engine, _ in members):
+            raise ValueError("Column generation members do not support travel_profile")
+        weights = objective_weights(objective, makespan_weight)
+        problem = {"distances": np.asarray(distances, dtype=float), "n_vehicles": n_vehicles,
+                   "vehicle_capacities": vehicle_capacities, "demands": demands,
+                   "service_times": service_times, "time_windows": time_windows,
+                   "max_shift_duration": max_shift_duration, "travel_times": travel_times,
+                   "prizes": prizes, "objective": objective, "makespan_weight": makespan_weight}
+        if travel_profile is not None:
+            problem["travel_profile"] = travel_profile
+
+        # Gurobi threads are split between the MIP members
+        n_mip = sum(1 for engine, _ in members if engine != "alns")
+        threads = max(1, (os.cpu_count() or 1) // max(1, len(members))) if n_mip else None
+
+        with Manager() as manager:
+            shared, lock, self._done = manager.dict(), manager.Lock(), manager.Event()
+            jobs = []
+            for m, (engine, options) in enumerate(members):
+                options = dict(options)
+                if engine != "alns" and threads is not None:
+                    options["gurobi_params"] = {"Threads": threads, **options.get("gurobi_params", {})}
+                jobs.append((m, engine, options, self.time_limit, self.mip_gap, self.share_interval,
+                             shared, lock, self._done, problem))
+
+            with ProcessPoolExecutor(max_workers=len(members)) as pool:
+                futures = [pool.submit(_run_member, job) for job in jobs]
+                pending, reported = set(futures), None
+                while pending:
+                    _, pending = wait(pending, timeout=self.progress_interval,
+                                      return_when=FIRST_COMPLETED)
+                    if self._stop_requested:
+                        self._done.set()
+                    best = shared.get("best")
+                    if best is not None and best[0] != reported:
+                        reported = best[0]
+                        self._report_incumbent(best[1], best[0])
+                    self._flush_incumbent()
+
+            self._done = None
+
+        solutions = []
+        for (engine, options), future in zip(members, futures):
+            try:
+                solutions.append((engine, options, future.result()))
+            except Exception as e:
+                print(f"Portfolio member {engine} failed: {e}")
+
+        candidates = [(self._rank(solution, prizes, weights), m)
+                      for m, (_, _, solution) in enumerate(solutions) if solution.routes]
+        if not candidates:
+            return Solution([], 0, 0, 0, 0, "Infeasible", time.time() - start_time)
+        _, winner = min(candidates)
+        engine, options, self.solution = solutions[winner]
+        self.solution.solve_time = time.time() - start_time
+        self.solution.stats = {
+            "winner": f"{engine} {options}",
+            "members": [{"engine": engine, "options": options, "status": solution.status,
+                         "travel_time": solution.travel_time}
+                        for engine, options, solution in solutions],
+        }
+        return self.solution
+
+    @staticmethod
+    def _rank(solution: Solution, prizes: Optional[List[float]] = None,
+              weights: Tuple[float, float] = (1.0, 0.0)) -> Tuple[bool, float]:
+        """
+        Feasible solutions first, then lowest objective: travel time (plus the
+        prizes of dropped clients) and the weighted longest route
+        """
+        lost = sum(prizes[i] for i in solution.dropped or ()) if prizes is not None else 0.0
+        longest = max(solution.route_durations or (), default=0.0)
+        return "infeasible" in str(solution.status), \
+            weights[0] * (solution.travel_time + lost) + weights[1] * longest
+
+    def stop(self):
+        """Stop every member; each returns its best solution"""
+        super().stop()
+        done = self._done
+        if done is not None:
+            done.set()
@@ -0,0 +1,275 @@
+import csv
+import hashlib
+import heapq
+import math
+import os
+import xml.etree.ElementTree as ET
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Default speeds (km/h) by OSM highway type, used when a way has no maxspeed tag
+HIGHWAY_SPEEDS = {
+    "motorway": 110, "motorway_link": 60,
+    "trunk": 90, "trunk_link": 50,
+    "primary": 70, "primary_link": 40,
+    "secondary": 60, "secondary_link": 40,
+    "tertiary": 50, "tertiary_link": 30,
+    "unclassified": 40, "residential": 30,
+    "living_street": 10, "service": 20, "road": 40,
+}
+
+
+def haversine_km(lon1: float, lat1: float, lon2: float, lat2: float) -> float:
+    """Great-circle distance between two (lon, lat) points"""
+    lon1, lat1, lon2, lat2 = map(math.radians, (lon1, lat1, lon2, lat2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + \
+        math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371.0 * math.asin(math.sqrt(a))
+
+
+class RoadNetwork:
+    """
+    Directed road graph with a length (km) and a travel time (minutes) on
+    every edge
+
+    Nodes keep their external id (OSM id or edge-list label) and optional
+    coordinates, which are used to snap clients to the nearest node.
+    """
+
+    def __init__(self, default_speed_kmh: float = 50.0):
+        self.default_speed_kmh = default_speed_kmh
+        self.node_ids: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.coordinates: List[Optional[Tuple[float, float]]] = []
+        self.adjacency: List[List[Tuple[int, float, float]]] = []  # (head, minutes, km)
+        self._fingerprint = None
+
+    def add_node(self, node_id, x: Optional[float] = None, y: Optional[float] = None) -> int:
+        """Register a node (or set its coordinates) and return its index"""
+        node_id = str(node_id)
+        if node_id not in self.index:
+            self.index[node_id] = len(self.node_ids)
+            self.node_ids.append(node_id)
+            self.coordinates.append(None)
+            self.adjacency.append([])
+        idx = self.index[node_id]
+        if x is not None and y is not None:
+            self.coordinates[idx] = (float(x), float(y))
+        self._fingerprint = None
+        return idx
+
+    def add_edge(self, source, target, length_km: float, minutes: Optional[float] = None,
+                 oneway: bool = True):
+        """Add a road segment; the time defaults to the length at the default speed"""
+        if minutes is None:
+            minutes = 60.0 * length_km / self.default_speed_kmh
+        u, v = self.add_node(source), self.add_node(target)
+        self.adjacency[u].append((v, float(minutes), float(length_km)))
+        if not oneway:
+            self.adjacency[v].append((u, float(minutes), float(length_km)))
+        self._fingerprint = None
+
+    @classmethod
+    def from_edge_list(cls, filename: str, nodes_filename: Optional[str] = None,
+                       default_speed_kmh: float = 50.0) -> "RoadNetwork":
+        """
+        Load a CSV edge list
+
+        Args:
+            filename: CSV with columns source, target, length_km and optional
+                time_min and oneway (1/0, default 1)
+            nodes_filename: optional CSV with columns id, x, y for snapping
+            default_speed_kmh: speed used for edges without time_min
+
+        Returns:
+            RoadNetwork
+        """
+        network = cls(default_speed_kmh)
+        if nodes_filename:
+            with open(nodes_filename, newline='') as f:
+                for row in csv.DictReader(f):
+                    network.add_node(row["id"], row["x"], row["y"])
+        with open(filename, newline='') as f:
+            for row in csv.DictReader(f):
+                minutes = row.get("time_min")
+                network.add_edge(row["source"], row["target"], float(row["length_km"]),
+                                 float(minutes) if minutes not in (None, "") else None,
+                                 oneway=row.get("oneway", "1").strip().lower() not in ("0", "no", "false"))
+        return network
+
+    @classmethod
+    def from_osm(cls, filename: str, default_speed_kmh: float = 50.0) -> "RoadNetwork":
+        """
+        Load the drivable ways of an OSM XML extract (.osm)
+
+        Node coordinates are (lon, lat), edge lengths are great-circle
+        distances and times follow the maxspeed tag or HIGHWAY_SPEEDS.
+        """
+        positions = {}
+        ways = []
+        for _, element in ET.iterparse(filename, events=("end",)):
+            if element.tag == "node":
+                positions[element.get("id")] = (float(element.get("lon")), float(element.get("lat")))
+            elif element.tag == "way":
+                tags = {tag.get("k"): tag.get("v") for tag in element.findall("tag")}
+                if tags.get("highway") in HIGHWAY_SPEEDS:
+                    ways.append(([nd.get("ref") for nd in element.findall("nd")], tags))
+            if element.tag in ("node", "way", "relation"):
+                element.clear()
+
+        network = cls(default_speed_kmh)
+        for refs, tags in ways:
+            speed = cls._osm_speed(tags)
+            oneway = tags.get("oneway", "no")
+            if oneway == "-1":
+                refs = refs[::-1]
+            for a, b in zip(refs, refs[1:]):
+                if a not in positions or b not in positions:
+                    continue
+                network.add_node(a, *positions[a])
+                network.add_node(b, *positions[b])
+                length = haversine_km(*positions[a], *positions[b])
+                network.add_edge(a, b, length, 60.0 * length / speed,
+                                 oneway=oneway in ("yes", "true", "1", "-1"))
+        return network
+
+    @staticmethod
+    def _osm_speed(tags: Dict[str, str]) -> float:
+        """Speed (km/h) of a way from its maxspeed tag or its highway type"""
+        maxspeed = tags.get("maxspeed", "")
+        try:
+            value = float(maxspeed.split()[0])
+            return value * 1.609 if "mph" in maxspeed else value
+        except (ValueError, IndexError):
+            return HIGHWAY_SPEEDS[tags["highway"]]
+
+    def fingerprint(self) -> str:
+        """Content hash of the graph (nodes, coordinates and edges)"""
+        if self._fingerprint is None:
+            digest = hashlib.sha256()
+            for node_id, coordinates, edges in zip(self.node_ids, self.coordinates, self.adjacency):
+                digest.update(f"{node_id}|{coordinates}|".encode())
+                digest.update(repr(edges).encode())
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def nearest_nodes(self, points: Iterable[Tuple[float, float]]) -> List[int]:
+        """Index of the closest graph node of every point (same coordinate system)"""
+        located = [i for i, c in enumerate(self.coordinates) if c is not None]
+        if not located:
+            raise ValueError("The road network has no node coordinates")
+        coords = np.array([self.coordinates[i] for i in located])
+        return [located[int(np.argmin(((coords - np.asarray(p, dtype=float)) ** 2).sum(axis=1)))]
+                for p in points]
+
+    def shortest_paths(self, sources: List[int], targets: List[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Fastest paths from every source to every target
+
+        One Dijkstra search on travel time per distinct source, stopped as
+        soon as all targets are settled; the length of the fastest path is
+        carried along.
+
+        Returns:
+            (times, distances), len(sources) x len(targets), inf if unreachable
+        """
+        target_set = set(targets)
+        times = np.full((len(sources), len(targets)), np.inf)
+        lengths = np.full((len(sources), len(targets)), np.inf)
+        cache = {}
+        for row, source in enumerate(sources):
+            if source not in cache:
+                cache[source] = self._dijkstra(source, target_set)
+            settled = cache[source]
+            for col, target in enumerate(targets):
+                if target in settled:
+                    times[row, col], lengths[row, col] = settled[target]
+        return times, lengths
+
+    def _dijkstra(self, source: int, targets: set) -> Dict[int, Tuple[float, float]]:
+        """Settled (minutes, km) labels until every target is reached"""
+        best = {source: 0.0}
+        settled = {}
+        remaining = len(targets)
+        heap = [(0.0, 0.0, source)]
+        while heap and remaining:
+            minutes, km, node = heapq.heappop(heap)
+            if node in settled:
+                continue
+            settled[node] = (minutes, km)
+            if node in targets:
+                remaining -= 1
+            for head, edge_minutes, edge_km in self.adjacency[node]:
+                candidate = minutes + edge_minutes
+                if candidate < best.get(head, math.inf):
+                    best[head] = candidate
+                    heapq.heappush(heap, (candidate, km + edge_km, head))
+        return settled
+
+    def travel_matrices(self, points: List[Tuple[float, float]],
+                        cache: Optional["MatrixCache"] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Road distance (km) and travel time (minutes) matrices between points
+
+        Args:
+            points: (x, y) of the depot followed by every client
+            cache: optional on-disk cache, keyed on the graph and the snapped nodes
+
+        Returns:
+            (distances, travel_times), both n x n
+        """
+        nodes = self.nearest_nodes(points)
+        key = None
+        if cache is not None:
+            key = cache.key(self.fingerprint(), [self.node_ids[i] for i in nodes])
+            cached = cache.load(key)
+            if cached is not None:
+                return cached
+
+        times, distances = self.shortest_paths(nodes, nodes)
+        unreachable = np.argwhere(~np.isfinite(times))
+        if len(unreachable):
+            i, j = unreachable[0]
+            raise ValueError(f"Location {j} cannot be reached from location {i} on the road network")
+
+        if cache is not None:
+            cache.save(key, distances, times)
+        return distances, times
+
+
+class MatrixCache:
+    """
+    Content-addressed store of travel matrices (.npz files)
+
+    The key is a hash of the graph fingerprint and of the ordered list of
+    snapped nodes, so the same client set on the same graph always maps to
+    the same file, and any change to either invalidates it.
+    """
+
+    def __init__(self, directory: str = os.path.join("data", "matrix_cache")):
+        self.directory = directory
+
+    @staticmethod
+    def key(graph_fingerprint: str, node_ids: List[str]) -> str:
+        digest = hashlib.sha256(graph_fingerprint.encode())
+        digest.update(",".join(node_ids).encode())
+        return digest.hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def load(self, key: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Cached (distances, travel_times) or None"""
+        try:
+            with np.load(self.path(key)) as archive:
+                return archive["distances"], archive["travel_times"]
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def save(self, key: str, distances: np.ndarray, travel_times: np.ndarray):
+        """Write atomically so concurrent runs never read a partial file"""
+        os.makedirs(self.directory, exist_ok=True)
+        temporary = self.path(key) + f".{os.getpid()}.tmp"
+        with open(temporary, "wb") as f:
+            np.savez(f, distances=distances, travel_times=travel_times)
+        os.replace(temporary, self.path(key))
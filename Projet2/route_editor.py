@@ -0,0 +1,270 @@
+import time
+import numpy as np
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from solver import PersonnelRoutingSolver, Solution
+
+
+@dataclass
+class MoveEvaluation:
+    """Effect of moving a client to another position"""
+    client: int
+    source: int  # Route the client leaves
+    target: int  # Route the client joins
+    position: int  # Index of the client in the target route after the move
+    delta_distance: float  # km
+    delta_time: float  # travel minutes
+    feasible: bool
+    reason: str = ""  # Violated constraint when infeasible
+
+
+class RouteEditor:
+    """
+    Editable routes with instant move evaluation
+
+    Every route keeps cumulative distance, travel time and load arrays and,
+    with time constraints, the service start time of every stop. Moving a
+    client is priced in O(1) from the matrices and checked for capacity in
+    O(1); time windows and shifts are re-scheduled from the insertion point
+    only (O(route length)). Applying a move refreshes the two routes
+    involved. Route k is driven by rep k and starts at its depot (route[0]);
+    idle reps keep a [depot, depot] route, so clients can be moved to them.
+    """
+
+    EPS = 1e-9
+
+    def __init__(self, routes: List[List[int]], distances: np.ndarray,
+                 travel_times: Optional[np.ndarray] = None,
+                 service_times: Optional[List[float]] = None,
+                 demands: Optional[List[float]] = None,
+                 vehicle_capacities: Optional[List[float]] = None,
+                 time_windows: Optional[List[Optional[Tuple[float, float]]]] = None,
+                 max_shift_duration=None,
+                 open_routes: bool = False):
+        n = len(distances)
+        self.distances = np.array(distances, dtype=float)
+        self.travel_times = PersonnelRoutingSolver._travel_times(self.distances, travel_times).copy()
+        self.routes = [list(route) for route in routes]
+        self.depots = sorted({route[0] for route in self.routes})
+        self.open_routes = open_routes
+        if open_routes:
+            # The reps go home after the last client: the return leg is free
+            self.distances[:, self.depots] = 0.0
+            self.travel_times[:, self.depots] = 0.0
+        self.service_times = list(service_times) if service_times is not None else [0] * n
+        self.demands = list(demands) if demands is not None else [0] * n
+        self.vehicle_capacities = vehicle_capacities
+        self.time_constraints = PersonnelRoutingSolver._make_time_constraints(
+            self.distances, self.service_times, len(self.routes), time_windows, max_shift_duration,
+            self.travel_times)
+        self.history: List[Tuple[int, int, int]] = []  # (client, route, position) before each move
+
+        self.route_of = {}
+        self.pos = {}
+        self.cum_distance: List[np.ndarray] = [None] * len(self.routes)
+        self.cum_time: List[np.ndarray] = [None] * len(self.routes)
+        self.cum_load: List[np.ndarray] = [None] * len(self.routes)
+        self.starts: List[Optional[List[float]]] = [None] * len(self.routes)
+        self.time_ok: List[bool] = [True] * len(self.routes)
+        for r in range(len(self.routes)):
+            self._refresh(r)
+
+    @classmethod
+    def from_solution(cls, solution: Solution, distances: np.ndarray, n_vehicles: int,
+                      vehicle_depots: Optional[List[int]] = None, **kwargs) -> "RouteEditor":
+        """
+        Editor over every rep of a solution, whose routes leave out the idle reps
+
+        Args:
+            solution: solved routes (Solution.vehicles gives their reps)
+            distances: n x n distance matrix
+            n_vehicles: number of reps
+            vehicle_depots: depot of every rep (default the office, 0)
+            **kwargs: see __init__
+        """
+        depots = vehicle_depots or [0] * n_vehicles
+        routes = [[depots[k], depots[k]] for k in range(n_vehicles)]
+        vehicles = solution.vehicles or range(len(solution.routes))
+        for k, route in zip(vehicles, solution.routes):
+            if k < len(routes):
+                routes[k] = list(route)
+            else:
+                routes.append(list(route))  # Surplus route of an infeasible solution
+        return cls(routes, distances, open_routes=solution.open_routes, **kwargs)
+
+    def idle_route(self, depot: int) -> Optional[int]:
+        """First rep of a depot without clients, None if every rep of the depot is busy"""
+        for r, route in enumerate(self.routes):
+            if len(route) <= 2 and route[0] == depot:
+                return r
+        return None
+
+    # ------------------------------------------------------------------
+    # Metrics
+    # ------------------------------------------------------------------
+
+    def _refresh(self, r: int):
+        """Recompute the cumulative arrays of route r (O(route length))"""
+        route = np.asarray(self.routes[r])
+        self.cum_distance[r] = np.concatenate(([0.0], np.cumsum(self.distances[route[:-1], route[1:]])))
+        self.cum_time[r] = np.concatenate(([0.0], np.cumsum(self.travel_times[route[:-1], route[1:]])))
+        loads = np.asarray(self.demands, dtype=float)[route]
+        loads[0] = loads[-1] = 0.0
+        self.cum_load[r] = np.cumsum(loads)
+        if self.time_constraints is not None:
+            self.starts[r] = self.time_constraints.starts(self.routes[r])
+            self.time_ok[r] = self.time_constraints.feasible(self.routes[r], r)
+        for p, node in enumerate(self.routes[r][1:-1], start=1):
+            self.route_of[node] = r
+            self.pos[node] = p
+
+    def capacity(self, r: int) -> float:
+        if not self.vehicle_capacities:
+            return float("inf")
+        return self.vehicle_capacities[r] if r < len(self.vehicle_capacities) else max(self.vehicle_capacities)
+
+    def route_distance(self, r: int) -> float:
+        return float(self.cum_distance[r][-1])
+
+    def route_time(self, r: int) -> float:
+        """Travel minutes of route r"""
+        return float(self.cum_time[r][-1])
+
+    def route_load(self, r: int) -> float:
+        return float(self.cum_load[r][-1])
+
+    @property
+    def total_distance(self) -> float:
+        return sum(self.route_distance(r) for r in range(len(self.routes)))
+
+    @property
+    def total_time(self) -> float:
+        return sum(self.route_time(r) for r in range(len(self.routes)))
+
+    def route_feasible(self, r: int) -> bool:
+        """Capacity and time constraints of route r"""
+        if self.route_load(r) > self.capacity(r) + self.EPS:
+            return False
+        return self.time_ok[r]
+
+    # ------------------------------------------------------------------
+    # Moves
+    # ------------------------------------------------------------------
+
+    def evaluate(self, client: int, target: int, position: Optional[int] = None) -> MoveEvaluation:
+        """
+        Price moving a client into route target
+
+        Args:
+            client: client to move
+            target: index of the receiving route
+            position: index of the client in the target route after the
+                move; None picks the cheapest feasible position
+
+        Returns:
+            MoveEvaluation (feasible False with the reason if no position fits)
+        """
+        source, p = self.route_of[client], self.pos[client]
+        if position is None:
+            return self._best_position(client, target)
+        d, t = self.distances, self.travel_times
+        A = self.routes[source]
+        prev_node, next_node = A[p - 1], A[p + 1]
+        removal_d = d[prev_node, next_node] - d[prev_node, client] - d[client, next_node]
+        removal_t = t[prev_node, next_node] - t[prev_node, client] - t[client, next_node]
+
+        if source == target:
+            rest = A[:p] + A[p + 1:]
+            q = position - 1  # Insert between rest[q] and rest[q + 1]
+            a, b = rest[q], rest[q + 1]
+        else:
+            B = self.routes[target]
+            a, b = B[position - 1], B[position]
+        delta_d = removal_d + d[a, client] + d[client, b] - d[a, b]
+        delta_t = removal_t + t[a, client] + t[client, b] - t[a, b]
+        move = MoveEvaluation(client, source, target, position, float(delta_d), float(delta_t), True)
+
+        if source != target and self.route_load(target) + self.demands[client] > self.capacity(target) + self.EPS:
+            move.feasible, move.reason = False, "capacity"
+        elif self.time_constraints is not None and not self._time_feasible(move):
+            move.feasible, move.reason = False, "time windows / shift"
+        return move
+
+    def _best_position(self, client: int, target: int) -> MoveEvaluation:
+        """Cheapest position in the target route, checked for time in order of cost"""
+        source = self.route_of[client]
+        route = self.routes[target]
+        if source == target:
+            route = route[:self.pos[client]] + route[self.pos[client] + 1:]
+        arr = np.asarray(route)
+        costs = self.distances[arr[:-1], client] + self.distances[client, arr[1:]] - \
+            self.distances[arr[:-1], arr[1:]]
+        best = None
+        for q in np.argsort(costs, kind="stable"):
+            move = self.evaluate(client, target, int(q) + 1)
+            if move.feasible:
+                return move
+            if best is None:
+                best = move  # Cheapest infeasible position, reported if nothing fits
+            if move.reason == "capacity":
+                break  # Same load at every position
+        return best
+
+    def _time_feasible(self, move: MoveEvaluation) -> bool:
+        """Re-schedule the changed routes from their first changed stop"""
+        source, target = move.source, move.target
+        p = self.pos[move.client]
+        A = self.routes[source]
+        rest = A[:p] + A[p + 1:]
+        if source == target:
+            new = rest[:move.position] + [move.client] + rest[move.position:]
+            return self._feasible_from(new, source, min(p, move.position), len(A) - 1 - max(p, move.position))
+        if not self._feasible_from(rest, source, p, len(A) - 1 - p):
+            return False
+        B = self.routes[target]
+        new = B[:move.position] + [move.client] + B[move.position:]
+        return self._feasible_from(new, target, move.position, len(B) - move.position)
+
+    def _feasible_from(self, new: List[int], r: int, first: int, suffix: int) -> bool:
+        """
+        Check the new version of route r, whose stops before first and last
+        suffix stops are unchanged; the check stops early in the suffix if
+        the old route was feasible
+        """
+        old_starts = self.starts[r] if self.time_ok[r] else None
+        return self.time_constraints.feasible_from(new, first - 1, self.starts[r][first - 1], r,
+                                                   old_starts, suffix if old_starts else 0)
+
+    def apply(self, move: MoveEvaluation) -> List[int]:
+        """Apply an evaluated move, return the indices of the changed routes"""
+        client, source, target = move.client, move.source, move.target
+        p = self.pos[client]
+        self.history.append((client, source, p))
+        del self.routes[source][p]
+        self.routes[target].insert(move.position, client)
+        changed = sorted({source, target})
+        for r in changed:
+            self._refresh(r)
+        return changed
+
+    def undo(self) -> List[int]:
+        """Revert the last move, return the indices of the changed routes"""
+        if not self.history:
+            return []
+        client, source, p = self.history.pop()
+        current = self.route_of[client]
+        del self.routes[current][self.pos[client]]
+        self.routes[source].insert(p, client)
+        changed = sorted({source, current})
+        for r in changed:
+            self._refresh(r)
+        return changed
+
+    def solution(self, status: str = "Edited") -> Solution:
+        """Metrics of the edited routes"""
+        solution = PersonnelRoutingSolver._build_solution(
+            [list(route) for route in self.routes], self.distances, self.service_times, status,
+            time.time(), time_constraints=self.time_constraints, travel_times=self.travel_times)
+        solution.open_routes = self.open_routes
+        return solution
@@ -1,17 +1,28 @@
-import gurobipy as gp
-from gurobipy import GRB
+try:
+    import gurobipy as gp
+    from gurobipy import GRB
+except ImportError:  # Heuristic engines still work without Gurobi
+    gp = None
+    GRB = None
 import numpy as np
-from typing import List, Tuple, Dict, Optional
+from typing import Callable, List, Tuple, Dict, Optional
 import time
 from dataclasses import dataclass
 
+from heuristics import (clarke_wright, select_visits, balance_routes, objective_weights,
+                        route_duration, TimeConstraints)
+from local_search import LocalSearch, nearest_neighbors
+
+# Assume average speed: 50 km/h (0.833 km/min)
+SPEED_KM_PER_MIN = 0.833
+
 
 @dataclass
 class Solution:
     """Container for solver results"""
     routes: List[List[int]]
     total_distance: float
-    total_time: float  # Total time including travel + service
+    total_time: float  # Total time including travel + service (+ waiting)
     travel_time: float  # Just travel time
     service_time: float  # Just service time
     status: str
@@ -19,37 +30,99 @@ class Solution:
     node_count: int = 0
     gap: float = 0.0
     vehicle_counts: List[int] = None
+    stats: Dict = None  # Engine-specific statistics (e.g. ALNS iterations)
+    waiting_time: float = 0.0  # Time spent waiting for time windows to open
+    arrival_times: List[List[float]] = None  # Arrival time (min) at every stop of every route
+    dropped: List[int] = None  # Clients left out in prize-collecting mode
+    route_durations: List[float] = None  # Working time (min) of every route, travel + service + waiting
+    open_routes: bool = False  # Routes end at the last client (reps go home, see multi_depot)
+    vehicles: List[int] = None  # Rep (index in the fleet) of every route; idle reps have no route
+
+
+def format_solution(solution: Solution) -> str:
+    """Text report of a solution (see PersonnelRoutingSolver.save_solution)"""
+    lines = ["=== Sales Representatives Routing Solution ===",
+             f"Status: {solution.status}",
+             f"Total Distance: {solution.total_distance:.2f} km",
+             f"Total Time: {solution.total_time:.1f} min",
+             f"  - Travel Time: {solution.travel_time:.1f} min",
+             f"  - Service Time: {solution.service_time:.1f} min"]
+    if solution.waiting_time:
+        lines.append(f"  - Waiting Time: {solution.waiting_time:.1f} min")
+    if solution.route_durations:
+        lines.append(f"Longest Route: {max(solution.route_durations):.1f} min")
+    lines.append(f"Solve Time: {solution.solve_time:.2f}s")
+    lines.append(f"MIP Gap: {solution.gap:.4f}")
+    lines.append(f"Nodes explored: {solution.node_count}")
+    if solution.dropped:
+        lines.append(f"Skipped Clients: {', '.join(str(i) for i in solution.dropped)}")
+
+    for i, route in enumerate(solution.routes):
+        rep = solution.vehicles[i] if solution.vehicles else i
+        text = " -> ".join(["Depot" if node == 0 else f"Client {node}" for node in route])
+        if solution.vehicle_counts:
+            text += f" ({solution.vehicle_counts[i]} clients)"
+        lines += ["", f"Sales Representative {rep + 1} Route:", text]
+    return "\n".join(lines) + "\n"
 
 
 class PersonnelRoutingSolver:
     """Optimized solver for sales representative routing with multiple vehicles"""
 
-    def __init__(self, time_limit: int = 30, mip_gap: float = 0.01):
+    def __init__(self, time_limit: int = 30, mip_gap: float = 0.01,
+                 warm_start: bool = True, fast_mode: bool = False,
+                 post_optimize: bool = True, arc_neighbors: Optional[int] = None,
+                 reduced_cost_threshold: Optional[float] = None,
+                 max_pricing_rounds: int = 3,
+                 gurobi_params: Optional[Dict] = None,
+                 tuning_profile: Optional[str] = None):
         self.time_limit = time_limit
         self.mip_gap = mip_gap
+        self.warm_start = warm_start  # Seed the MIP with a Clarke-Wright solution
+        self.fast_mode = fast_mode  # Return the Clarke-Wright solution without solving the MIP
+        self.post_optimize = post_optimize  # Polish routes with local search after solving
+        self.arc_neighbors = arc_neighbors  # Keep only arcs to the K nearest neighbours (None: all arcs)
+        self.reduced_cost_threshold = reduced_cost_threshold  # Also keep arcs with LP reduced cost below this
+        self.max_pricing_rounds = max_pricing_rounds  # Re-solves with arcs added back by pricing
+        self.gurobi_params = gurobi_params or {}  # Extra Gurobi parameters, e.g. {"MIPFocus": 1, "Seed": 3}
+        # Saved parameter profile (see tuning.py): a name, "auto" for the
+        # profile of the instance size class, or None; gurobi_params win
+        self.tuning_profile = tuning_profile
+        # Called with (routes, objective, bound, gap) for new incumbents, at
+        # most every progress_interval seconds (bound and gap may be None)
+        self.progress_callback: Optional[Callable] = None
+        self.progress_interval = 0.5
+        # Returns an external (objective, routes) incumbent or None, e.g. the
+        # best solution of a portfolio; polled every progress_interval seconds
+        self.incumbent_source: Optional[Callable] = None
         self.model = None
         self.solution = None
+        self._stop_requested = False
+        self._pending_report = None
+        self._last_report = 0.0
+        self._last_poll = 0.0
+        self._subtours: List[List[int]] = []  # Client cycles of the last MIP solution
 
     def create_distance_matrix(self, locations: List[Tuple[float, float]]) -> np.ndarray:
         """Create Euclidean distance matrix"""
-        n = len(locations)
-        dist_matrix = np.zeros((n, n))
-
-        for i in range(n):
-            for j in range(n):
-                if i != j:
-                    xi, yi = locations[i]
-                    xj, yj = locations[j]
-                    dist_matrix[i][j] = np.sqrt((xi - xj) ** 2 + (yi - yj) ** 2)
-
-        return dist_matrix
+        points = np.asarray(locations, dtype=float).reshape(-1, 2)
+        delta = points[:, None, :] - points[None, :, :]
+        return np.sqrt((delta ** 2).sum(axis=2))
 
     def solve_vrp(self,
                   distances: np.ndarray,
                   n_vehicles: int = 1,
                   vehicle_capacities: List[int] = None,
                   demands: List[int] = None,
-                  service_times: Optional[List[float]] = None) -> Solution:
+                  service_times: Optional[List[float]] = None,
+                  formulation: str = "auto",
+                  time_windows: Optional[List[Optional[Tuple[float, float]]]] = None,
+                  max_shift_duration=None,
+                  travel_times: Optional[np.ndarray] = None,
+                  prizes: Optional[List[float]] = None,
+                  objective: str = "total",
+                  makespan_weight: float = 1.0,
+                  travel_profile=None) -> Solution:
         """
         Solve Vehicle Routing Problem (VRP) with multiple vehicles
 
@@ -59,12 +132,47 @@ class PersonnelRoutingSolver:
             vehicle_capacities: maximum clients per vehicle
             demands: demand at each client location (typically 1 per client)
             service_times: Service time at each location (in minutes)
+            formulation: "two_index" (arcs aggregated over identical vehicles),
+                "three_index" (one arc variable per vehicle) or "auto", which
+                picks the two-index model when all vehicles are identical
+            time_windows: [earliest, latest] service start per location (in
+                minutes, None for no window); the depot window bounds the
+                working day
+            max_shift_duration: maximum route duration including service and
+                waiting (minutes), one value or one per vehicle
+            travel_times: n x n travel time matrix (in minutes), e.g. from a
+                road network; defaults to the distances at SPEED_KM_PER_MIN.
+                Routes minimize travel time, distances are only reported
+            prizes: prize of visiting each location (minutes of travel time,
+                see heuristics.priority_prizes). Visits become optional and
+                the objective is travel time plus the prizes of the clients
+                left out, which the Solution lists in dropped. Not every rep
+                has to leave the depot
+            objective: "total" minimizes the total travel time, "makespan"
+                the longest route (travel + service + waiting), "balanced"
+                the total travel time plus makespan_weight times the longest
+                route
+            makespan_weight: weight of the longest route in "balanced" mode
+            travel_profile: time-dependent travel times
+                (travel_profile.TimeDependentTravelTimes). Schedules, time
+                windows and shifts follow the departure time of every arc;
+                routes minimize the day-averaged travel times, which are the
+                default travel_times. The MIP schedules with the averages,
+                the heuristic route checks with the profile; MIP routes that
+                break a limit under the profile give way to the heuristic
+                routes if those fit, else the status says infeasible
 
         Returns:
             Solution object containing routes and metrics
         """
         start_time = time.time()
+        self._start_progress()
         n = len(distances)  # n includes depot (index 0)
+        distances = np.asarray(distances, dtype=float)
+        if travel_times is None and travel_profile is not None:
+            travel_times = travel_profile.mean_times()
+        travel_times = self._travel_times(distances, travel_times)
+        weights = objective_weights(objective, makespan_weight)
 
         if service_times is None:
             service_times = [0] * n  # Depot has 0 service time
@@ -76,149 +184,134 @@ class PersonnelRoutingSolver:
             # Default capacity: unlimited
             vehicle_capacities = [1000] * n_vehicles
 
-        try:
-            # Create model
-            self.model = gp.Model("Sales_Representatives_Routing")
-            self.model.setParam('TimeLimit', self.time_limit)
-            self.model.setParam('MIPGap', self.mip_gap)
-            self.model.setParam('OutputFlag', 0)
-
-            # Variables: x[i,j,k] = 1 if vehicle k travels from i to j
-            x = {}
-            for i in range(n):
-                for j in range(n):
-                    if i != j:
-                        for k in range(n_vehicles):
-                            x[i, j, k] = self.model.addVar(
-                                vtype=GRB.BINARY,
-                                name=f"x_{i}_{j}_{k}"
-                            )
-
-            # Variables: u[i,k] = position of node i in route k (for MTZ)
-            u = {}
-            for i in range(n):
-                for k in range(n_vehicles):
-                    u[i, k] = self.model.addVar(
-                        vtype=GRB.CONTINUOUS,
-                        lb=0,
-                        ub=n - 1,
-                        name=f"u_{i}_{k}"
-                    )
+        time_constraints = self._make_time_constraints(
+            distances, service_times, n_vehicles, time_windows, max_shift_duration, travel_times,
+            travel_profile)
 
-            # Objective: minimize total travel time
-            # Assume average speed: 50 km/h (0.833 km/min)
-            speed_km_per_min = 0.833  # 50 km/h = 0.833 km/min
+        if formulation == "auto":
+            identical = len(set(vehicle_capacities[:n_vehicles])) == 1
+            if time_constraints is not None and time_constraints.shift_limits:
+                identical = identical and len(set(time_constraints.shift_limits)) == 1
+            formulation = "two_index" if identical else "three_index"
 
-            # Travel time in minutes
-            travel_times = distances / speed_km_per_min
+        heuristic_only = self.fast_mode or gp is None
 
-            obj = gp.quicksum(
-                travel_times[i][j] * x[i, j, k]
-                for i in range(n) for j in range(n) if i != j
-                for k in range(n_vehicles)
-            )
-            self.model.setObjective(obj, GRB.MINIMIZE)
+        initial_routes = None
+        if self.warm_start or heuristic_only:
+            initial_routes = self._assign_vehicles(
+                clarke_wright(travel_times, n_vehicles, vehicle_capacities, demands,
+                              time_constraints=time_constraints),
+                vehicle_capacities, demands, time_constraints)
+            if prizes is not None:
+                initial_routes = select_visits(initial_routes, travel_times, prizes, demands,
+                                               vehicle_capacities, n_vehicles, time_constraints)
+            initial_routes = balance_routes(initial_routes, travel_times, service_times, demands,
+                                            vehicle_capacities, weights, time_constraints)
 
-            # Constraints
+        if heuristic_only:
+            self.model = None
+            return self._heuristic_solution("Heuristic", initial_routes, distances, travel_times,
+                                            n_vehicles, vehicle_capacities, demands, service_times,
+                                            time_constraints, start_time, prizes, weights)
 
-            # 1. Each client visited exactly once (excluding depot)
-            for j in range(1, n):
-                self.model.addConstr(
-                    gp.quicksum(x[i, j, k]
-                                for i in range(n) if i != j
-                                for k in range(n_vehicles)) == 1,
-                    name=f"visit_{j}"
-                )
+        # The MIP measures route durations with the service start variables
+        mip_time_constraints = time_constraints
+        if travel_profile is not None:
+            # The MIP schedules with the averaged travel times
+            mip_time_constraints = None if time_windows is None and max_shift_duration is None else \
+                TimeConstraints(travel_times, list(service_times), time_windows,
+                                time_constraints.shift_limits)
+        if weights[1] > 0 and mip_time_constraints is None:
+            mip_time_constraints = TimeConstraints(travel_times, list(service_times))
 
-            # 2. Each vehicle starts and ends at depot
-            for k in range(n_vehicles):
-                # Vehicle leaves depot
-                self.model.addConstr(
-                    gp.quicksum(x[0, j, k] for j in range(1, n)) == 1,
-                    name=f"leave_depot_{k}"
-                )
-                # Vehicle returns to depot
-                self.model.addConstr(
-                    gp.quicksum(x[i, 0, k] for i in range(1, n)) == 1,
-                    name=f"return_depot_{k}"
-                )
+        try:
+            full_arcs = [(i, j) for i in range(n) for j in range(n) if i != j]
+            arcs, pricing = full_arcs, None
+            # The degree LP bound assumes every client is visited and the total
+            # travel time objective: no pruning with prizes or a makespan term
+            if self.arc_neighbors and self.arc_neighbors < n - 2 and prizes is None and weights[1] == 0:
+                seed_routes = initial_routes or self._assign_vehicles(
+                    clarke_wright(travel_times, n_vehicles, vehicle_capacities, demands,
+                                  time_constraints=time_constraints),
+                    vehicle_capacities, demands, time_constraints)
+                arcs = self._candidate_arcs(travel_times, seed_routes)
+                lp_bound, reduced_costs = self._degree_lp(travel_times, n_vehicles, arcs)
+                if lp_bound is not None:
+                    pricing = {"lp_bound": lp_bound, "reduced_costs": reduced_costs}
+                    if self.reduced_cost_threshold is not None:
+                        arcs = self._candidate_arcs(travel_times, seed_routes, reduced_costs)
 
-            # 3. Flow conservation for each vehicle
-            for k in range(n_vehicles):
-                for h in range(n):  # intermediate nodes
-                    if h != 0:  # not depot
-                        self.model.addConstr(
-                            gp.quicksum(x[i, h, k] for i in range(n) if i != h) -
-                            gp.quicksum(x[h, j, k] for j in range(n) if j != h) == 0,
-                            name=f"flow_{h}_{k}"
-                        )
-
-            # 4. MTZ subtour elimination constraints
-            for k in range(n_vehicles):
-                for i in range(1, n):
-                    for j in range(1, n):
-                        if i != j:
-                            self.model.addConstr(
-                                u[i, k] - u[j, k] + (n - 1) * x[i, j, k] <= n - 2,
-                                name=f"mtz_{i}_{j}_{k}"
-                            )
-                # Bound u variables
-                for i in range(1, n):
-                    self.model.addConstr(u[i, k] >= 1, name=f"u_min_{i}_{k}")
-                    self.model.addConstr(u[i, k] <= n - 1, name=f"u_max_{i}_{k}")
-
-            # 5. Capacity constraints (maximum clients per vehicle)
-            if any(d > 0 for d in demands):
-                for k in range(n_vehicles):
-                    capacity = vehicle_capacities[k]
-                    # Sum of demands on route k <= capacity
-                    self.model.addConstr(
-                        gp.quicksum(
-                            demands[j] * gp.quicksum(x[i, j, k] for i in range(n) if i != j)
-                            for j in range(1, n)
-                        ) <= capacity,
-                        name=f"capacity_{k}"
-                    )
+            # Solve on the sparse arc set, then price out the pruned arcs: any
+            # arc with lp_bound + reduced cost below the incumbent value could
+            # improve it, so it is added back and the model re-solved
+            routes = self._solve_mip(travel_times, n_vehicles, vehicle_capacities, demands,
+                                     formulation, mip_time_constraints, arcs, initial_routes,
+                                     self.time_limit, prizes, weights)
+            readded, verified, rounds = 0, pricing is None, 0
+            while routes is not None and pricing is not None:
+                kept = np.zeros((n, n), dtype=bool)
+                kept[tuple(np.array(arcs).T)] = True
+                np.fill_diagonal(kept, True)
+                missing = ~kept & (pricing["lp_bound"] + pricing["reduced_costs"]
+                                   < self.model.ObjVal - 1e-6)
+                if not missing.any():
+                    verified = True
+                    break
+                remaining = self.time_limit - (time.time() - start_time)
+                if rounds >= self.max_pricing_rounds or remaining < 1 or self._stop_requested:
+                    break
+                rounds += 1
+                added = [(int(i), int(j)) for i, j in np.argwhere(missing)]
+                arcs = arcs + added
+                readded += len(added)
+                improved = self._solve_mip(travel_times, n_vehicles, vehicle_capacities, demands,
+                                           formulation, mip_time_constraints, arcs, routes, remaining)
+                if improved is None:
+                    break
+                routes = improved
 
-            # Optimize
-            self.model.optimize()
+            if routes is None and self._stop_requested and initial_routes:
+                # Stopped before the MIP had an incumbent: keep the savings routes
+                return self._heuristic_solution("Stopped", initial_routes, distances, travel_times,
+                                                n_vehicles, vehicle_capacities, demands,
+                                                service_times, time_constraints, start_time, prizes,
+                                                weights)
 
             # Extract solution
-            if self.model.status == GRB.OPTIMAL or self.model.status == GRB.TIME_LIMIT:
-                routes = self._extract_routes(x, n, n_vehicles)
-
-                # Calculate total travel time
-                total_travel_time = self.model.objVal  # Travel time in minutes
-
-                # Calculate total service time for visited clients
-                total_service_time = 0
-                for route in routes:
-                    for node in route:
-                        if node != 0:  # Not depot
-                            total_service_time += service_times[node]
-
-                total_time_minutes = total_travel_time + total_service_time
-
-                # Calculate total distance
-                total_distance = 0
-                for route in routes:
-                    for i in range(len(route) - 1):
-                        from_node = route[i]
-                        to_node = route[i + 1]
-                        total_distance += distances[from_node][to_node]
-
-                self.solution = Solution(
-                    routes=routes,
-                    total_distance=total_distance,
-                    total_time=total_time_minutes,
-                    travel_time=total_travel_time,
-                    service_time=total_service_time,
-                    status=self.model.status,
-                    solve_time=time.time() - start_time,
-                    node_count=self.model.NodeCount,
-                    gap=self.model.MIPGap,
-                    vehicle_counts=[len(route) - 2 for route in routes]  # exclude depot at start and end
-                )
+            if routes is not None:
+                routes = self._polish(routes, travel_times, vehicle_capacities, demands,
+                                      time_constraints, prizes, service_times, weights)
+
+                status = self.model.status
+                if travel_profile is not None and time_constraints is not None and not all(
+                        time_constraints.feasible(route, k) for k, route in enumerate(routes) if len(route) > 2):
+                    # Scheduled with the averages, the MIP routes break a window
+                    # or a shift under the profile: the savings routes are built
+                    # with the profile, keep them if they fit
+                    fallback = initial_routes or self._assign_vehicles(
+                        clarke_wright(travel_times, n_vehicles, vehicle_capacities, demands,
+                                      time_constraints=time_constraints),
+                        vehicle_capacities, demands, time_constraints)
+                    heuristic = self._heuristic_solution("Heuristic", fallback, distances, travel_times,
+                                                         n_vehicles, vehicle_capacities, demands,
+                                                         service_times, time_constraints, start_time,
+                                                         prizes, weights)
+                    if "infeasible" not in heuristic.status:
+                        return heuristic
+                    status = "MIP (infeasible)"
+
+                self.solution = self._build_solution(
+                    routes, distances, service_times,
+                    status, start_time,
+                    node_count=self.model.NodeCount, gap=self.model.MIPGap,
+                    time_constraints=time_constraints, travel_times=travel_times, prizes=prizes)
+                if pricing is not None:
+                    self.solution.stats = {"arcs": len(arcs), "full_arcs": len(full_arcs),
+                                           "readded_arcs": readded, "pricing_rounds": rounds,
+                                           "pricing_verified": verified,
+                                           "lp_bound": pricing["lp_bound"]}
+                if self._subtours:
+                    self.solution.stats = dict(self.solution.stats or {}, subtours=self._subtours)
 
                 return self.solution
             else:
@@ -231,56 +324,922 @@ class PersonnelRoutingSolver:
             print(f"Unexpected error: {e}")
             return Solution([], 0, 0, 0, 0, f"Error: {e}", time.time() - start_time)
 
-    def _extract_routes(self, x: Dict, n: int, n_vehicles: int) -> List[List[int]]:
-        """Extract routes for all vehicles from solution variables"""
-        routes = []
+    def stop(self):
+        """
+        Ask a running solve_vrp to stop and return the best solution found so
+        far: the Gurobi model is terminated and the heuristic loops exit.
+        Can be called from another thread.
+        """
+        self._stop_requested = True
+        model = self.model
+        if model is not None:
+            model.terminate()
+
+    def _start_progress(self):
+        """Reset the stop request and incumbent reporting at the start of a solve"""
+        self._stop_requested = False
+        self._pending_report = None
+        self._last_report = 0.0
+        self._last_poll = 0.0
+
+    def _report_incumbent(self, routes: List[List[int]], objective: float,
+                          bound: Optional[float] = None):
+        """Queue a new incumbent for progress_callback (see _flush_incumbent)"""
+        if self.progress_callback is None:
+            return
+        self._pending_report = ([list(route) for route in routes], float(objective), bound)
+        self._flush_incumbent()
+
+    def _flush_incumbent(self):
+        """Send the queued incumbent once progress_interval has elapsed since the last one"""
+        if self._pending_report is None or time.time() - self._last_report < self.progress_interval:
+            return
+        routes, objective, bound = self._pending_report
+        self._pending_report = None
+        self._last_report = time.time()
+        gap = abs(objective - bound) / abs(objective) if bound is not None and objective else None
+        self.progress_callback(routes, objective, bound, gap)
+
+    def _shared_incumbent(self, objective: float) -> Optional[List[List[int]]]:
+        """Routes of an external incumbent better than objective (see incumbent_source)"""
+        if self.incumbent_source is None or time.time() - self._last_poll < self.progress_interval:
+            return None
+        self._last_poll = time.time()
+        shared = self.incumbent_source()
+        if shared is None or shared[0] >= objective - 1e-6:
+            return None
+        return shared[1]
+
+    def _tuned_params(self, n_clients: int) -> Dict:
+        """Gurobi parameters of the tuning profile, empty if there is none"""
+        if not self.tuning_profile:
+            return {}
+        from tuning import profile_params
+        try:
+            return profile_params(self.tuning_profile, n_clients)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Tuning profile {self.tuning_profile!r} not loaded: {e}")
+            return {}
+
+    @staticmethod
+    def _travel_times(distances: np.ndarray, travel_times: Optional[np.ndarray] = None) -> np.ndarray:
+        """Travel time matrix in minutes, derived from the distances at constant speed if not given"""
+        if travel_times is None:
+            return np.asarray(distances, dtype=float) / SPEED_KM_PER_MIN
+        travel_times = np.asarray(travel_times, dtype=float)
+        if travel_times.shape != np.shape(distances):
+            raise ValueError("travel_times and distances must have the same shape")
+        return travel_times
+
+    @staticmethod
+    def _make_time_constraints(distances: np.ndarray, service_times: List[float], n_vehicles: int,
+                               time_windows=None, max_shift_duration=None,
+                               travel_times: Optional[np.ndarray] = None,
+                               travel_profile=None) -> Optional[TimeConstraints]:
+        """Bundle VRPTW data, or None when neither windows, shift limits nor a profile are set"""
+        if time_windows is None and max_shift_duration is None and travel_profile is None:
+            return None
+        shift_limits = None
+        if max_shift_duration is not None:
+            if np.isscalar(max_shift_duration):
+                shift_limits = [float(max_shift_duration)] * n_vehicles
+            else:
+                shift_limits = [float(h) for h in max_shift_duration]
+        return TimeConstraints(PersonnelRoutingSolver._travel_times(distances, travel_times),
+                               list(service_times), time_windows, shift_limits, travel_profile)
+
+    def _add_time_constraints(self, x: Dict, tc: TimeConstraints, n_vehicles: int,
+                              vehicle_indexed: bool, arcs: List[Tuple[int, int]],
+                              makespan=None) -> Dict:
+        """
+        Service start variables t[i] with big-M propagation along used arcs,
+        client windows and the per-vehicle return limit (shift duration).
+        A makespan variable, if given, is bounded below by every route duration
+        """
+        n = len(tc.travel_times)
+        tau, s = tc.travel_times, tc.service_times
+
+        # Finite horizon for the big-M coefficients
+        horizon = max(tc.return_limit(k) for k in range(n_vehicles))
+        if not np.isfinite(horizon):
+            horizon = tc.departure + sum(s) + sum(float(np.max(tau[i])) for i in range(n))
+
+        def used(i, j):
+            if vehicle_indexed:
+                return gp.quicksum(x[i, j, k] for k in range(n_vehicles))
+            return x[i, j]
+
+        t = {0: tc.departure}
+        upper = {0: tc.departure}  # Largest value of every t, for the big-M coefficients
+        visit = self.model._visit
+        for i in range(1, n):
+            lb, upper[i] = max(tc.earliest[i], tc.departure + tau[0][i]), min(tc.latest[i], horizon)
+            if lb > upper[i] and visit is not None:
+                visit[i].UB = 0  # Window out of reach: the client can only be dropped
+                upper[i] = lb
+            t[i] = self.model.addVar(lb=lb, ub=upper[i], name=f"t_{i}")
+
+        # Time propagation: t_j >= t_i + s_i + tau_ij if arc (i, j) is used
+        for (i, j) in arcs:
+            if j != 0:
+                latest_i = upper[i]
+                big_m = max(0.0, latest_i + s[i] + tau[i][j] - tc.earliest[j])
+                self.model.addConstr(
+                    t[j] >= t[i] + s[i] + tau[i][j] - big_m * (1 - used(i, j)),
+                    name=f"time_{i}_{j}"
+                )
+
+        # Return to the depot within the shift of the vehicle
+        for i in (i for (i, j) in arcs if j == 0 and i != 0):
+            latest_i = upper[i]
+            if makespan is not None:
+                big_m = max(0.0, latest_i + s[i] + tau[i][0] - tc.departure)
+                self.model.addConstr(
+                    makespan >= t[i] + s[i] + tau[i][0] - tc.departure - big_m * (1 - used(i, 0)),
+                    name=f"makespan_{i}"
+                )
+            if vehicle_indexed:
+                for k in range(n_vehicles):
+                    limit = tc.return_limit(k)
+                    if not np.isfinite(limit):
+                        continue
+                    big_m = max(0.0, latest_i + s[i] + tau[i][0] - limit)
+                    self.model.addConstr(
+                        t[i] + s[i] + tau[i][0] <= limit + big_m * (1 - x[i, 0, k]),
+                        name=f"shift_{i}_{k}"
+                    )
+            else:
+                limit = tc.return_limit(0)
+                if np.isfinite(limit):
+                    big_m = max(0.0, latest_i + s[i] + tau[i][0] - limit)
+                    self.model.addConstr(
+                        t[i] + s[i] + tau[i][0] <= limit + big_m * (1 - x[i, 0]),
+                        name=f"shift_{i}"
+                    )
+
+        return t
+
+    @staticmethod
+    def _heuristic_status(label: str, routes: List[List[int]], n_vehicles: int,
+                          vehicle_capacities: List[int], demands: List[int],
+                          time_constraints: Optional[TimeConstraints] = None) -> str:
+        """Flag heuristic solutions that need more reps or break a limit"""
+        used = [k for k, route in enumerate(routes) if len(route) > 2]
+        spare = max(vehicle_capacities)
+        feasible = len(used) <= n_vehicles and all(
+            sum(demands[i] for i in routes[k]) <= (vehicle_capacities[k] if k < n_vehicles else spare) and
+            (time_constraints is None or time_constraints.feasible(routes[k], k))
+            for k in used
+        )
+        return label if feasible else f"{label} (infeasible)"
+
+    def _polish(self, routes: List[List[int]], distances: np.ndarray,
+                vehicle_capacities: List[int], demands: List[int],
+                time_constraints: Optional[TimeConstraints] = None,
+                prizes: Optional[List[float]] = None,
+                service_times: Optional[List[float]] = None,
+                weights: Tuple[float, float] = (1.0, 0.0)) -> List[List[int]]:
+        """
+        Post-optimize routes with the granular local search (then revisit the
+        visit choice, and rebalance the longest route when it is in the objective)
+        """
+        if not self.post_optimize or not routes:
+            return routes
+        search = LocalSearch(distances, demands, vehicle_capacities,
+                             time_limit=max(1.0, 0.1 * self.time_limit),
+                             time_constraints=time_constraints)
+        polished = search.improve(routes)
+        if prizes is not None:
+            polished = select_visits(polished, distances, prizes, demands, vehicle_capacities,
+                                     len(polished), time_constraints)
+        if weights[1] > 0:
+            # The local search only shortens the total: keep its result if it unbalanced the routes
+            polished = balance_routes(polished, distances, service_times, demands,
+                                      vehicle_capacities, weights, time_constraints)
+            if self._weighted_objective(polished, distances, service_times, weights,
+                                        time_constraints, prizes) > \
+                    self._weighted_objective(routes, distances, service_times, weights,
+                                             time_constraints, prizes) + 1e-9:
+                return routes
+        return polished
+
+    @staticmethod
+    def _weighted_objective(routes: List[List[int]], travel_times: np.ndarray,
+                            service_times: List[float], weights: Tuple[float, float],
+                            time_constraints: Optional[TimeConstraints] = None,
+                            prizes: Optional[List[float]] = None) -> float:
+        """Objective of the MIP: weighted travel (plus dropped prizes) and longest route"""
+        travel_weight, makespan_weight = weights
+        visited = {node for route in routes for node in route}
+        travel = sum(travel_times[a][b] for route in routes for a, b in zip(route, route[1:]))
+        if prizes is not None:
+            travel += sum(prize for i, prize in enumerate(prizes) if i > 0 and i not in visited)
+        longest = max((route_duration(route, travel_times, service_times, time_constraints)
+                       for route in routes), default=0.0)
+        return travel_weight * travel + makespan_weight * longest
+
+    def _heuristic_solution(self, label: str, routes: List[List[int]], distances: np.ndarray,
+                            travel_times: np.ndarray, n_vehicles: int, vehicle_capacities: List[int],
+                            demands: List[int], service_times: List[float],
+                            time_constraints: Optional[TimeConstraints],
+                            start_time: float, prizes: Optional[List[float]] = None,
+                            weights: Tuple[float, float] = (1.0, 0.0)) -> Solution:
+        """Polish construction routes and wrap them in a Solution"""
+        routes = self._polish(routes, travel_times, vehicle_capacities, demands, time_constraints,
+                              prizes, service_times, weights)
+        status = self._heuristic_status(label, routes, n_vehicles, vehicle_capacities,
+                                        demands, time_constraints)
+        self.solution = self._build_solution(routes, distances, service_times, status, start_time,
+                                             time_constraints=time_constraints,
+                                             travel_times=travel_times, prizes=prizes)
+        return self.solution
+
+    @staticmethod
+    def _build_solution(routes: List[List[int]], distances: np.ndarray,
+                        service_times: List[float], status, start_time: float,
+                        node_count: int = 0, gap: float = 0.0,
+                        time_constraints: Optional[TimeConstraints] = None,
+                        travel_times: Optional[np.ndarray] = None,
+                        prizes: Optional[List[float]] = None) -> Solution:
+        """Compute route metrics and wrap them in a Solution (route k = rep k, idle reps left out)"""
+        vehicles = [k for k, route in enumerate(routes) if len(route) > 2]
+        routes = [routes[k] for k in vehicles]
+
+        # Calculate total distance
+        total_distance = 0
+        for route in routes:
+            for i in range(len(route) - 1):
+                from_node = route[i]
+                to_node = route[i + 1]
+                total_distance += distances[from_node][to_node]
+
+        # Calculate total travel time (minutes)
+        if time_constraints is not None and time_constraints.profile is not None:
+            # Driving time depends on the departure times: what the schedule does not wait or serve
+            total_travel_time = 0.0
+            for route in routes:
+                _, waiting, back = time_constraints.schedule(route)
+                total_travel_time += back - time_constraints.departure - waiting - \
+                    sum(service_times[node] for node in route[:-1])
+        elif travel_times is None:
+            total_travel_time = total_distance / SPEED_KM_PER_MIN
+        else:
+            total_travel_time = sum(travel_times[route[i]][route[i + 1]]
+                                    for route in routes for i in range(len(route) - 1))
+
+        # Calculate total service time for visited clients
+        total_service_time = 0
+        for route in routes:
+            for node in route:
+                if node != 0:  # Not depot
+                    total_service_time += service_times[node]
+
+        # Arrival times and waiting for time windows
+        if time_constraints is None:
+            time_constraints = TimeConstraints(
+                PersonnelRoutingSolver._travel_times(distances, travel_times), list(service_times))
+        arrival_times, route_durations, total_waiting_time = [], [], 0.0
+        for route in routes:
+            arrivals, waiting, back = time_constraints.schedule(route)
+            arrival_times.append(arrivals)
+            route_durations.append(back - time_constraints.departure)
+            total_waiting_time += waiting
+
+        return Solution(
+            routes=routes,
+            total_distance=total_distance,
+            total_time=total_travel_time + total_service_time + total_waiting_time,
+            travel_time=total_travel_time,
+            service_time=total_service_time,
+            status=status,
+            solve_time=time.time() - start_time,
+            node_count=node_count,
+            gap=gap,
+            vehicle_counts=[len(route) - 2 for route in routes],  # exclude depot at start and end
+            waiting_time=total_waiting_time,
+            arrival_times=arrival_times,
+            route_durations=route_durations,
+            dropped=None if prizes is None else sorted(
+                set(range(1, len(distances))) - {node for route in routes for node in route}),
+            vehicles=vehicles
+        )
+
+    def _set_mip_start(self, x: Dict, u: Optional[Dict], routes: List[List[int]],
+                       t: Optional[Dict] = None, time_constraints: Optional[TimeConstraints] = None,
+                       y: Optional[Dict] = None):
+        """Inject routes as a MIP start through the Start attribute of x (and u, t, y)"""
+        for var in x.values():
+            var.Start = 0
+        # Surplus routes (heuristic needed more vehicles) are left to the MIP
+        n_vehicles = len(routes) if u is None else len({key[2] for key in x})
+        if y is not None:
+            visited = {node for route in routes[:n_vehicles] for node in route}
+            for i, var in y.items():
+                var.Start = 1 if i in visited else 0
+        for k, route in enumerate(routes[:n_vehicles]):
+            if len(route) <= 2:
+                continue
+            for position, (i, j) in enumerate(zip(route, route[1:])):
+                if u is None:
+                    x[i, j].Start = 1
+                else:
+                    x[i, j, k].Start = 1
+                    if j != 0:
+                        u[j, k].Start = position + 1
+            if t is not None:
+                arrivals, _, _ = time_constraints.schedule(route)
+                for position, node in enumerate(route[1:-1], start=1):
+                    t[node].Start = max(arrivals[position], time_constraints.earliest[node])
+
+    @staticmethod
+    def _adjacency(n: int, arcs: List[Tuple[int, int]]) -> Tuple[List[List[int]], List[List[int]]]:
+        """Successor and predecessor lists of every node in the arc set"""
+        out_arcs = [[] for _ in range(n)]
+        in_arcs = [[] for _ in range(n)]
+        for (i, j) in arcs:
+            out_arcs[i].append(j)
+            in_arcs[j].append(i)
+        return out_arcs, in_arcs
+
+    def _candidate_arcs(self, travel_times: np.ndarray, routes: List[List[int]],
+                        reduced_costs: Optional[np.ndarray] = None) -> List[Tuple[int, int]]:
+        """
+        Sparse arc set: the arc_neighbors nearest neighbours of every client
+        (both directions), every depot arc, the arcs of the start routes and,
+        if a threshold is set, every arc whose LP reduced cost is below it
+        """
+        n = len(travel_times)
+        keep = np.zeros((n, n), dtype=bool)
+        neighbors = nearest_neighbors(travel_times, self.arc_neighbors)
+        keep[np.arange(n)[:, None], neighbors] = True
+        keep |= keep.T
+        keep[0, :] = keep[:, 0] = True
+        for route in routes or []:
+            keep[route[:-1], route[1:]] = True
+        if reduced_costs is not None and self.reduced_cost_threshold is not None:
+            keep |= reduced_costs <= self.reduced_cost_threshold
+        np.fill_diagonal(keep, False)
+        return [(int(i), int(j)) for i, j in np.argwhere(keep)]
+
+    @staticmethod
+    def _degree_lp(travel_times: np.ndarray, n_vehicles: int,
+                   arcs: List[Tuple[int, int]]) -> Tuple[Optional[float], Optional[np.ndarray]]:
+        """
+        Degree relaxation (one arc in and out of every client, K at the depot)
+        solved by column generation from the sparse arc set
+
+        Returns:
+            LP bound and the n x n reduced cost matrix at the LP optimum, or
+            (None, None) if the relaxation is infeasible
+        """
+        n = len(travel_times)
+        cost = np.array(travel_times, dtype=float)
+        np.fill_diagonal(cost, np.inf)
+
+        lp = gp.Model("Degree_LP")
+        lp.setParam('OutputFlag', 0)
+        rhs = [n_vehicles] + [1] * (n - 1)
+        out_constrs = [lp.addLConstr(gp.LinExpr(), GRB.EQUAL, rhs[i], name=f"out_{i}") for i in range(n)]
+        in_constrs = [lp.addLConstr(gp.LinExpr(), GRB.EQUAL, rhs[j], name=f"in_{j}") for j in range(n)]
 
+        def add_columns(columns):
+            for (i, j) in columns:
+                lp.addVar(obj=cost[i, j], ub=1 if i and j else n_vehicles,
+                          column=gp.Column([1.0, 1.0], [out_constrs[i], in_constrs[j]]))
+
+        add_columns(arcs)
+        while True:
+            lp.optimize()
+            if lp.status != GRB.OPTIMAL:
+                return None, None
+            alpha = np.array(lp.getAttr('Pi', out_constrs))
+            beta = np.array(lp.getAttr('Pi', in_constrs))
+            reduced_costs = cost - alpha[:, None] - beta[None, :]
+            # Price out: most negative column of every row
+            best = np.argmin(reduced_costs, axis=1)
+            rows = np.flatnonzero(reduced_costs[np.arange(n), best] < -1e-7)
+            if len(rows) == 0:
+                return lp.ObjVal, np.maximum(reduced_costs, 0.0)
+            add_columns(zip(rows.tolist(), best[rows].tolist()))
+
+    def _solve_mip(self, travel_times: np.ndarray, n_vehicles: int, vehicle_capacities: List[int],
+                   demands: List[int], formulation: str, time_constraints: Optional[TimeConstraints],
+                   arcs: List[Tuple[int, int]], initial_routes: Optional[List[List[int]]],
+                   time_limit: float, prizes: Optional[List[float]] = None,
+                   weights: Tuple[float, float] = (1.0, 0.0)) -> Optional[List[List[int]]]:
+        """Build and optimize the model over the given arcs, return the incumbent routes"""
+        n = len(travel_times)
+        self.model = gp.Model("Sales_Representatives_Routing")
+        self.model.setParam('TimeLimit', time_limit)
+        self.model.setParam('MIPGap', self.mip_gap)
+        self.model.setParam('OutputFlag', 0)
+        for name, value in {**self._tuned_params(n - 1), **self.gurobi_params}.items():
+            self.model.setParam(name, value)
+
+        if formulation == "two_index":
+            x = self._build_two_index_model(travel_times, n_vehicles,
+                                            vehicle_capacities[0], demands, arcs, prizes)
+            u = None
+        else:
+            x, u = self._build_three_index_model(travel_times, n_vehicles,
+                                                 vehicle_capacities, demands, arcs, prizes,
+                                                 time_constraints)
+
+        travel_weight, makespan_weight = weights
+        makespan = None
+        if makespan_weight > 0:
+            # Longest route duration, bounded below by every return time (see _add_time_constraints)
+            self.model.update()
+            travel = self.model.getObjective()
+            makespan = self.model.addVar(lb=0.0, name="makespan")
+            self.model.setObjective(travel_weight * travel + makespan_weight * makespan, GRB.MINIMIZE)
+
+        t = None
+        if time_constraints is not None:
+            t = self._add_time_constraints(x, time_constraints, n_vehicles,
+                                           vehicle_indexed=formulation != "two_index", arcs=arcs,
+                                           makespan=makespan)
+
+        if initial_routes:
+            self._set_mip_start(x, u, initial_routes, t, time_constraints, self.model._visit)
+
+        if self._stop_requested:
+            return None
+        self.model._x = x
+        self.model._lazy = formulation == "two_index"
+        self.model._solver = self if self.progress_callback is not None \
+            or self.incumbent_source is not None else None
+        self.model._vehicle_capacities = vehicle_capacities
+        if self.model._lazy or self.model._solver is not None:
+            self.model.optimize(self._mip_callback)
+        else:
+            self.model.optimize()
+
+        if self.model.status not in (GRB.OPTIMAL, GRB.TIME_LIMIT, GRB.INTERRUPTED) \
+                or self.model.SolCount == 0:
+            return None
+        if formulation == "two_index":
+            routes = self._assign_vehicles(
+                self._extract_two_index_routes(x, n), vehicle_capacities, demands, time_constraints)
+        else:
+            routes = self._extract_routes(x, n, n_vehicles)
+        if self._subtours:
+            print(f"Warning: {len(self._subtours)} subtour(s) in the MIP solution: {self._subtours}")
+        return routes
+
+    def _build_three_index_model(self, travel_times: np.ndarray, n_vehicles: int,
+                                 vehicle_capacities: List[int], demands: List[int],
+                                 arcs: List[Tuple[int, int]],
+                                 prizes: Optional[List[float]] = None,
+                                 time_constraints: Optional[TimeConstraints] = None) -> Tuple[Dict, Dict]:
+        """Vehicle-indexed model: x[i,j,k] = 1 if vehicle k travels from i to j"""
+        n = len(travel_times)
+        out_arcs, in_arcs = self._adjacency(n, arcs)
+        y = self._add_visit_variables(n, prizes)
+
+        # Variables: x[i,j,k] = 1 if vehicle k travels from i to j
+        x = {}
+        for (i, j) in arcs:
+            for k in range(n_vehicles):
+                x[i, j, k] = self.model.addVar(
+                    vtype=GRB.BINARY,
+                    name=f"x_{i}_{j}_{k}"
+                )
+
+        # Variables: u[i,k] = position of node i in route k (for MTZ)
+        u = {}
+        for i in range(n):
+            for k in range(n_vehicles):
+                u[i, k] = self.model.addVar(
+                    vtype=GRB.CONTINUOUS,
+                    lb=0,
+                    ub=n - 1,
+                    name=f"u_{i}_{k}"
+                )
+
+        # Objective: minimize total travel time (plus the prizes of dropped clients)
+        obj = gp.quicksum(
+            travel_times[i][j] * x[i, j, k]
+            for (i, j) in arcs
+            for k in range(n_vehicles)
+        )
+        self.model.setObjective(obj + self._dropped_prizes(y, prizes), GRB.MINIMIZE)
+
+        # Constraints
+
+        # 1. Each client visited exactly once (excluding depot), or at most
+        # once in prize-collecting mode
+        for j in range(1, n):
+            self.model.addConstr(
+                gp.quicksum(x[i, j, k]
+                            for i in in_arcs[j]
+                            for k in range(n_vehicles)) == (1 if y is None else y[j]),
+                name=f"visit_{j}"
+            )
+
+        # 2. Each vehicle starts and ends at depot (idle vehicles allowed with prizes)
         for k in range(n_vehicles):
-            # Start each route at depot
-            route = [0]
-            current = 0
-
-            # Follow the path for vehicle k
-            while True:
-                found = False
-                for j in range(n):
-                    if j != current and (current, j, k) in x:
-                        if x[current, j, k].X > 0.5:  # Variable is 1
-                            route.append(j)
-                            current = j
-                            found = True
-                            break
-
-                if not found or current == 0:
-                    break
+            leave = gp.quicksum(x[0, j, k] for j in out_arcs[0])
+            back = gp.quicksum(x[i, 0, k] for i in in_arcs[0])
+            # Vehicle leaves depot
+            self.model.addConstr(leave == 1 if y is None else leave <= 1, name=f"leave_depot_{k}")
+            # Vehicle returns to depot
+            self.model.addConstr(back == 1 if y is None else back <= 1, name=f"return_depot_{k}")
+
+        # 3. Flow conservation for each vehicle
+        for k in range(n_vehicles):
+            for h in range(1, n):  # intermediate nodes (not depot)
+                self.model.addConstr(
+                    gp.quicksum(x[i, h, k] for i in in_arcs[h]) -
+                    gp.quicksum(x[h, j, k] for j in out_arcs[h]) == 0,
+                    name=f"flow_{h}_{k}"
+                )
+
+        # 4. MTZ subtour elimination constraints
+        for k in range(n_vehicles):
+            for (i, j) in arcs:
+                if i != 0 and j != 0:
+                    self.model.addConstr(
+                        u[i, k] - u[j, k] + (n - 1) * x[i, j, k] <= n - 2,
+                        name=f"mtz_{i}_{j}_{k}"
+                    )
+            # Bound u variables
+            for i in range(1, n):
+                self.model.addConstr(u[i, k] >= 1, name=f"u_min_{i}_{k}")
+                self.model.addConstr(u[i, k] <= n - 1, name=f"u_max_{i}_{k}")
+
+        # 5. Capacity constraints (maximum clients per vehicle)
+        if any(d > 0 for d in demands):
+            for k in range(n_vehicles):
+                capacity = vehicle_capacities[k]
+                # Sum of demands on route k <= capacity
+                self.model.addConstr(
+                    gp.quicksum(
+                        demands[j] * gp.quicksum(x[i, j, k] for i in in_arcs[j])
+                        for j in range(1, n)
+                    ) <= capacity,
+                    name=f"capacity_{k}"
+                )
+
+        # 6. Symmetry breaking: vehicles with the same capacity and shift
+        # limit are interchangeable, so order them by number of clients visited
+        vehicle_types = self._vehicle_types(vehicle_capacities[:n_vehicles], time_constraints)
+        for k1, k2 in self._identical_vehicle_pairs(vehicle_types):
+            self.model.addConstr(
+                gp.quicksum(x[i, j, k1] for (i, j) in arcs if j != 0) >=
+                gp.quicksum(x[i, j, k2] for (i, j) in arcs if j != 0),
+                name=f"symmetry_{k1}_{k2}"
+            )
+
+        return x, u
+
+    def _add_visit_variables(self, n: int, prizes: Optional[List[float]]) -> Optional[Dict]:
+        """y[i] = 1 if client i is visited (prize-collecting mode), None if every visit is required"""
+        y = None
+        if prizes is not None:
+            y = {i: self.model.addVar(vtype=GRB.BINARY, name=f"y_{i}") for i in range(1, n)}
+        self.model._visit = y
+        return y
+
+    @staticmethod
+    def _dropped_prizes(y: Optional[Dict], prizes: Optional[List[float]]):
+        """Objective term of the prize-collecting mode: prizes of the clients left out"""
+        if y is None:
+            return 0
+        return gp.quicksum(prizes[i] * (1 - y[i]) for i in y)
+
+    @staticmethod
+    def _vehicle_types(vehicle_capacities: List[int],
+                       time_constraints: Optional[TimeConstraints] = None) -> List[Tuple[float, float]]:
+        """(capacity, latest return time) of every vehicle: equal types are interchangeable"""
+        return [(capacity, time_constraints.return_limit(k) if time_constraints is not None else float("inf"))
+                for k, capacity in enumerate(vehicle_capacities)]
+
+    @staticmethod
+    def _identical_vehicle_pairs(vehicle_types: List[Tuple[float, float]]) -> List[Tuple[int, int]]:
+        """Consecutive pairs of vehicles of the same type (see _vehicle_types)"""
+        groups = {}
+        for k, vehicle_type in enumerate(vehicle_types):
+            groups.setdefault(vehicle_type, []).append(k)
+
+        pairs = []
+        for members in groups.values():
+            pairs.extend(zip(members, members[1:]))
+        return pairs
 
-            # Add depot at end if not already there
-            if route[-1] != 0:
-                route.append(0)
+    def _build_two_index_model(self, travel_times: np.ndarray, n_vehicles: int,
+                               capacity: int, demands: List[int],
+                               arcs: List[Tuple[int, int]],
+                               prizes: Optional[List[float]] = None) -> Dict:
+        """
+        Vehicle-aggregated model for identical vehicles: x[i,j] = 1 if some
+        vehicle travels from i to j. Subtours and overloaded routes are cut
+        lazily by rounded capacity inequalities (see _capacity_cut_callback).
+        """
+        n = len(travel_times)
+        out_arcs, in_arcs = self._adjacency(n, arcs)
+        y = self._add_visit_variables(n, prizes)
+
+        x = {}
+        for (i, j) in arcs:
+            x[i, j] = self.model.addVar(vtype=GRB.BINARY, name=f"x_{i}_{j}")
+
+        self.model.setObjective(
+            gp.quicksum(travel_times[i][j] * x[i, j] for (i, j) in x) + self._dropped_prizes(y, prizes),
+            GRB.MINIMIZE
+        )
+
+        # 1. Each client entered and left exactly once (or not at all with prizes)
+        for h in range(1, n):
+            visits = 1 if y is None else y[h]
+            self.model.addConstr(
+                gp.quicksum(x[i, h] for i in in_arcs[h]) == visits,
+                name=f"in_{h}"
+            )
+            self.model.addConstr(
+                gp.quicksum(x[h, j] for j in out_arcs[h]) == visits,
+                name=f"out_{h}"
+            )
+
+        # 2. Depot degree 2K: K routes leave and K routes return (at most K with prizes)
+        leave = gp.quicksum(x[0, j] for j in out_arcs[0])
+        back = gp.quicksum(x[i, 0] for i in in_arcs[0])
+        self.model.addConstr(
+            leave == n_vehicles if y is None else leave <= n_vehicles,
+            name="leave_depot"
+        )
+        self.model.addConstr(
+            back == n_vehicles if y is None else back <= n_vehicles,
+            name="return_depot"
+        )
+
+        # 3. Capacity cuts x(S, V\S) >= ceil(d(S) / Q) are separated in the callback
+        self.model.Params.LazyConstraints = 1
+        self.model._x = x
+        self.model._n = n
+        self.model._out_arcs = out_arcs
+        self.model._capacity = capacity
+        self.model._demands = demands
+
+        return x
+
+    @staticmethod
+    def _mip_callback(model, where):
+        """Capacity cuts (two-index model) and incumbent reporting"""
+        solver = model._solver
+        if where == GRB.Callback.MIP:
+            if solver is not None:
+                solver._flush_incumbent()
+            return
+        if where == GRB.Callback.MIPNODE:
+            if solver is not None:
+                routes = solver._shared_incumbent(model.cbGet(GRB.Callback.MIPNODE_OBJBST))
+                if routes is not None:
+                    solver._inject_routes(model, routes)
+            return
+        if where != GRB.Callback.MIPSOL:
+            return
+
+        values = model.cbGetSolution(model._x)
+        if model._lazy and PersonnelRoutingSolver._capacity_cut_callback(model, values):
+            return  # Rejected by a cut
+        if solver is not None:
+            routes = solver._routes_from_values(values)
+            if model._lazy:
+                routes = solver._assign_vehicles(routes, model._vehicle_capacities, model._demands)
+            bound = model.cbGet(GRB.Callback.MIPSOL_OBJBND)
+            solver._report_incumbent(routes, model.cbGet(GRB.Callback.MIPSOL_OBJ),
+                                     bound if abs(bound) < GRB.INFINITY else None)
+
+    @staticmethod
+    def _inject_routes(model, routes: List[List[int]]):
+        """Offer routes as a heuristic solution from a MIPNODE callback"""
+        x = model._x
+        values = dict.fromkeys(x, 0.0)
+        vehicle_indexed = len(next(iter(x))) == 3
+        for k, route in enumerate(routes):
+            for i, j in zip(route, route[1:]):
+                if i == j:
+                    continue
+                key = (i, j, k) if vehicle_indexed else (i, j)
+                if key not in values:
+                    return  # Arc pruned from the model (or vehicle out of range)
+                values[key] = 1.0
+        variables, values = list(x.values()), list(values.values())
+        if model._visit is not None:
+            visited = {node for route in routes for node in route}
+            variables += list(model._visit.values())
+            values += [1.0 if i in visited else 0.0 for i in model._visit]
+        # Gurobi completes the other variables and discards the solution if infeasible
+        model.cbSetSolution(variables, values)
+
+    @staticmethod
+    def _routes_from_values(values: Dict) -> List[List[int]]:
+        """Depot-to-depot routes of an integer solution (keys (i, j) or (i, j, k))"""
+        keys = np.array(list(values.keys()), dtype=np.int64)
+        used = keys[np.fromiter(values.values(), dtype=float, count=len(keys)) > 0.5]
+        n = int(used[:, :2].max()) + 1 if len(used) else 1
+        routes, _ = PersonnelRoutingSolver._trace_routes(used, n)
+        return [route for _, route in routes]
+
+    @staticmethod
+    def _used_arcs(model, x: Dict) -> np.ndarray:
+        """Keys of the arc variables at 1 in the incumbent, read with a single getAttr call"""
+        keys = getattr(model, "_x_keys", None)
+        if keys is None or len(keys) != len(x):
+            keys = model._x_keys = np.array(list(x.keys()), dtype=np.int64)
+        values = np.asarray(model.getAttr("X", list(x.values())))
+        return keys[values > 0.5]
+
+    @staticmethod
+    def _trace_routes(used: np.ndarray, n: int) -> Tuple[List[Tuple[int, List[int]]], List[List[int]]]:
+        """
+        Follow the successor array of the used arcs in O(n)
+
+        Args:
+            used: m x 2 (i, j) or m x 3 (i, j, k) keys of the arcs at 1
+            n: number of locations
+
+        Returns:
+            (vehicle, route) for every arc leaving the depot, by vehicle
+            (None for aggregated arcs), and the subtours: cycles of clients
+            not reached from the depot
+        """
+        vehicle_indexed = used.shape[1] == 3
+        starts = used[used[:, 0] == 0]
+        if vehicle_indexed:
+            starts = starts[np.argsort(starts[:, 2], kind="stable")]
+        inner = used[used[:, 0] != 0]
+        successor = np.full(n, -1, dtype=np.int64)
+        successor[inner[:, 0]] = inner[:, 1]
+        successor = successor.tolist()
 
-            # Only add non-empty routes (not just depot->depot)
-            if len(route) > 2:
-                routes.append(route)
+        reached = [False] * n
+        routes = []
+        for arc in starts.tolist():
+            route = [0, arc[1]]
+            while route[-1] != 0 and not reached[route[-1]]:
+                reached[route[-1]] = True
+                route.append(successor[route[-1]])
+            if route[-1] != 0:  # Dead end or loop back into the path: close it at the depot
+                route[-1] = 0
+            routes.append((arc[2] if vehicle_indexed else None, route))
+
+        subtours = []
+        for start in inner[:, 0].tolist():
+            if reached[start]:
+                continue
+            cycle, current = [], start
+            while current >= 0 and not reached[current]:
+                reached[current] = True
+                cycle.append(current)
+                current = successor[current]
+            subtours.append(cycle)
+        return routes, subtours
+
+    @staticmethod
+    def _capacity_cut_callback(model, values: Dict) -> bool:
+        """
+        Add violated rounded capacity cuts on an integer incumbent, True if any
+
+        With optional visits (prize-collecting mode) a set S may be partly
+        dropped, so the cuts use the visit variables instead:
+        x(S, V\\S) >= sum(d_i y_i) / Q for overloaded sets and
+        x(S, V\\S) >= y_i for the clients of a subtour.
+        """
+        x = model._x
+        n = model._n
+        successors = {}
+        for (i, j), value in values.items():
+            if value > 0.5:
+                successors.setdefault(i, []).append(j)
+
+        components = []
+        reached = {0}
+        # Routes hanging off the depot: only the load can be violated
+        for first in successors.get(0, []):
+            route = []
+            current = first
+            while current != 0 and current not in reached:
+                reached.add(current)
+                route.append(current)
+                current = successors[current][0]
+            components.append(route)
+
+        # Clients not reached from the depot lie on subtours (unvisited ones have no successor)
+        for start in range(1, n):
+            if start in reached or start not in successors:
+                continue
+            cycle = []
+            current = start
+            while current not in reached:
+                reached.add(current)
+                cycle.append(current)
+                current = successors[current][0]
+            components.append(cycle)
+
+        cut = False
+        for component in components:
+            load = sum(model._demands[i] for i in component)
+            required = max(1, int(np.ceil(load / model._capacity - 1e-9)))
+            members = set(component)
+            outflow = sum(1 for i in component if successors[i][0] not in members)
+            if outflow < required:
+                crossing = gp.quicksum(x[i, j] for i in members for j in model._out_arcs[i]
+                                       if j not in members)
+                y = model._visit
+                if y is None:
+                    model.cbLazy(crossing >= required)
+                elif load > model._capacity + 1e-9:
+                    model.cbLazy(crossing >= gp.quicksum(model._demands[i] * y[i] for i in members)
+                                 / model._capacity)
+                else:
+                    for i in members:
+                        model.cbLazy(crossing >= y[i])
+                cut = True
+        return cut
+
+    def _extract_two_index_routes(self, x: Dict, n: int) -> List[List[int]]:
+        """Extract routes from the aggregated arc variables"""
+        routes, self._subtours = self._trace_routes(self._used_arcs(self.model, x), n)
+        return [route for _, route in routes]
+
+    @staticmethod
+    def _assign_vehicles(routes: List[List[int]], vehicle_capacities: List[int],
+                         demands: List[int],
+                         time_constraints: Optional[TimeConstraints] = None) -> List[List[int]]:
+        """
+        Assign routes to vehicles after an aggregated solve (route k -> vehicle k)
+
+        Every route goes to a vehicle that can drive it (capacity and, with
+        time constraints, its shift limit) when such an assignment exists:
+        routes are matched by augmenting paths, heaviest route first and
+        largest vehicle first. Idle vehicles get an empty route.
+        """
+        # Surplus routes (more routes than vehicles) are kept at the end
+        n_slots = max(len(routes), len(vehicle_capacities))
+        capacities = list(vehicle_capacities) + [0] * (n_slots - len(vehicle_capacities))
+        types = PersonnelRoutingSolver._vehicle_types(capacities, time_constraints)
+        loads = [sum(demands[i] for i in route) for route in routes]
+
+        def fits(r: int, k: int) -> bool:
+            route = routes[r]
+            if len(route) <= 2:
+                return True
+            if loads[r] > capacities[k]:
+                return False
+            return time_constraints is None or time_constraints.feasible(route, k)
+
+        order = sorted(range(len(routes)), key=lambda r: -loads[r])
+        vehicles = sorted(range(n_slots), key=lambda k: (-types[k][0], -types[k][1]))
+        candidates = {r: [k for k in vehicles if fits(r, k)] for r in order}
+        route_of = {}  # vehicle -> route
+
+        def augment(r: int, visited: set) -> bool:
+            for k in candidates[r]:
+                if k in visited:
+                    continue
+                visited.add(k)
+                if k not in route_of or augment(route_of[k], visited):
+                    route_of[k] = r
+                    return True
+            return False
 
+        unmatched = [r for r in order if not augment(r, set())]
+        # Routes no vehicle can drive take the largest vehicles left
+        free = [k for k in vehicles if k not in route_of]
+        for r, k in zip(unmatched, free):
+            route_of[k] = r
+        depot = routes[0][0] if routes else 0
+        assigned = [routes[route_of[k]] if k in route_of else [depot, depot] for k in range(n_slots)]
+
+        # Within a group of identical vehicles, order routes by number of
+        # clients to match the symmetry-breaking constraints
+        groups = {}
+        for k in range(n_slots):
+            groups.setdefault(types[k], []).append(k)
+        for members in groups.values():
+            group_routes = sorted((assigned[k] for k in members), key=len, reverse=True)
+            for k, route in zip(members, group_routes):
+                assigned[k] = route
+
+        # No padding beyond the routes given, unless a vehicle further down is used
+        while len(assigned) > len(routes) and len(assigned[-1]) <= 2:
+            assigned.pop()
+        return assigned
+
+    def _extract_routes(self, x: Dict, n: int, n_vehicles: int) -> List[List[int]]:
+        """Extract routes for all vehicles from solution variables"""
+        # Idle vehicles (prize-collecting mode) keep a [0, 0] route so
+        # that route k stays assigned to vehicle k
+        routes = [[0, 0] for _ in range(n_vehicles)]
+        traced, self._subtours = self._trace_routes(self._used_arcs(self.model, x), n)
+        for k, route in traced:
+            routes[k] = route
         return routes
 
     def save_solution(self, filename: str):
         """Save solution to file"""
-        if self.solution and self.model:
+        if self.solution:
             with open(filename, 'w') as f:
-                f.write("=== Sales Representatives Routing Solution ===\n")
-                f.write(f"Status: {self.solution.status}\n")
-                f.write(f"Total Distance: {self.solution.total_distance:.2f} km\n")
-                f.write(f"Total Time: {self.solution.total_time:.1f} min\n")
-                f.write(f"  - Travel Time: {self.solution.travel_time:.1f} min\n")
-                f.write(f"  - Service Time: {self.solution.service_time:.1f} min\n")
-                f.write(f"Solve Time: {self.solution.solve_time:.2f}s\n")
-                f.write(f"MIP Gap: {self.solution.gap:.4f}\n")
-                f.write(f"Nodes explored: {self.solution.node_count}\n")
-
-                for i, route in enumerate(self.solution.routes):
-                    f.write(f"\nSales Representative {i + 1} Route:\n")
-                    f.write(" -> ".join(["Depot" if node == 0 else f"Client {node}" for node in route]))
-                    if self.solution.vehicle_counts:
-                        f.write(f" ({self.solution.vehicle_counts[i]} clients)")
-                    f.write("\n")
\ No newline at end of file
+                f.write(format_solution(self.solution))
\ No newline at end of file
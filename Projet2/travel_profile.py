@@ -0,0 +1,144 @@
+import copy
+import numpy as np
+from typing import Optional, Sequence
+
+# Speed factors (share of the free-flow speed) by hour of a working day that
+# starts at minute 0 = 8:00, one row per arc class: 0 = local streets,
+# 1 = arterial roads, which suffer more from rush hours
+RUSH_HOUR_SPEEDS = np.array([
+    # 8h   9h   10h  11h  12h  13h  14h  15h  16h  17h  18h  19h
+    [0.75, 0.9, 1.0, 1.0, 0.9, 0.9, 1.0, 1.0, 0.9, 0.75, 0.85, 1.0],
+    [0.5, 0.75, 1.0, 1.0, 0.85, 0.85, 1.0, 1.0, 0.8, 0.5, 0.7, 1.0],
+])
+
+
+def arc_classes_by_length(distances: np.ndarray, arterial_km: float = 10.0) -> np.ndarray:
+    """Arc class matrix: arcs of at least arterial_km use arterial roads (class 1)"""
+    return (np.asarray(distances) >= arterial_km).astype(np.uint8)
+
+
+class TimeDependentTravelTimes:
+    """
+    Time-dependent travel times from bucketed speed profiles
+
+    The day is cut into buckets of equal length. Every arc has a class and a
+    free-flow travel time, and drives at free-flow speed times the factor of
+    its class in the current bucket (the last factor holds after the last
+    bucket). Travel times integrate the speed over the trip, so they satisfy
+    FIFO: leaving later never means arriving earlier.
+
+    The travel times of trips leaving at every bucket boundary are stored as
+    an n x n slice of a tensor (float32 or float16) and linearly
+    interpolated in between. Boundaries with the same slice, e.g. through a
+    long off-peak period, share one copy. FIFO holds for the interpolation
+    too, since arrival times are non-decreasing from a boundary to the next.
+    """
+
+    def __init__(self, base_times: np.ndarray, speed_factors: np.ndarray = RUSH_HOUR_SPEEDS,
+                 bucket_minutes: float = 60.0, arc_classes: Optional[np.ndarray] = None,
+                 start: float = 0.0, dtype=np.float32):
+        """
+        Args:
+            base_times: n x n free-flow travel times (minutes)
+            speed_factors: classes x buckets speed factors (> 0)
+            bucket_minutes: length of a bucket
+            arc_classes: n x n class of every arc (default class 0)
+            start: time of the first bucket boundary (minutes, same clock
+                as the time windows)
+            dtype: storage type of the tensor
+        """
+        base = np.asarray(base_times, dtype=float)
+        factors = np.atleast_2d(np.asarray(speed_factors, dtype=float))
+        if np.any(factors <= 0):
+            raise ValueError("Speed factors must be positive")
+        classes = np.zeros(base.shape, dtype=np.uint8) if arc_classes is None else np.asarray(arc_classes)
+        if classes.shape != base.shape:
+            raise ValueError("arc_classes and base_times must have the same shape")
+        if classes.max(initial=0) >= len(factors):
+            raise ValueError("Every arc class needs a row of speed factors")
+        self.n = len(base)
+        self.bucket_minutes = float(bucket_minutes)
+        self.start = float(start)
+        self.n_buckets = factors.shape[1]
+
+        slices, self.slice_of, shared = [], [], {}
+        previous = None
+        for b in range(self.n_buckets + 1):
+            times = self._integrate(base, factors, classes, b)
+            if previous is not None:
+                times = self._enforce_fifo(previous, times.astype(dtype))
+            else:
+                times = times.astype(dtype)
+            key = times.tobytes()
+            if key not in shared:
+                shared[key] = len(slices)
+                slices.append(times)
+            self.slice_of.append(shared[key])
+            previous = times
+        self.tensor = np.stack(slices)  # unique slices x n x n
+        self.slice_of = np.asarray(self.slice_of, dtype=np.int32)  # boundary -> slice
+
+    def _integrate(self, base: np.ndarray, factors: np.ndarray, classes: np.ndarray,
+                   boundary: int) -> np.ndarray:
+        """Exact travel times of trips leaving at a bucket boundary"""
+        times = np.empty_like(base)
+        for c in range(len(factors)):
+            mask = classes == c
+            remaining = base[mask]  # Free-flow minutes still to drive
+            elapsed = np.zeros_like(remaining)
+            result = np.full_like(remaining, np.nan)
+            for bucket in range(boundary, self.n_buckets):
+                speed = factors[c, bucket]
+                open_ = np.isnan(result)
+                if not open_.any():
+                    break
+                capacity = speed * self.bucket_minutes
+                done = open_ & (remaining <= capacity)
+                result[done] = elapsed[done] + remaining[done] / speed
+                rest = open_ & ~done
+                remaining[rest] -= capacity
+                elapsed[rest] += self.bucket_minutes
+            open_ = np.isnan(result)
+            result[open_] = elapsed[open_] + remaining[open_] / factors[c, -1]
+            times[mask] = result
+        return times
+
+    def _enforce_fifo(self, previous: np.ndarray, times: np.ndarray) -> np.ndarray:
+        """Round stored times up where rounding made a later trip arrive earlier"""
+        floor = previous.astype(float) - self.bucket_minutes
+        late = times.astype(float) < floor
+        while late.any():
+            times[late] = np.nextafter(times[late], np.asarray(np.inf, dtype=times.dtype))
+            late = times.astype(float) < floor
+        return times
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.tensor.nbytes)
+
+    def travel_time(self, i: int, j: int, departure: float) -> float:
+        """Minutes from i to j leaving at the given time"""
+        position = (departure - self.start) / self.bucket_minutes
+        if position <= 0:
+            return float(self.tensor[self.slice_of[0], i, j])
+        if position >= self.n_buckets:
+            return float(self.tensor[self.slice_of[-1], i, j])
+        b = int(position)
+        low = float(self.tensor[self.slice_of[b], i, j])
+        if self.slice_of[b] == self.slice_of[b + 1]:
+            return low
+        high = float(self.tensor[self.slice_of[b + 1], i, j])
+        return low + (position - b) * (high - low)
+
+    def subset(self, nodes: Sequence[int]) -> "TimeDependentTravelTimes":
+        """Profile of some locations, in the given order (e.g. the sub-matrix of a cluster)"""
+        nodes = np.asarray(nodes, dtype=int)
+        sub = copy.copy(self)
+        sub.tensor = self.tensor[:, nodes[:, None], nodes[None, :]]
+        sub.n = len(nodes)
+        return sub
+
+    def mean_times(self) -> np.ndarray:
+        """Travel times averaged over the bucket boundaries of the day (static approximation)"""
+        counts = np.bincount(self.slice_of, minlength=len(self.tensor)).astype(float)
+        return np.tensordot(counts / counts.sum(), self.tensor.astype(float), axes=1)
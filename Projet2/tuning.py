@@ -0,0 +1,261 @@
+"""
+Gurobi parameter tuning for the MIP engine
+
+Searches Gurobi parameters over a set of representative instances and
+saves the best set as a named profile (JSON) in tuning_profiles/:
+
+    python tuning.py --sizes 8 10 12 --per-size 3 --trials 20 --time-limit 20
+    python tuning.py --instances instances/ --max-size 14 --method gurobi
+
+Profiles are named after the size class of the instances by default, so
+that PersonnelRoutingSolver(tuning_profile="auto") picks the profile that
+matches the instance being solved.
+"""
+import argparse
+import glob
+import json
+import math
+import os
+import random
+import time
+from typing import Any, Dict, List, Optional
+
+PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tuning_profiles")
+
+# Size classes by number of clients (upper bound included)
+SIZE_CLASSES = (("small", 15), ("medium", 40), ("large", math.inf))
+
+# Values tried by the random search (first value = Gurobi default)
+PARAM_SPACE = {
+    "MIPFocus": [0, 1, 2, 3],
+    "Cuts": [-1, 0, 1, 2, 3],
+    "Heuristics": [0.05, 0.0, 0.1, 0.2, 0.4],
+    "Presolve": [-1, 0, 1, 2],
+    "Symmetry": [-1, 0, 2],
+}
+
+# Parameters set by the solver itself, never part of a profile
+RESERVED_PARAMS = {"TimeLimit", "MIPGap", "OutputFlag", "LazyConstraints", "TuneTimeLimit",
+                   "TuneResults", "TuneOutput", "TuneTrials"}
+
+
+def size_class(n_clients: int) -> str:
+    """Size class of an instance"""
+    for name, bound in SIZE_CLASSES:
+        if n_clients <= bound:
+            return name
+    return SIZE_CLASSES[-1][0]
+
+
+def list_profiles(directory: str = PROFILE_DIR) -> List[str]:
+    """Names of the saved profiles"""
+    return sorted(os.path.splitext(os.path.basename(path))[0]
+                  for path in glob.glob(os.path.join(directory, "*.json")))
+
+
+def load_profile(name: str, directory: str = PROFILE_DIR) -> Dict[str, Any]:
+    """Profile saved by save_profile"""
+    with open(os.path.join(directory, f"{name}.json")) as f:
+        return json.load(f)
+
+
+def save_profile(name: str, params: Dict[str, Any], size: str, stats: Optional[Dict] = None,
+                 directory: str = PROFILE_DIR) -> str:
+    """Write a profile, return its path"""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{name}.json")
+    with open(path, "w") as f:
+        json.dump({"name": name, "size_class": size, "params": params, **(stats or {})}, f, indent=2)
+    return path
+
+
+def profile_params(profile: Optional[str], n_clients: int, directory: str = PROFILE_DIR) -> Dict[str, Any]:
+    """
+    Gurobi parameters of a profile name, or of the profile matching the
+    size class of the instance for "auto" (empty if there is none)
+    """
+    if not profile:
+        return {}
+    if profile == "auto":
+        candidates = [name for name in list_profiles(directory)
+                      if load_profile(name, directory).get("size_class") == size_class(n_clients)]
+        if not candidates:
+            return {}
+        # A profile named after the class wins over other profiles of the class
+        profile = size_class(n_clients) if size_class(n_clients) in candidates else candidates[0]
+    params = load_profile(profile, directory)["params"]
+    return {name: value for name, value in params.items() if name not in RESERVED_PARAMS}
+
+
+def sample_instances(sizes: List[int], per_size: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Random instances of the GUI generator (one rep per 5 clients, demand 1)"""
+    from data_manager import DataManager
+    random.seed(seed)
+    instances = []
+    for n_clients in sizes:
+        for _ in range(per_size):
+            data = DataManager.generate_sample_data(n_clients)
+            vehicles = max(1, math.ceil(n_clients / 5))
+            instances.append({"name": f"sample-n{n_clients}-{len(instances)}",
+                              "distances": data["distance_matrix"],
+                              "demands": [0] + [1] * n_clients,
+                              "capacity": math.ceil(n_clients / vehicles) + 1,
+                              "vehicles": vehicles,
+                              "service_times": data["service_times"]})
+    return instances
+
+
+def file_instances(directory: str, max_size: Optional[int] = None) -> List[Dict[str, Any]]:
+    """CVRPLIB instances of a directory (see benchmark.read_vrp)"""
+    from benchmark import read_vrp
+    instances = []
+    for filename in sorted(glob.glob(os.path.join(directory, "*.vrp"))):
+        instance = read_vrp(filename)
+        if max_size is None or len(instance["demands"]) - 1 <= max_size:
+            instances.append(instance)
+    return instances
+
+
+def _make_solver(params: Dict[str, Any], time_limit: int):
+    from solver import PersonnelRoutingSolver
+    # Every configuration starts from the same savings solution and keeps the
+    # raw MIP result, so that only the Gurobi parameters differ
+    return PersonnelRoutingSolver(time_limit=time_limit, post_optimize=False, gurobi_params=params)
+
+
+def run_instance(instance: Dict[str, Any], params: Dict[str, Any], time_limit: int) -> float:
+    """
+    Score of a parameter set on one instance: the runtime when solved to
+    the gap, else the time limit inflated by the remaining gap
+    """
+    solver = _make_solver(params, time_limit)
+    k = instance["vehicles"]
+    start = time.perf_counter()
+    solution = solver.solve_vrp(instance["distances"], n_vehicles=k,
+                                vehicle_capacities=[instance["capacity"]] * k,
+                                demands=instance["demands"],
+                                service_times=instance.get("service_times"))
+    runtime = time.perf_counter() - start
+    if solution.status == 2:  # Optimal within the MIP gap
+        return runtime
+    if not solution.routes:
+        return 10.0 * time_limit
+    return time_limit * (1.0 + min(1.0, solution.gap))
+
+
+def evaluate(instances: List[Dict[str, Any]], params: Dict[str, Any], time_limit: int,
+             cutoff: Optional[float] = None) -> float:
+    """
+    Geometric mean score over the instances; stops early once the mean
+    cannot beat the cutoff even if the remaining instances take no time
+    (returns inf then)
+    """
+    floor = math.log(1e-3)
+    log_total = 0.0
+    for i, instance in enumerate(instances):
+        log_total += math.log(max(1e-3, run_instance(instance, params, time_limit)))
+        best_case = (log_total + (len(instances) - i - 1) * floor) / len(instances)
+        if cutoff is not None and best_case > math.log(cutoff):
+            return math.inf
+    return math.exp(log_total / len(instances))
+
+
+def random_search(instances: List[Dict[str, Any]], trials: int, time_limit: int,
+                  seed: int = 0, space: Optional[Dict[str, List]] = None) -> Dict[str, Any]:
+    """
+    Local random search: every trial changes one or two parameters of the
+    best set so far; the Gurobi defaults are the starting point
+
+    Returns:
+        params, score, baseline score, trials run
+    """
+    space = space or PARAM_SPACE
+    rng = random.Random(seed)
+    best_params: Dict[str, Any] = {}
+    baseline = best_score = evaluate(instances, best_params, time_limit)
+    print(f"baseline: {baseline:.2f}")
+    seen = {()}
+    for trial in range(trials):
+        params = dict(best_params)
+        for name in rng.sample(sorted(space), rng.choice((1, 2))):
+            params[name] = rng.choice(space[name])
+        params = {name: value for name, value in params.items() if value != space[name][0]}
+        key = tuple(sorted(params.items()))
+        if key in seen:
+            continue
+        seen.add(key)
+        score = evaluate(instances, params, time_limit, cutoff=best_score)
+        print(f"trial {trial + 1}: {params} -> {score:.2f}")
+        if score < best_score:
+            best_params, best_score = params, score
+    return {"params": best_params, "score": best_score, "baseline": baseline, "trials": trials}
+
+
+def gurobi_tune(instances: List[Dict[str, Any]], time_limit: int, tune_time: int) -> Dict[str, Any]:
+    """
+    Gurobi's tuning tool on the vehicle-indexed model of the largest
+    instance (the two-index model needs its cut callback, which tune()
+    does not run); the result is then scored on every instance
+    """
+    from solver import PersonnelRoutingSolver
+    instance = max(instances, key=lambda item: len(item["demands"]))
+    solver = PersonnelRoutingSolver(time_limit=1, post_optimize=False)
+    k = instance["vehicles"]
+    solver.solve_vrp(instance["distances"], n_vehicles=k, vehicle_capacities=[instance["capacity"]] * k,
+                     demands=instance["demands"], service_times=instance.get("service_times"),
+                     formulation="three_index")
+    model = solver.model
+    model.reset()
+    model.setParam("TimeLimit", time_limit)
+    model.setParam("TuneTimeLimit", tune_time)
+    model.setParam("TuneResults", 1)
+    model.tune()
+    params = {}
+    if model.TuneResultCount > 0:
+        model.getTuneResult(0)
+        for name in PARAM_SPACE:
+            _, _, current, _, _, default = model.getParamInfo(name)
+            if current != default:
+                params[name] = current
+    baseline = evaluate(instances, {}, time_limit)
+    return {"params": params, "score": evaluate(instances, params, time_limit), "baseline": baseline,
+            "trials": model.TuneResultCount}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune Gurobi parameters of the MIP engine")
+    parser.add_argument("--instances", default=None, help="directory with CVRPLIB .vrp files")
+    parser.add_argument("--max-size", type=int, default=None, help="skip instances with more clients")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[8, 10, 12],
+                        help="client counts of the generated instances (without --instances)")
+    parser.add_argument("--per-size", type=int, default=2, help="generated instances per size")
+    parser.add_argument("--method", choices=("random", "gurobi"), default="random")
+    parser.add_argument("--trials", type=int, default=20, help="random search trials")
+    parser.add_argument("--tune-time", type=int, default=300, help="seconds of Gurobi tuning")
+    parser.add_argument("--time-limit", type=int, default=20, help="seconds per solve")
+    parser.add_argument("--name", default=None, help="profile name (default: the size class)")
+    parser.add_argument("--output", default=PROFILE_DIR, help="profile directory")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    instances = file_instances(args.instances, args.max_size) if args.instances else \
+        sample_instances(args.sizes, args.per_size, args.seed)
+    if not instances:
+        print("No instances to tune on")
+        return
+    size = size_class(max(len(instance["demands"]) - 1 for instance in instances))
+    if args.method == "gurobi":
+        result = gurobi_tune(instances, args.time_limit, args.tune_time)
+    else:
+        result = random_search(instances, args.trials, args.time_limit, args.seed)
+    stats = {"method": args.method, "score": result["score"], "baseline": result["baseline"],
+             "trials": result["trials"], "time_limit": args.time_limit,
+             "instances": [instance["name"] for instance in instances]}
+    path = save_profile(args.name or size, result["params"], size, stats, args.output)
+    print(f"\nBest parameters: {result['params']} "
+          f"(score {result['score']:.2f} vs {result['baseline']:.2f} with the defaults)")
+    print(f"Profile written to {path}")
+
+
+if __name__ == "__main__":
+    main()